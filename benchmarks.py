@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the BAC Helicopters Ticketing System.
+
+Usage:
+    python benchmarks.py pdf [--count N] [--signature raster|vector]
+    python benchmarks.py tickets [--processes N] [--count N] [--block-size N]
+    python benchmarks.py submit [--count N]
+    python benchmarks.py zip [--tickets N] [--ticket-kb N]
+    python benchmarks.py booklet [--tickets N] [--signature raster|vector]
+    python benchmarks.py smtp [--messages N] [--threads N] [--connect-delay-ms N]
+    python benchmarks.py sharepoint [--uploads N] [--dates N] [--latency-ms N] [--ticket-kb N]
+"""
+
+import argparse
+import base64
+import collections
+import io
+import json
+import multiprocessing
+import os
+import smtplib
+import socketserver
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote
+
+SAMPLE_PASSENGER = {
+    'ticket_number': '1549',
+    'timestamp': '2026-01-15 08:30:00',
+    'name': 'Jane Passenger',
+    'email': 'jane@example.com',
+    'body_weight': '72',
+    'num_bags': '1',
+    'bag_weight': '8',
+    'flight_date': '2026-01-15',
+    'flight_time': '09:00',
+    'route': 'FAGC - FALA',
+    'ac_type': 'AS350',
+    'registration': 'ZS-BAC',
+    'pilot': 'Capt. Smith',
+    'dg_ack': 'True',
+}
+
+
+def sample_signature_bytes():
+    """Render a signature-sized JPEG like the one the passenger form submits."""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (900, 300), 'white')
+    draw = ImageDraw.Draw(img)
+    draw.line([(60, 240), (250, 60), (420, 230), (620, 80), (840, 200)], fill=(13, 58, 90), width=6)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def sample_signature_strokes():
+    """The same signature as stroke JSON, in the format the passenger form submits."""
+    points = [(60, 240), (250, 60), (420, 230), (620, 80), (840, 200)]
+    return json.dumps({'w': 900, 'h': 300, 'lw': 6, 's': [[coord for point in points for coord in point]]})
+
+
+def report(label, timings):
+    timings_ms = [t * 1000 for t in timings]
+    print(f"{label}: n={len(timings_ms)} "
+          f"mean={statistics.mean(timings_ms):.2f}ms "
+          f"median={statistics.median(timings_ms):.2f}ms "
+          f"min={min(timings_ms):.2f}ms max={max(timings_ms):.2f}ms")
+
+
+def bench_pdf(args):
+    """Per-ticket render time of create_ticket_pdf."""
+    import main_template
+
+    if args.signature == 'vector':
+        signature, strokes = None, main_template.parse_signature_strokes(sample_signature_strokes())
+    else:
+        signature, strokes = sample_signature_bytes(), None
+
+    # Warm up imports, fonts and any startup caches
+    main_template.create_ticket_pdf(SAMPLE_PASSENGER, signature, None, None, strokes)
+
+    timings = []
+    size = 0
+    for i in range(args.count):
+        data = dict(SAMPLE_PASSENGER, ticket_number=str(1549 + i))
+        start = time.perf_counter()
+        pdf = main_template.create_ticket_pdf(data, signature, None, None, strokes)
+        timings.append(time.perf_counter() - start)
+        size = len(pdf)
+
+    report(f"create_ticket_pdf ({args.signature} signature)", timings)
+    print(f"ticket size: {size} bytes")
+
+
+def _use_scratch_counter(main_template, scratch_dir):
+    """Point the ticket counter at a scratch directory instead of the real one."""
+    scratch_dir = Path(scratch_dir)
+    main_template.TICKET_COUNTER_FILE = scratch_dir / "ticket_counter.txt"
+    main_template.TICKET_COUNTER_LOCK_FILE = scratch_dir / "ticket_counter.lock"
+    main_template.TICKET_LEDGER_FILE = scratch_dir / "ticket_ledger.log"
+    main_template.TICKET_OWNERS_DIR = scratch_dir / "ticket_owners"
+    main_template.TICKET_OWNERS_DIR.mkdir(exist_ok=True)
+
+
+def _use_scratch_outbox(main_template, scratch_dir):
+    """Point the outbox spool, job queue and their lock files at a scratch directory."""
+    outbox_dir = Path(scratch_dir) / "outbox"
+    main_template.OUTBOX_DIR = outbox_dir
+    main_template.OUTBOX_SPOOL_DIR = outbox_dir / "spool"
+    main_template.OUTBOX_DEAD_DIR = outbox_dir / "dead"
+    main_template.OUTBOX_FLUSH_LOCK_FILE = outbox_dir / "outbox_flush.lock"
+    main_template.SHAREPOINT_SYNC_LOCK_FILE = outbox_dir / "sharepoint_sync.lock"
+    main_template.JOBS_DIR = outbox_dir / "jobs"
+    main_template.JOB_QUEUE_LOCK_FILE = main_template.JOBS_DIR / "queue.lock"
+    for directory in [main_template.OUTBOX_SPOOL_DIR, main_template.OUTBOX_DEAD_DIR] + [
+            main_template.JOBS_DIR / state for state in main_template.JOB_STATES]:
+        directory.mkdir(parents=True, exist_ok=True)
+
+
+def _allocate_tickets(scratch_dir, count, block_size, start_event, results):
+    import main_template
+
+    _use_scratch_counter(main_template, scratch_dir)
+    os.environ["TICKET_BLOCK_SIZE"] = str(block_size)
+    start_event.wait()
+    numbers = [main_template.get_next_ticket_number() for _ in range(count)]
+    main_template.release_ticket_block()
+    results.put(numbers)
+
+
+def bench_tickets(args):
+    """Allocate ticket numbers from N concurrent processes and check for duplicates."""
+    import main_template
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        ctx = multiprocessing.get_context('spawn')
+        start_event = ctx.Event()
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=_allocate_tickets, args=(scratch_dir, args.count, args.block_size, start_event, results))
+            for _ in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+
+        time.sleep(1)  # let every process finish importing before the race starts
+        start = time.perf_counter()
+        start_event.set()
+        issued = [n for _ in procs for n in results.get()]
+        elapsed = time.perf_counter() - start
+        for proc in procs:
+            proc.join()
+
+        _use_scratch_counter(main_template, scratch_dir)
+        gaps = main_template.get_ticket_gaps()
+        gap_numbers = {n for first, last in gaps for n in range(first, last + 1)}
+        last_reserved = int(main_template.TICKET_COUNTER_FILE.read_text())
+
+    duplicates = len(issued) - len(set(issued))
+    expected = set(range(main_template.TICKET_START_NUMBER + 1, last_reserved + 1))
+    unaccounted = expected - set(issued) - gap_numbers
+
+    print(f"{args.processes} processes x {args.count} tickets, block size {args.block_size}: "
+          f"{len(issued)} issued in {elapsed:.2f}s ({len(issued) / elapsed:.0f} tickets/sec)")
+    print(f"duplicates: {duplicates}  recorded gaps: {len(gap_numbers)}  unaccounted numbers: {len(unaccounted)}")
+    if duplicates or unaccounted:
+        sys.exit(1)
+
+
+def bench_submit(args):
+    """Ticket submissions/sec through POST /submit, then check a failed manifest write leaves the summary alone."""
+    import main_template
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        scratch = Path(scratch_dir)
+        main_template.TICKETS_DIR = scratch / "tickets"
+        main_template.MANIFEST_DIR = scratch / "manifest"
+        main_template.MANIFEST_DB_PATH = main_template.MANIFEST_DIR / "manifest.db"
+        main_template.PHOTOS_DIR = scratch / "photos"
+        for directory in (main_template.TICKETS_DIR, main_template.MANIFEST_DIR, main_template.PHOTOS_DIR):
+            directory.mkdir()
+        _use_scratch_counter(main_template, scratch)
+        _use_scratch_outbox(main_template, scratch)
+        # Time the request path alone; queued jobs just stay in the scratch queue
+        main_template._job_workers_pid = main_template._outbox_flusher_pid = os.getpid()
+
+        client = main_template.app.test_client()
+        form = {
+            'name': SAMPLE_PASSENGER['name'],
+            'email': SAMPLE_PASSENGER['email'],
+            'body_weight': SAMPLE_PASSENGER['body_weight'],
+            'num_bags': SAMPLE_PASSENGER['num_bags'],
+            'bag_weight': SAMPLE_PASSENGER['bag_weight'],
+            'flight_date': SAMPLE_PASSENGER['flight_date'],
+            'flight_time': SAMPLE_PASSENGER['flight_time'],
+            'route': SAMPLE_PASSENGER['route'],
+            'ac_type': SAMPLE_PASSENGER['ac_type'],
+            'registration': SAMPLE_PASSENGER['registration'],
+            'pilot': SAMPLE_PASSENGER['pilot'],
+            'dg_acknowledged': True,
+            'conditions_accepted': True,
+            'signature_strokes': sample_signature_strokes(),
+        }
+        flight_id = main_template.generate_flight_id(form['flight_date'], form['route'], form['registration'])
+
+        timings = []
+        for i in range(args.count):
+            start = time.perf_counter()
+            resp = client.post('/submit', json=dict(form, name=f"Passenger {i}"))
+            timings.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.get_json()
+        report("POST /submit", timings)
+
+        summary = main_template.get_flight_summary(flight_id)
+        tickets = sorted(p.name for p in (main_template.TICKETS_DIR / flight_id).glob("*.pdf"))
+
+        def fail_insert(*args, **kwargs):
+            raise sqlite3.OperationalError("forced manifest failure")
+
+        insert_manifest_rows = main_template._insert_manifest_rows
+        main_template._insert_manifest_rows = fail_insert
+        try:
+            resp = client.post('/submit', json=dict(form, name="Failed Passenger"))
+        finally:
+            main_template._insert_manifest_rows = insert_manifest_rows
+
+        unchanged = (
+            resp.status_code == 500
+            and main_template.get_flight_summary(flight_id) == summary
+            and sorted(p.name for p in (main_template.TICKETS_DIR / flight_id).glob("*.pdf")) == tickets
+        )
+        print(f"summary after {args.count} tickets: {summary['passenger_count']} passengers, "
+              f"{summary['ticket_count']} tickets; failed submit left it unchanged: {unchanged}")
+        if not unchanged:
+            sys.exit(1)
+
+
+def _peak_memory(func):
+    """Run func and return (result, peak traced allocation in bytes)."""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def bench_zip(args):
+    """Peak memory of building a flight's ticket ZIP in memory versus streaming it."""
+    import main_template
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        main_template.TICKETS_DIR = Path(scratch_dir)
+        flight_dir = main_template.TICKETS_DIR / "2026-01-15_fagc-fala_zs-bac"
+        flight_dir.mkdir()
+        for i in range(args.tickets):
+            (flight_dir / f"ticket_{i:04d}.pdf").write_bytes(os.urandom(args.ticket_kb * 1024))
+
+        def build_in_memory():
+            zip_buffer = io.BytesIO()
+            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for pdf_file in flight_dir.glob("*.pdf"):
+                    zf.writestr(pdf_file.name, pdf_file.read_bytes())
+            return len(zip_buffer.getvalue())
+
+        def stream():
+            entries = main_template.list_ticket_files([flight_dir.name])
+            return sum(len(chunk) for chunk in main_template.stream_zip(entries))
+
+        total_kb = args.tickets * args.ticket_kb
+        for label, func in [("in-memory deflate", build_in_memory), ("streamed store", stream)]:
+            start = time.perf_counter()
+            size, peak = _peak_memory(func)
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {args.tickets} tickets ({total_kb} KB) -> {size // 1024} KB zip "
+                  f"in {elapsed * 1000:.0f}ms, peak memory {peak / 1024:.0f} KB")
+
+
+def bench_booklet(args):
+    """One booklet PDF for a flight versus a ZIP of its standalone ticket PDFs."""
+    import main_template
+
+    if args.signature == 'vector':
+        strokes = main_template.parse_signature_strokes(sample_signature_strokes())
+        signature = (None, strokes)
+    else:
+        signature = (sample_signature_bytes(), None)
+
+    rows = [dict(SAMPLE_PASSENGER, ticket_number=str(1549 + i), name=f"Passenger {i}") for i in range(args.tickets)]
+    signatures = {row['ticket_number']: signature for row in rows}
+
+    # Warm up imports, fonts and the template
+    main_template.create_ticket_pdf(SAMPLE_PASSENGER, None, None, None)
+
+    def tickets_zip():
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zf:
+            for row in rows:
+                zf.writestr(f"ticket_{row['ticket_number']}.pdf",
+                            main_template.create_ticket_pdf(row, signature[0], None, None, signature[1]))
+        return zip_buffer.getvalue()
+
+    def booklet():
+        return main_template.create_booklet_pdf(rows, signatures)
+
+    for label, func in [("ticket PDFs in a ZIP", tickets_zip), ("booklet PDF", booklet)]:
+        start = time.perf_counter()
+        size = len(func())
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {args.tickets} tickets ({args.signature} signature) -> {size // 1024} KB "
+              f"in {elapsed * 1000:.0f}ms")
+
+
+class _SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept EHLO, AUTH PLAIN/LOGIN and messages, and discard them."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        # Stand in for the TCP + TLS + login round trips of a real provider
+        time.sleep(self.server.connect_delay)
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250-stub")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH LOGIN":
+                self.reply("334 VXNlcm5hbWU6")
+                self.rfile.readline()
+                self.reply("334 UGFzc3dvcmQ6")
+                self.rfile.readline()
+                self.reply("235 ok")
+            elif command.startswith("AUTH"):
+                self.reply("235 ok")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.messages += 1
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay):
+        super().__init__(('127.0.0.1', 0), _SMTPStubHandler)
+        self.connect_delay = connect_delay
+        self.messages = 0
+
+
+def bench_smtp(args):
+    """Messages/sec through a local SMTP stub, one connection per message versus the connection pool."""
+    stub = SMTPStub(args.connect_delay_ms / 1000)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    host, port = stub.server_address
+
+    for name in ("SENDGRID_API_KEY",):
+        os.environ.pop(name, None)
+    os.environ.update({
+        'SMTP_HOST': host,
+        'SMTP_PORT': str(port),
+        'SMTP_SSL_PORT': '0',
+        'SMTP_USE_TLS': 'false',
+        'SMTP_USER': 'bench',
+        'SMTP_PASSWORD': 'bench',
+        'SMTP_POOL_SIZE': str(args.threads),
+    })
+    import main_template
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        _use_scratch_outbox(main_template, scratch_dir)
+
+        attachment = [("ticket.pdf", os.urandom(40 * 1024), "application/pdf")]
+
+        def per_message():
+            with smtplib.SMTP(host, port, timeout=30) as server:
+                server.login('bench', 'bench')
+                server.sendmail('noreply@example.com', ['pax@example.com'], "Subject: bench\r\n\r\nbody")
+
+        def pooled():
+            assert main_template.send_email(['pax@example.com'], "bench", "body", attachment)
+
+        for label, func in [("connection per message", per_message), ("pooled send_email", pooled)]:
+            per_thread = args.messages // args.threads
+            start = time.perf_counter()
+            threads = [threading.Thread(target=lambda: [func() for _ in range(per_thread)]) for _ in range(args.threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            sent = per_thread * args.threads
+            print(f"{label}: {sent} messages in {elapsed:.2f}s ({sent / elapsed:.0f} msg/sec)")
+
+    print(f"stub received {stub.messages} messages; pool {main_template.get_smtp_pool().stats()}")
+    stub.shutdown()
+
+
+class _MockGraphHandler(BaseHTTPRequestHandler):
+    """HTTP front end for MockGraph."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def handle_call(self):
+        time.sleep(self.server.latency)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, payload = self.server.call(self.command, self.path, body, self.headers)
+        data = json.dumps(payload or {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = handle_call
+
+
+class MockGraph(ThreadingHTTPServer):
+    """Token endpoint plus the slice of the Graph drive API the SharePoint code uses.
+
+    Supports folder creation, simple uploads, children listings, $batch and
+    upload sessions, and counts every call by kind.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), _MockGraphHandler)
+        self.latency = latency
+        self.calls = collections.Counter()
+        self.folders = set()
+        self.files = {}  # path -> size
+        self.sessions = {}  # session id -> (path, bytes received)
+        self.lock = threading.Lock()
+
+    def call(self, method, path, body, headers):
+        with self.lock:
+            return self._call(method, unquote(path), body, headers)
+
+    def _call(self, method, path, body, headers, counted=True):
+        if path.startswith('/login/'):
+            self.calls['token'] += 1
+            return 200, {'access_token': 'mock-token', 'expires_in': 3599}
+
+        if path.startswith('/graph'):
+            path = path[len('/graph'):]
+
+        if path == '/$batch':
+            self.calls['batch'] += 1
+            responses = []
+            for item in json.loads(body)['requests']:
+                item_body = item.get('body')
+                if isinstance(item_body, dict):
+                    item_body = json.dumps(item_body).encode('utf-8')
+                elif item_body is not None:
+                    item_body = base64.b64decode(item_body)
+                status, payload = self._call(item['method'], unquote(item['url']), item_body, item.get('headers', {}), False)
+                responses.append({'id': item['id'], 'status': status, 'body': payload})
+            return 200, {'responses': responses}
+
+        if path.startswith('/upload/'):
+            self.calls['chunk'] += 1
+            session_id = path[len('/upload/'):]
+            target, received = self.sessions[session_id]
+            if method == 'GET':
+                return 200, {'nextExpectedRanges': [f"{len(received)}-"]}
+            total = int(headers['Content-Range'].rsplit('/', 1)[1])
+            received += body
+            self.sessions[session_id] = (target, received)
+            if len(received) < total:
+                return 202, {'nextExpectedRanges': [f"{len(received)}-"]}
+            self.files[target] = len(received)
+            del self.sessions[session_id]
+            return 201, {}
+
+        if counted:
+            self.calls[method] += 1
+        item = path.split('/root', 1)[1]
+
+        if item.endswith(':/createUploadSession'):
+            session_id = str(len(self.sessions) + 1)
+            self.sessions[session_id] = (item[len(':/'):-len(':/createUploadSession')], b"")
+            return 200, {'uploadUrl': f"http://127.0.0.1:{self.server_address[1]}/upload/{session_id}"}
+
+        if method == 'POST':
+            parent = item[len(':/'):-len(':/children')] if item.startswith(':/') else ''
+            name = json.loads(body)['name']
+            if parent and parent not in self.folders:
+                return 404, {}
+            folder = f"{parent}/{name}" if parent else name
+            if folder in self.folders:
+                return 409, {}
+            self.folders.add(folder)
+            return 201, {}
+
+        if method == 'PUT':
+            self.files[item[len(':/'):-len(':/content')]] = len(body)
+            return 201, {}
+
+        if item.endswith('/children?$select=name,size&$top=999'):
+            folder = item[len(':/'):-len(':/children?$select=name,size&$top=999')]
+            if folder not in self.folders:
+                return 404, {}
+            children = [{'name': f.rpartition('/')[2], 'size': size}
+                        for f, size in self.files.items() if f.rpartition('/')[0] == folder]
+            return 200, {'value': children}
+
+        folder = item[len(':/'):]
+        return (200 if folder in self.folders else 404), {}
+
+
+def bench_sharepoint(args):
+    """Sync a scratch tree of tickets through run_sharepoint_sync against a local mock Graph server."""
+    mock = MockGraph(args.latency_ms / 1000)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{mock.server_address[1]}"
+    os.environ.update({
+        'MS_LOGIN_BASE_URL': f"{base_url}/login",
+        'GRAPH_BASE_URL': f"{base_url}/graph",
+        'SP_TOKEN_CACHE_FILE': '',
+        'SP_SYNC_ARCHIVES': 'true',
+        'SP_UPLOAD_CHUNK_SIZE': str(1024 * 1024),
+    })
+    import main_template
+    main_template.MS_TENANT_ID = main_template.MS_CLIENT_ID = main_template.MS_CLIENT_SECRET = 'bench'
+    main_template.SP_DRIVE_ID = 'bench-drive'
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        scratch = Path(scratch_dir)
+        main_template.BASE_DIR = scratch
+        main_template.TICKETS_DIR = scratch / "tickets"
+        main_template.MANIFEST_DIR = scratch / "manifest"
+        main_template.MANIFEST_DB_PATH = main_template.MANIFEST_DIR / "manifest.db"
+        main_template.ARCHIVE_DIR = scratch / "archives"
+        for directory in (main_template.TICKETS_DIR, main_template.MANIFEST_DIR, main_template.ARCHIVE_DIR):
+            directory.mkdir()
+        _use_scratch_outbox(main_template, scratch)
+        _use_scratch_counter(main_template, scratch)
+
+        for i in range(args.uploads):
+            flight_date = f"2026-01-{1 + i % args.dates:02d}"
+            flight_id = main_template.generate_flight_id(flight_date, "FAGC - FALA", "ZS-BAC")
+            data = dict(SAMPLE_PASSENGER, ticket_number=str(1549 + i), flight_date=flight_date)
+            main_template.append_to_manifest(flight_id, data)
+            main_template.save_ticket_pdf(flight_id, f"ticket_{i:04d}.pdf", os.urandom(args.ticket_kb * 1024))
+
+        start = time.perf_counter()
+        stats = main_template.run_sharepoint_sync()
+        elapsed = time.perf_counter() - start
+        print(f"first sync: {stats} in {elapsed:.2f}s, calls {dict(mock.calls)}")
+
+        mock.calls.clear()
+        stats = main_template.run_sharepoint_sync()
+        print(f"second sync (nothing changed): {stats}, calls {dict(mock.calls)}")
+
+        removed = sorted(mock.files)[:3]
+        for path in removed:
+            del mock.files[path]
+        mock.calls.clear()
+        stats = main_template.run_sharepoint_sync(reconcile=True)
+        print(f"reconcile after deleting {len(removed)} remote files: {stats}, calls {dict(mock.calls)}")
+        assert stats['requeued'] == len(removed) and stats['failed'] == 0
+        assert main_template.get_sharepoint_sync_status()['synced'] == main_template.get_sharepoint_sync_status()['items']
+
+    mock.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    pdf = sub.add_parser('pdf', help=bench_pdf.__doc__)
+    pdf.add_argument('--count', type=int, default=200)
+    pdf.add_argument('--signature', choices=['raster', 'vector'], default='raster')
+    pdf.set_defaults(func=bench_pdf)
+
+    tickets = sub.add_parser('tickets', help=bench_tickets.__doc__)
+    tickets.add_argument('--processes', type=int, default=8)
+    tickets.add_argument('--count', type=int, default=200)
+    tickets.add_argument('--block-size', type=int, default=1)
+    tickets.set_defaults(func=bench_tickets)
+
+    submit = sub.add_parser('submit', help=bench_submit.__doc__)
+    submit.add_argument('--count', type=int, default=50)
+    submit.set_defaults(func=bench_submit)
+
+    zip_bench = sub.add_parser('zip', help=bench_zip.__doc__)
+    zip_bench.add_argument('--tickets', type=int, default=100)
+    zip_bench.add_argument('--ticket-kb', type=int, default=60)
+    zip_bench.set_defaults(func=bench_zip)
+
+    booklet = sub.add_parser('booklet', help=bench_booklet.__doc__)
+    booklet.add_argument('--tickets', type=int, default=50)
+    booklet.add_argument('--signature', choices=['raster', 'vector'], default='raster')
+    booklet.set_defaults(func=bench_booklet)
+
+    smtp = sub.add_parser('smtp', help=bench_smtp.__doc__)
+    smtp.add_argument('--messages', type=int, default=200)
+    smtp.add_argument('--threads', type=int, default=2)
+    smtp.add_argument('--connect-delay-ms', type=int, default=30)
+    smtp.set_defaults(func=bench_smtp)
+
+    sharepoint = sub.add_parser('sharepoint', help=bench_sharepoint.__doc__)
+    sharepoint.add_argument('--uploads', type=int, default=100)
+    sharepoint.add_argument('--dates', type=int, default=5)
+    sharepoint.add_argument('--latency-ms', type=int, default=20)
+    sharepoint.add_argument('--ticket-kb', type=int, default=60)
+    sharepoint.set_defaults(func=bench_sharepoint)
+
+    args = parser.parse_args()
+    sys.path.insert(0, str(Path(__file__).parent))
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
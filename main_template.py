@@ -7,32 +7,59 @@ Version: 1.1.0 - Updated branding and email functionality
 import os
 import io
 import csv
+import json
+import time
+import uuid
 import base64
+import sqlite3
 import smtplib
 import zipfile
 import logging
 import re
+import math
+import random
+import atexit
+import tempfile
+import hashlib
+import fcntl
+import threading
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime
+from zoneinfo import ZoneInfo
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
+from email import encoders, message_from_bytes
+from email.header import decode_header, make_header
+from email.utils import getaddresses, parsedate_to_datetime
 from pathlib import Path
 from urllib.parse import urlencode, quote
 
+import click
 import qrcode
+from qrcode.image.svg import SvgPathImage
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
 from flask import (
-    Flask, render_template, request, jsonify, send_file,
+    Flask, Request, render_template, request, jsonify, send_file,
     redirect, url_for, Response
 )
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.lib.colors import HexColor, white, black
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import Paragraph, Frame
+from reportlab.platypus import Paragraph
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
 # =============================================================================
 # Configuration
@@ -51,12 +78,18 @@ TICKETS_DIR = BASE_DIR / "tickets"
 MANIFEST_DIR = BASE_DIR / "manifest"
 OUTBOX_DIR = BASE_DIR / "outbox"
 DOCS_DIR = BASE_DIR / "docs"
+ARCHIVE_DIR = BASE_DIR / "archives"
+PHOTOS_DIR = BASE_DIR / "photos"
+UPLOAD_SPOOL_DIR = BASE_DIR / "uploads"
 
 # Ensure directories exist
 TICKETS_DIR.mkdir(exist_ok=True)
 MANIFEST_DIR.mkdir(exist_ok=True)
 OUTBOX_DIR.mkdir(exist_ok=True)
 DOCS_DIR.mkdir(exist_ok=True)
+ARCHIVE_DIR.mkdir(exist_ok=True)
+PHOTOS_DIR.mkdir(exist_ok=True)
+UPLOAD_SPOOL_DIR.mkdir(exist_ok=True)
 
 # Environment variables - accessed via functions to ensure fresh reads
 def get_smtp_host():
@@ -74,11 +107,43 @@ def get_smtp_password():
 def get_smtp_use_tls():
     return os.environ.get("SMTP_USE_TLS", "true").lower() == "true"
 
+def get_smtp_ssl_port():
+    """Implicit-TLS port tried before SMTP_PORT; 0 skips the attempt."""
+    return int(os.environ.get("SMTP_SSL_PORT", "465"))
+
+def get_smtp_pool_size():
+    return int(os.environ.get("SMTP_POOL_SIZE", "2"))
+
+def get_smtp_max_messages_per_connection():
+    return int(os.environ.get("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+
+def get_smtp_idle_timeout():
+    return float(os.environ.get("SMTP_IDLE_TIMEOUT", "240"))
+
+def get_smtp_noop_interval():
+    return float(os.environ.get("SMTP_NOOP_INTERVAL", "10"))
+
 def get_from_email():
     return os.environ.get("FROM_EMAIL", "noreply@bachelicopters.com")
 
 def get_pilot_email():
     return os.environ.get("PILOT_EMAIL", "")
+
+def get_pilot_email_attach_tickets():
+    """Also attach the ticket ZIP to pilot manifest emails."""
+    return os.environ.get("PILOT_EMAIL_ATTACH_TICKETS", "false").lower() == "true"
+
+def get_pilot_email_attach_csv():
+    """Also attach the manifest CSV to pilot manifest emails."""
+    return os.environ.get("PILOT_EMAIL_ATTACH_CSV", "false").lower() == "true"
+
+def get_qr_format():
+    """Image format for flight link QR codes: 'png' or 'svg'."""
+    return "svg" if os.environ.get("QR_FORMAT", "png").lower() == "svg" else "png"
+
+def get_signature_format():
+    """How the passenger form submits signatures: 'vector' strokes or a 'raster' JPEG."""
+    return "raster" if os.environ.get("SIGNATURE_FORMAT", "vector").lower() == "raster" else "vector"
 PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "")
 
 # SharePoint config
@@ -91,45 +156,122 @@ SP_BASE_FOLDER = os.environ.get("SP_BASE_FOLDER", "BAC-Ticketing")
 # Admin key (simple auth)
 ADMIN_KEY = "bac123"
 
+# Admin dashboard paging
+ADMIN_FLIGHTS_PER_PAGE = 25
+ADMIN_API_MAX_LIMIT = 200
+
 # Base64 limits for validation
 MAX_SINGLE_IMAGE_BASE64 = 800_000  # ~600KB binary
 MAX_TOTAL_BASE64 = 1_200_000  # signature + photos
 
+# Binary limits for multipart uploads (the form downscales photos before sending)
+MAX_SIGNATURE_BYTES = 600_000
+MAX_PHOTO_BYTES = 4 * 1024 * 1024
+PHOTO_SLOTS = ('photo1', 'photo2')
+MAX_SIGNATURE_STROKES_CHARS = 200_000  # compact stroke JSON
+MAX_SIGNATURE_POINTS = 20_000
+
 # =============================================================================
-# Logo Loading (loads from file at runtime)
+# Static Assets (cached in memory, reloaded when the file changes)
 # =============================================================================
 
+LOGO_PATH = BASE_DIR / "logo.png"
+DG_PDF_PATH = DOCS_DIR / "dg.pdf"
+
+
+def get_asset_check_interval():
+    return float(os.environ.get("ASSET_CHECK_INTERVAL", "5"))
+
+
+class AssetCache:
+    """Process-wide cache of values derived from static files.
+
+    Each entry remembers the mtime of the file it was built from. The file is
+    only stat'ed again once the check interval has passed, so repeated reads
+    inside that window touch no disk at all.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, path, loader):
+        """Return loader(path), cached under key until path's mtime changes. None if missing."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and now - entry['checked_at'] < get_asset_check_interval():
+            self.hits += 1
+            return entry['value']
+
+        with self._lock:
+            try:
+                mtime = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+
+            entry = self._entries.get(key)
+            if entry and entry['mtime'] == mtime:
+                entry['checked_at'] = now
+                self.hits += 1
+                return entry['value']
+
+            self.misses += 1
+            value = None
+            if mtime is not None:
+                try:
+                    value = loader(path)
+                except Exception as e:
+                    logger.error(f"Failed to load asset {key} from {path}: {e}")
+
+            self._entries[key] = {'mtime': mtime, 'value': value, 'checked_at': now}
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': sorted(self._entries),
+        }
+
+
+asset_cache = AssetCache()
+
+
 def get_logo_base64():
     """Load logo from file and return as base64."""
-    logo_path = BASE_DIR / "logo.png"
-    if logo_path.exists():
-        try:
-            logo_data = logo_path.read_bytes()
-            return base64.b64encode(logo_data).decode('utf-8')
-        except Exception as e:
-            logger.error(f"Failed to read logo: {e}")
-    return None
+    return asset_cache.get('logo_base64', LOGO_PATH, lambda p: base64.b64encode(p.read_bytes()).decode('utf-8'))
 
 def get_logo_bytes():
     """Load logo from file and return as bytes."""
-    logo_path = BASE_DIR / "logo.png"
-    if logo_path.exists():
-        try:
-            return logo_path.read_bytes()
-        except Exception as e:
-            logger.error(f"Failed to read logo: {e}")
-    return None
+    return asset_cache.get('logo_bytes', LOGO_PATH, lambda p: p.read_bytes())
+
+def get_logo_print_image(box_width, box_height):
+    """Logo downsampled for a box of the given size, as an ImageReader ready for ReportLab."""
+    return asset_cache.get(
+        f'logo_print_{box_width:.0f}x{box_height:.0f}',
+        LOGO_PATH,
+        lambda p: prepare_print_image(p.read_bytes(), box_width, box_height)
+    )
+
+def get_dg_pdf_bytes():
+    """Dangerous Goods information sheet, or None if docs/dg.pdf is missing."""
+    return asset_cache.get('dg_pdf', DG_PDF_PATH, lambda p: p.read_bytes())
 
 # For backwards compatibility
 BASE64_LOGO = get_logo_base64()
 
 def write_embedded_logo():
     """Write logo status for verification on startup."""
-    logo_path = BASE_DIR / "logo.png"
-    if logo_path.exists():
-        logger.info(f"Logo file found: {logo_path} ({logo_path.stat().st_size} bytes)")
+    if LOGO_PATH.exists():
+        logger.info(f"Logo file found: {LOGO_PATH} ({LOGO_PATH.stat().st_size} bytes)")
     else:
-        logger.warning(f"Logo file not found: {logo_path}")
+        logger.warning(f"Logo file not found: {LOGO_PATH}")
 
 # =============================================================================
 # Conditions of Carriage Text
@@ -190,6 +332,29 @@ def get_flight_dir(flight_id):
     return flight_dir
 
 
+class DiskSpooledRequest(Request):
+    """Request that streams every uploaded file part to a temp file in UPLOAD_SPOOL_DIR.
+
+    Werkzeug keeps parts under 500 KB in memory; spooling them all to disk
+    keeps worker memory flat however many uploads are in flight.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.TemporaryFile(dir=UPLOAD_SPOOL_DIR)
+
+
+app.request_class = DiskSpooledRequest
+
+
+def upload_size(file_storage):
+    """Size in bytes of an uploaded file part."""
+    stream = file_storage.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
 def decode_base64_image(data_url):
     """Decode a base64 data URL to bytes."""
     if not data_url:
@@ -206,8 +371,50 @@ def decode_base64_image(data_url):
         return None
 
 
-def generate_qr_code(url):
-    """Generate a QR code as base64 PNG."""
+def parse_signature_strokes(value):
+    """Parse the compact stroke JSON sent by the signature pad.
+
+    Expects {"w": width, "h": height, "lw": line width, "s": [[x0, y0, x1, y1, ...], ...]}
+    in the pad's export coordinates. Returns the same dict with each stroke
+    as a list of (x, y) points. Raises ValueError if it is malformed or empty.
+    """
+    if isinstance(value, str):
+        if len(value) > MAX_SIGNATURE_STROKES_CHARS:
+            raise ValueError("Signature is too large")
+        value = json.loads(value)
+
+    try:
+        width, height = float(value['w']), float(value['h'])
+        line_width = float(value.get('lw', 2.5))
+        strokes = []
+        for flat in value['s']:
+            if len(flat) < 4 or len(flat) % 2:
+                continue  # single taps draw nothing, as on the raster export
+            strokes.append([(float(flat[i]), float(flat[i + 1])) for i in range(0, len(flat), 2)])
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError("Malformed signature strokes")
+
+    if not (0 < width <= 10_000 and 0 < height <= 10_000 and 0 < line_width <= 100):
+        raise ValueError("Invalid signature dimensions")
+    if not strokes:
+        raise ValueError("Signature is empty")
+    points = [coord for stroke in strokes for point in stroke for coord in point]
+    if len(points) > 2 * MAX_SIGNATURE_POINTS or not all(map(math.isfinite, points)):
+        raise ValueError("Invalid signature strokes")
+    return {'w': width, 'h': height, 'lw': line_width, 's': strokes}
+
+
+QR_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+QR_CACHE_SIZE = 256  # flight links are regenerated and re-sent often
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr_code(url, qr_format='png'):
+    """Render url as a QR code image. Returns PNG or SVG bytes, cached per (url, format).
+
+    SVG is drawn as a single vector path without going through Pillow, and
+    stays sharp at any print size.
+    """
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -217,39 +424,243 @@ def generate_qr_code(url):
     qr.add_data(url)
     qr.make(fit=True)
 
-    img = qr.make_image(fill_color="black", back_color="white")
     buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    if qr_format == 'svg':
+        qr.make_image(image_factory=SvgPathImage).save(buffer)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def generate_qr_code(url, qr_format='png'):
+    """Generate a QR code as base64 (PNG unless qr_format is 'svg')."""
+    return base64.b64encode(render_qr_code(url, qr_format)).decode('utf-8')
 
 
 # =============================================================================
 # Ticket Number Counter
 # =============================================================================
+#
+# ticket_counter.txt holds the last ticket number handed out. Every change to
+# it happens under an exclusive flock so gunicorn workers never issue the same
+# number twice. With TICKET_BLOCK_SIZE > 1 each worker reserves a block of
+# numbers at a time and hands them out from memory; numbers are then unique
+# but not strictly in submission order across workers. Every reservation, and
+# any part of a block a worker exits without using, is recorded in
+# ticket_ledger.log so gaps in the sequence can be accounted for. A process
+# that reserves numbers holds a lock in ticket_owners/ until it exits; on
+# startup, numbers reserved by processes no longer holding theirs that never
+# made it onto a manifest are recorded as unused too.
 
 TICKET_COUNTER_FILE = BASE_DIR / "ticket_counter.txt"
+TICKET_COUNTER_LOCK_FILE = BASE_DIR / "ticket_counter.lock"
+TICKET_LEDGER_FILE = BASE_DIR / "ticket_ledger.log"
+TICKET_OWNERS_DIR = BASE_DIR / "ticket_owners"
+TICKET_OWNERS_DIR.mkdir(exist_ok=True)
+TICKET_START_NUMBER = 1548  # Starting number to match existing physical tickets
 
-def get_next_ticket_number():
-    """Get the next sequential ticket number."""
+
+def get_ticket_block_size():
+    return max(1, int(os.environ.get("TICKET_BLOCK_SIZE", "1")))
+
+
+@contextmanager
+def file_lock(lock_path, blocking=True):
+    """Hold an exclusive advisory lock on lock_path across threads and processes.
+
+    With blocking=False, yields False straight away instead of waiting when
+    the lock is held elsewhere; otherwise yields True once it is acquired.
+    """
+    with open(lock_path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _append_ticket_ledger(event, start, stop):
+    with open(TICKET_LEDGER_FILE, 'a', encoding='utf-8') as f:
+        f.write(f"{datetime.now().isoformat(timespec='seconds')} {event} {start} {stop - 1} pid={os.getpid()}\n")
+
+
+_ticket_owner = {'pid': None, 'file': None}
+
+
+def _hold_ticket_owner_lock():
+    """Lock this process's owner file for as long as it runs. Call with the counter lock held."""
+    if _ticket_owner['pid'] == os.getpid():
+        return
+    lock_file = open(TICKET_OWNERS_DIR / f"{os.getpid()}.lock", 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        pass  # held by a process we forked from; it stays held while we run
+    _ticket_owner.update(pid=os.getpid(), file=lock_file)
+
+
+def _ticket_owner_alive(pid):
+    """Whether a running process holds pid's owner lock. Call with the counter lock held."""
+    lock_path = TICKET_OWNERS_DIR / f"{pid}.lock"
     try:
+        with open(lock_path, 'r') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except FileNotFoundError:
+        return False
+    except BlockingIOError:
+        return True
+    lock_path.unlink()
+    return False
+
+
+def reserve_ticket_numbers(count):
+    """Atomically reserve count consecutive ticket numbers. Returns them as a range."""
+    with file_lock(TICKET_COUNTER_LOCK_FILE):
+        _hold_ticket_owner_lock()
         if TICKET_COUNTER_FILE.exists():
             current = int(TICKET_COUNTER_FILE.read_text().strip())
         else:
-            current = 1548  # Starting number to match existing physical tickets
+            current = TICKET_START_NUMBER
 
-        next_num = current + 1
-        TICKET_COUNTER_FILE.write_text(str(next_num))
-        return next_num
-    except Exception as e:
-        logger.error(f"Error getting ticket number: {e}")
-        # Fallback to timestamp-based number
-        return int(datetime.now().strftime("%H%M%S"))
+        numbers = range(current + 1, current + count + 1)
+
+        tmp_path = TICKET_COUNTER_FILE.with_name(f".{TICKET_COUNTER_FILE.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(str(numbers[-1]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, TICKET_COUNTER_FILE)
+
+        _append_ticket_ledger('reserved', numbers.start, numbers.stop)
+        return numbers
+
+
+_ticket_block = {'pid': None, 'next': 0, 'stop': 0}
+_ticket_block_lock = threading.Lock()
+
+
+def get_next_ticket_number():
+    """Get the next ticket number, reserving a new block from the counter file when needed."""
+    with _ticket_block_lock:
+        block = _ticket_block
+        if block['pid'] != os.getpid() or block['next'] >= block['stop']:
+            numbers = reserve_ticket_numbers(get_ticket_block_size())
+            block.update(pid=os.getpid(), next=numbers.start, stop=numbers.stop)
+
+        ticket_number = block['next']
+        block['next'] += 1
+        return ticket_number
+
+
+def release_ticket_block():
+    """Record the unused rest of this process's block in the ledger as a gap."""
+    with _ticket_block_lock:
+        block = _ticket_block
+        if block['pid'] == os.getpid() and block['next'] < block['stop']:
+            _append_ticket_ledger('unused', block['next'], block['stop'])
+            logger.info(f"Released unused ticket numbers {block['next']}-{block['stop'] - 1}")
+        block.update(pid=None, next=0, stop=0)
+
+
+atexit.register(release_ticket_block)
+
+
+def get_ticket_gaps():
+    """Ticket number ranges that were reserved but never issued, as (first, last) tuples."""
+    if not TICKET_LEDGER_FILE.exists():
+        return []
+
+    gaps = []
+    for line in TICKET_LEDGER_FILE.read_text(encoding='utf-8').splitlines():
+        parts = line.split()
+        if len(parts) >= 4 and parts[1] == 'unused':
+            gaps.append((int(parts[2]), int(parts[3])))
+    return gaps
+
+
+def void_ticket_number(ticket_number):
+    """Record a number handed out to a ticket that was never issued."""
+    _append_ticket_ledger('unused', ticket_number, ticket_number + 1)
+    logger.warning(f"Ticket number {ticket_number} was not issued, recorded as unused")
+
+
+def reconcile_ticket_ledger():
+    """Record reserved numbers that no running process holds and no manifest row uses as unused.
+
+    Returns how many numbers were recorded.
+    """
+    if not TICKET_LEDGER_FILE.exists():
+        return 0
+
+    with file_lock(TICKET_COUNTER_LOCK_FILE):
+        reserved, accounted = {}, set()
+        for line in TICKET_LEDGER_FILE.read_text(encoding='utf-8').splitlines():
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            numbers = range(int(parts[2]), int(parts[3]) + 1)
+            if parts[1] == 'reserved':
+                reserved.setdefault(parts[4].removeprefix('pid='), []).append(numbers)
+            elif parts[1] == 'unused':
+                accounted.update(numbers)
+
+        candidates = set()
+        for pid, ranges in reserved.items():
+            if not _ticket_owner_alive(pid):
+                for numbers in ranges:
+                    candidates.update(numbers)
+        candidates -= accounted
+        if not candidates:
+            return 0
+
+        issued = {
+            int(row['ticket_number']) for row in get_manifest_db().execute(
+                "SELECT ticket_number FROM manifest_rows WHERE CAST(ticket_number AS INTEGER) BETWEEN ? AND ?",
+                (min(candidates), max(candidates))
+            ) if row['ticket_number'].isdigit()
+        }
+        unused = sorted(candidates - issued)
+        run_start = None
+        for i, number in enumerate(unused):
+            if run_start is None:
+                run_start = number
+            if i + 1 == len(unused) or unused[i + 1] != number + 1:
+                _append_ticket_ledger('unused', run_start, number + 1)
+                run_start = None
+
+    if unused:
+        logger.warning(f"Recorded {len(unused)} reserved but unissued ticket numbers as unused")
+    return len(unused)
+
+
+_ticket_ledger_reconciled_pid = None
+
+
+def ensure_ticket_ledger_reconciled():
+    """Run reconcile_ticket_ledger once in this process."""
+    global _ticket_ledger_reconciled_pid
+    if _ticket_ledger_reconciled_pid == os.getpid():
+        return
+    _ticket_ledger_reconciled_pid = os.getpid()
+    try:
+        reconcile_ticket_ledger()
+    except Exception:
+        logger.exception("Ticket ledger reconcile failed")
 
 
 # =============================================================================
-# CSV Manifest Functions
+# Manifest Store
 # =============================================================================
+#
+# Manifest rows live in a SQLite database (WAL mode) so every gunicorn worker
+# can append and read concurrently. Values are stored as text, exactly as
+# they were written to the old per-flight CSVs, and CSV files left in
+# MANIFEST_DIR are imported once on first use.
 
 MANIFEST_COLUMNS = [
     'ticket_number', 'timestamp', 'name', 'body_weight', 'num_bags', 'bag_weight',
@@ -257,50 +668,244 @@ MANIFEST_COLUMNS = [
     'pilot', 'dg_ack'
 ]
 
+MANIFEST_DB_PATH = MANIFEST_DIR / "manifest.db"
+
+MANIFEST_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS manifest_rows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    flight_id TEXT NOT NULL,
+    {', '.join(f'{column} TEXT' for column in MANIFEST_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_manifest_rows_flight_id ON manifest_rows(flight_id);
+CREATE INDEX IF NOT EXISTS idx_manifest_rows_flight_date ON manifest_rows(flight_date);
+CREATE INDEX IF NOT EXISTS idx_manifest_rows_ticket_number ON manifest_rows(ticket_number);
+
+CREATE TABLE IF NOT EXISTS imported_manifests (
+    file_name TEXT PRIMARY KEY,
+    row_count INTEGER NOT NULL,
+    imported_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ticket_signatures (
+    ticket_number TEXT PRIMARY KEY,
+    flight_id TEXT NOT NULL,
+    strokes TEXT,
+    image BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_ticket_signatures_flight_id ON ticket_signatures(flight_id);
+"""
+
+_db_local = threading.local()
+_db_ready_pid = None
+_db_ready_lock = threading.Lock()
+
+
+def get_manifest_db():
+    """Return this thread's connection to the manifest database."""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None or _db_local.pid != os.getpid():
+        conn = sqlite3.connect(MANIFEST_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _db_local.conn = conn
+        _db_local.pid = os.getpid()
+        _ensure_manifest_schema(conn)
+    return conn
+
+
+@contextmanager
+def manifest_transaction():
+    """Run a block inside a write transaction on the manifest database."""
+    conn = get_manifest_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def _ensure_manifest_schema(conn):
+    """Create tables and import legacy CSVs, once per process."""
+    global _db_ready_pid
+    if _db_ready_pid == os.getpid():
+        return
+
+    with _db_ready_lock:
+        if _db_ready_pid == os.getpid():
+            return
+        conn.executescript(MANIFEST_SCHEMA + SUMMARY_SCHEMA + SYNC_SCHEMA + INVITE_SCHEMA)
+        imported = migrate_csv_manifests()
+        built = conn.execute("SELECT 1 FROM store_meta WHERE key = 'summaries_built_at'").fetchone()
+        if imported or not built:
+            rebuild_flight_summaries()
+        _db_ready_pid = os.getpid()
+
+
+def _insert_manifest_rows(conn, flight_id, rows):
+    placeholders = ', '.join('?' for _ in range(len(MANIFEST_COLUMNS) + 1))
+    conn.executemany(
+        f"INSERT INTO manifest_rows (flight_id, {', '.join(MANIFEST_COLUMNS)}) VALUES ({placeholders})",
+        [[flight_id] + [str(row.get(column, '') or '') for column in MANIFEST_COLUMNS] for row in rows]
+    )
+
+
+def migrate_csv_manifests():
+    """Import per-flight CSV manifests that are not yet in the database. Returns rows imported."""
+    imported = 0
+    for csv_file in sorted(MANIFEST_DIR.glob("*.csv")):
+        with manifest_transaction() as conn:
+            already = conn.execute(
+                "SELECT 1 FROM imported_manifests WHERE file_name = ?", (csv_file.name,)
+            ).fetchone()
+            if already:
+                continue
+
+            with open(csv_file, 'r', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+
+            _insert_manifest_rows(conn, csv_file.stem, rows)
+            conn.execute(
+                "INSERT INTO imported_manifests (file_name, row_count, imported_at) VALUES (?, ?, ?)",
+                (csv_file.name, len(rows), datetime.now().isoformat(timespec='seconds'))
+            )
+            imported += len(rows)
+            logger.info(f"Imported {len(rows)} manifest rows from {csv_file.name}")
+    return imported
+
 
-def append_to_manifest(flight_id, data):
-    """Append a row to the flight manifest CSV."""
-    manifest_path = MANIFEST_DIR / f"{flight_id}.csv"
-    file_exists = manifest_path.exists()
+def append_to_manifest(flight_id, data, signature_bytes=None, signature_strokes=None, tickets=0):
+    """Append a row to the flight manifest, keeping the passenger's signature for the booklet.
+
+    tickets counts ticket PDFs written for the row in the same transaction (see write_ticket_pdf).
+    """
+    with manifest_transaction() as conn:
+        _insert_manifest_rows(conn, flight_id, [data])
+        record_manifest_rows(conn, flight_id, [data], tickets=tickets)
+        if signature_bytes or signature_strokes:
+            conn.execute(
+                "INSERT OR REPLACE INTO ticket_signatures (ticket_number, flight_id, strokes, image) VALUES (?, ?, ?, ?)",
+                (str(data['ticket_number']), flight_id,
+                 json.dumps(signature_strokes) if signature_strokes else None,
+                 None if signature_strokes else signature_bytes)
+            )
 
-    with open(manifest_path, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(data)
 
-    return manifest_path
+def read_ticket_signatures(flight_id):
+    """{ticket_number: (signature_bytes, signature_strokes)} for the flight's stored signatures."""
+    rows = get_manifest_db().execute(
+        "SELECT ticket_number, strokes, image FROM ticket_signatures WHERE flight_id = ?", (flight_id,)
+    )
+    return {
+        row['ticket_number']: (row['image'], json.loads(row['strokes']) if row['strokes'] else None)
+        for row in rows
+    }
 
 
 def read_manifest(flight_id):
     """Read all rows from a flight manifest."""
-    manifest_path = MANIFEST_DIR / f"{flight_id}.csv"
-    if not manifest_path.exists():
-        return []
+    rows = get_manifest_db().execute(
+        f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM manifest_rows WHERE flight_id = ? ORDER BY id",
+        (flight_id,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def export_manifest_csv(flight_id):
+    """Render a flight manifest as CSV bytes in the original column layout. None if empty."""
+    manifest = read_manifest(flight_id)
+    if not manifest:
+        return None
 
-    with open(manifest_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+    buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(buffer, fieldnames=MANIFEST_COLUMNS)
+    writer.writeheader()
+    writer.writerows(manifest)
+    return buffer.getvalue().encode('utf-8')
 
 
 def get_all_flights():
     """Get all flight IDs from manifests and ticket directories."""
-    flights = set()
+    rows = get_manifest_db().execute("SELECT flight_id FROM flight_summaries ORDER BY flight_id DESC")
+    return [row['flight_id'] for row in rows]
+
 
-    # From manifests
-    for csv_file in MANIFEST_DIR.glob("*.csv"):
-        flights.add(csv_file.stem)
+# =============================================================================
+# Flight Summary Index
+# =============================================================================
+#
+# flight_summaries keeps one row of running totals per flight. It is updated
+# in the same transaction as each manifest append and on each ticket write,
+# so the admin dashboard reads a single table instead of re-reading every
+# manifest and globbing every ticket directory.
+
+SUMMARY_INFO_COLUMNS = ['date', 'time', 'route', 'ac_type', 'registration', 'pilot']
+SUMMARY_TOTAL_COLUMNS = ['passenger_count', 'ticket_count', 'total_body_weight', 'total_bag_weight', 'total_bags']
+
+SUMMARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flight_summaries (
+    flight_id TEXT PRIMARY KEY,
+    passenger_count INTEGER NOT NULL DEFAULT 0,
+    ticket_count INTEGER NOT NULL DEFAULT 0,
+    total_body_weight REAL NOT NULL DEFAULT 0,
+    total_bag_weight REAL NOT NULL DEFAULT 0,
+    total_bags INTEGER NOT NULL DEFAULT 0,
+    date TEXT,
+    time TEXT,
+    route TEXT,
+    ac_type TEXT,
+    registration TEXT,
+    pilot TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_flight_summaries_date ON flight_summaries(date);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
 
-    # From ticket directories
-    for ticket_dir in TICKETS_DIR.iterdir():
-        if ticket_dir.is_dir():
-            flights.add(ticket_dir.name)
 
-    return sorted(flights, reverse=True)
+def _manifest_row_weights(row):
+    """(body weight, bag weight, bag count) for a manifest row; unparseable values count as 0."""
+    body_weight = bag_weight = bags = 0
+    try:
+        body_weight = float(row.get('body_weight', 0) or 0)
+        bag_weight = float(row.get('bag_weight', 0) or 0)
+        bags = int(row.get('num_bags', 0) or 0)
+    except (ValueError, TypeError):
+        pass
+    return body_weight, bag_weight, bags
 
 
-def get_flight_summary(flight_id):
-    """Get summary statistics for a flight."""
+def _flight_info_from_row(row):
+    return {
+        'date': row.get('flight_date', ''),
+        'time': row.get('flight_time', ''),
+        'route': row.get('route', ''),
+        'ac_type': row.get('ac_type', ''),
+        'registration': row.get('registration', ''),
+        'pilot': row.get('pilot', ''),
+    }
+
+
+def _flight_info_from_id(flight_id):
+    parts = flight_id.split('_')
+    if len(parts) >= 3:
+        return {
+            'date': parts[0],
+            'route': parts[1].upper().replace('-', ' - '),
+            'registration': parts[2].upper(),
+        }
+    return {}
+
+
+def compute_flight_summary(flight_id):
+    """Get summary statistics for a flight by reading its manifest and ticket directory."""
     manifest = read_manifest(flight_id)
     flight_dir = TICKETS_DIR / flight_id
     ticket_count = len(list(flight_dir.glob("*.pdf"))) if flight_dir.exists() else 0
@@ -310,33 +915,13 @@ def get_flight_summary(flight_id):
     total_bags = 0
 
     for row in manifest:
-        try:
-            total_body_weight += float(row.get('body_weight', 0) or 0)
-            total_bag_weight += float(row.get('bag_weight', 0) or 0)
-            total_bags += int(row.get('num_bags', 0) or 0)
-        except (ValueError, TypeError):
-            pass
+        body_weight, bag_weight, bags = _manifest_row_weights(row)
+        total_body_weight += body_weight
+        total_bag_weight += bag_weight
+        total_bags += bags
 
     # Extract flight info from first manifest row or flight_id
-    flight_info = {}
-    if manifest:
-        flight_info = {
-            'date': manifest[0].get('flight_date', ''),
-            'time': manifest[0].get('flight_time', ''),
-            'route': manifest[0].get('route', ''),
-            'ac_type': manifest[0].get('ac_type', ''),
-            'registration': manifest[0].get('registration', ''),
-            'pilot': manifest[0].get('pilot', ''),
-        }
-    else:
-        # Parse from flight_id
-        parts = flight_id.split('_')
-        if len(parts) >= 3:
-            flight_info = {
-                'date': parts[0],
-                'route': parts[1].upper().replace('-', ' - '),
-                'registration': parts[2].upper(),
-            }
+    flight_info = _flight_info_from_row(manifest[0]) if manifest else _flight_info_from_id(flight_id)
 
     return {
         'flight_id': flight_id,
@@ -349,436 +934,1814 @@ def get_flight_summary(flight_id):
     }
 
 
-# =============================================================================
-# PDF Generation
-# =============================================================================
+def _upsert_flight_summary(conn, flight_id, info, passengers=0, tickets=0, body_weight=0, bag_weight=0, bags=0):
+    """Add to a flight's running totals, creating its index row if needed.
 
-def create_ticket_pdf(data, signature_bytes, photo1_bytes, photo2_bytes):
-    """
-    Generate a clean, professional A4 PDF ticket matching BAC letterhead style.
-    Returns the PDF as bytes.
+    Flight details are taken from info while the flight has no passengers, so
+    the first manifest row replaces details guessed from the flight ID.
     """
-    buffer = io.BytesIO()
-    width, height = A4
-    c = canvas.Canvas(buffer, pagesize=A4)
+    conn.execute(
+        f"""
+        INSERT INTO flight_summaries (flight_id, {', '.join(SUMMARY_TOTAL_COLUMNS)}, {', '.join(SUMMARY_INFO_COLUMNS)}, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(flight_id) DO UPDATE SET
+            passenger_count = passenger_count + excluded.passenger_count,
+            ticket_count = ticket_count + excluded.ticket_count,
+            total_body_weight = total_body_weight + excluded.total_body_weight,
+            total_bag_weight = total_bag_weight + excluded.total_bag_weight,
+            total_bags = total_bags + excluded.total_bags,
+            {', '.join(f'{c} = CASE WHEN passenger_count = 0 AND excluded.passenger_count > 0 THEN excluded.{c} ELSE {c} END' for c in SUMMARY_INFO_COLUMNS)},
+            updated_at = excluded.updated_at
+        """,
+        [flight_id, passengers, tickets, body_weight, bag_weight, bags]
+        + [info.get(c) for c in SUMMARY_INFO_COLUMNS]
+        + [datetime.now().isoformat(timespec='seconds')]
+    )
 
-    # Colors - clean professional palette matching letterhead
-    brand_blue = HexColor("#1a5a8a")
-    light_gray = HexColor("#f5f5f5")
-    medium_gray = HexColor("#666666")
-    border_gray = HexColor("#cccccc")
-    red_accent = HexColor("#c41e3a")
-
-    # Page margins
-    page_margin = 12 * mm
-
-    # ==========================================================================
-    # Professional Border
-    # ==========================================================================
-    border_width = 1.5
-    c.setStrokeColor(brand_blue)
-    c.setLineWidth(border_width)
-    c.rect(page_margin, page_margin, width - 2 * page_margin, height - 2 * page_margin, fill=0, stroke=1)
-
-    # Inner subtle border
-    c.setStrokeColor(border_gray)
-    c.setLineWidth(0.5)
-    inner_margin = page_margin + 3 * mm
-    c.rect(inner_margin, inner_margin, width - 2 * inner_margin, height - 2 * inner_margin, fill=0, stroke=1)
-
-    # Content area
-    margin = page_margin + 8 * mm
-    content_width = width - 2 * margin
-    y = height - margin
-
-    # ==========================================================================
-    # Header - Logo and Title
-    # ==========================================================================
-    logo_data = get_logo_bytes()
-    if logo_data:
-        try:
-            logo_reader = ImageReader(io.BytesIO(logo_data))
-            logo_width = 50 * mm
-            logo_height = 18 * mm
-            c.drawImage(
-                logo_reader,
-                margin,
-                y - logo_height,
-                width=logo_width,
-                height=logo_height,
-                preserveAspectRatio=True,
-                mask='auto'
+
+def record_manifest_rows(conn, flight_id, rows, tickets=0):
+    """Fold new manifest rows, and tickets written for them, into the flight's summary (inside the caller's transaction)."""
+    if not rows:
+        return
+    totals = [_manifest_row_weights(row) for row in rows]
+    _upsert_flight_summary(
+        conn, flight_id, _flight_info_from_row(rows[0]),
+        passengers=len(rows),
+        tickets=tickets,
+        body_weight=sum(t[0] for t in totals),
+        bag_weight=sum(t[1] for t in totals),
+        bags=sum(t[2] for t in totals),
+    )
+
+
+def write_ticket_pdf(flight_id, ticket_filename, pdf_bytes):
+    """Write a ticket PDF into the flight's directory without counting it. Returns (path, is_new)."""
+    # Opening the store can rebuild the index from disk, so do it before the file exists
+    get_manifest_db()
+    ticket_path = get_flight_dir(flight_id) / ticket_filename
+    is_new = not ticket_path.exists()
+    ticket_path.write_bytes(pdf_bytes)
+    return ticket_path, is_new
+
+
+def save_ticket_pdf(flight_id, ticket_filename, pdf_bytes):
+    """Write a ticket PDF into the flight's directory and count it in the summary index."""
+    ticket_path, is_new = write_ticket_pdf(flight_id, ticket_filename, pdf_bytes)
+    if is_new:
+        with manifest_transaction() as conn:
+            _upsert_flight_summary(conn, flight_id, _flight_info_from_id(flight_id), tickets=1)
+    return ticket_path
+
+
+def rebuild_flight_summaries():
+    """Recompute the whole summary index from the manifest table and ticket directories."""
+    flight_ids = {row['flight_id'] for row in get_manifest_db().execute("SELECT DISTINCT flight_id FROM manifest_rows")}
+    flight_ids.update(d.name for d in TICKETS_DIR.iterdir() if d.is_dir())
+    summaries = [compute_flight_summary(flight_id) for flight_id in flight_ids]
+
+    with manifest_transaction() as conn:
+        conn.execute("DELETE FROM flight_summaries")
+        for summary in summaries:
+            _upsert_flight_summary(
+                conn, summary['flight_id'], summary,
+                passengers=summary['passenger_count'],
+                tickets=summary['ticket_count'],
+                body_weight=summary['total_body_weight'],
+                bag_weight=summary['total_bag_weight'],
+                bags=summary['total_bags'],
             )
-        except Exception as e:
-            logger.error(f"Failed to draw logo: {e}")
-            c.setFillColor(brand_blue)
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(margin, y - 12 * mm, "BAC HELICOPTERS")
-
-    # Title on the right
-    c.setFillColor(brand_blue)
-    c.setFont("Helvetica-Bold", 18)
-    c.drawRightString(width - margin, y - 6 * mm, "PASSENGER TICKET")
-
-    # Underline
-    c.setStrokeColor(brand_blue)
-    c.setLineWidth(1)
-    c.line(width - margin - 70 * mm, y - 9 * mm, width - margin, y - 9 * mm)
-
-    # Ticket number
-    c.setFillColor(red_accent)
-    c.setFont("Helvetica-Bold", 14)
-    ticket_num = data.get('ticket_number', 'N/A')
-    c.drawRightString(width - margin, y - 16 * mm, f"Ticket #: {ticket_num}")
-
-    y -= 26 * mm
-
-    # ==========================================================================
-    # Flight Details Section
-    # ==========================================================================
-    # Section divider line
-    c.setStrokeColor(brand_blue)
-    c.setLineWidth(0.75)
-    c.line(margin, y, margin + content_width, y)
-    y -= 6 * mm
-
-    # Two-column layout for flight details
-    col1_x = margin
-    col2_x = margin + content_width / 2 + 5 * mm
-    label_color = medium_gray
-    value_color = black
-
-    # Row 1: Name (full width)
-    c.setFont("Helvetica", 9)
-    c.setFillColor(label_color)
-    c.drawString(col1_x, y, "Passenger Name")
-    c.setFillColor(value_color)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(col1_x, y - 5 * mm, data.get('name', ''))
-    y -= 14 * mm
-
-    # Row 2: Date of Flight | ETD
-    c.setFont("Helvetica", 9)
-    c.setFillColor(label_color)
-    c.drawString(col1_x, y, "Date of Flight")
-    c.drawString(col2_x, y, "ETD")
-    c.setFillColor(value_color)
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(col1_x, y - 5 * mm, data.get('flight_date', ''))
-    c.drawString(col2_x, y - 5 * mm, data.get('flight_time', ''))
-    y -= 14 * mm
-
-    # Row 3: Route | PIC
-    c.setFont("Helvetica", 9)
-    c.setFillColor(label_color)
-    c.drawString(col1_x, y, "Route")
-    c.drawString(col2_x, y, "PIC")
-    c.setFillColor(value_color)
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(col1_x, y - 5 * mm, data.get('route', ''))
-    c.drawString(col2_x, y - 5 * mm, data.get('pilot', ''))
-    y -= 14 * mm
-
-    # Row 4: A/C Type | A/C Reg
-    c.setFont("Helvetica", 9)
-    c.setFillColor(label_color)
-    c.drawString(col1_x, y, "A/C Type")
-    c.drawString(col2_x, y, "A/C Reg")
-    c.setFillColor(value_color)
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(col1_x, y - 5 * mm, data.get('ac_type', ''))
-    c.drawString(col2_x, y - 5 * mm, data.get('registration', ''))
-    y -= 16 * mm
-
-    # ==========================================================================
-    # Weight Declaration Section
-    # ==========================================================================
-    c.setStrokeColor(brand_blue)
-    c.setLineWidth(0.75)
-    c.line(margin, y, margin + content_width, y)
-    y -= 5 * mm
-
-    c.setFont("Helvetica-Bold", 10)
-    c.setFillColor(brand_blue)
-    c.drawString(margin, y, "WEIGHT DECLARATION")
-    y -= 8 * mm
-
-    # Weight boxes - clean design
-    box_width = (content_width - 10 * mm) / 3
-    box_height = 18 * mm
-
-    for i, (label, value) in enumerate([
-        ("WEIGHT OF PAX", f"{data.get('body_weight', '')} kg"),
-        ("NO OF BAG ITEMS", f"{data.get('num_bags', '0')}"),
-        ("WEIGHT OF BAG", f"{data.get('bag_weight', '0')} kg")
-    ]):
-        box_x = margin + i * (box_width + 5 * mm)
-
-        # Light background
-        c.setFillColor(light_gray)
-        c.roundRect(box_x, y - box_height, box_width, box_height, 3, fill=1, stroke=0)
-
-        # Border
-        c.setStrokeColor(border_gray)
-        c.setLineWidth(0.5)
-        c.roundRect(box_x, y - box_height, box_width, box_height, 3, fill=0, stroke=1)
+        conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('summaries_built_at', ?)",
+            (datetime.now().isoformat(timespec='seconds'),)
+        )
+    logger.info(f"Rebuilt flight summary index for {len(summaries)} flights")
 
-        # Label
-        c.setFont("Helvetica", 7)
-        c.setFillColor(medium_gray)
-        c.drawCentredString(box_x + box_width/2, y - 5 * mm, label)
 
-        # Value
-        c.setFont("Helvetica-Bold", 14)
-        c.setFillColor(black)
-        c.drawCentredString(box_x + box_width/2, y - 13 * mm, value)
+def _summary_from_row(row):
+    summary = {'flight_id': row['flight_id']}
+    for column in SUMMARY_TOTAL_COLUMNS:
+        summary[column] = row[column]
+    summary['total_weight'] = row['total_body_weight'] + row['total_bag_weight']
+    for column in SUMMARY_INFO_COLUMNS:
+        if row[column] is not None:
+            summary[column] = row[column]
+    return summary
 
-    y -= box_height + 4 * mm
 
-    c.setFont("Helvetica-Oblique", 7)
-    c.setFillColor(medium_gray)
-    c.drawString(margin, y, "Weights declared by passenger. To be verified at check-in.")
-    y -= 10 * mm
+def get_flight_summary(flight_id):
+    """Get summary statistics for a flight."""
+    row = get_manifest_db().execute(
+        "SELECT * FROM flight_summaries WHERE flight_id = ?", (flight_id,)
+    ).fetchone()
+    if row is None:
+        return compute_flight_summary(flight_id)
+    return _summary_from_row(row)
 
-    # ==========================================================================
-    # Signature Section
-    # ==========================================================================
-    c.setStrokeColor(brand_blue)
-    c.setLineWidth(0.75)
-    c.line(margin, y, margin + content_width, y)
-    y -= 5 * mm
 
-    c.setFont("Helvetica-Bold", 10)
-    c.setFillColor(brand_blue)
-    c.drawString(margin, y, "PASSENGER SIGNATURE")
-    y -= 4 * mm
+def manifest_version(flight_summary):
+    """A string that changes whenever the flight's manifest totals change."""
+    return '/'.join(str(flight_summary.get(column, 0)) for column in SUMMARY_TOTAL_COLUMNS)
 
-    sig_width = 70 * mm
-    sig_height = 25 * mm
 
-    if signature_bytes:
-        try:
-            sig_reader = ImageReader(io.BytesIO(signature_bytes))
-            c.drawImage(
-                sig_reader,
-                margin,
-                y - sig_height,
-                width=sig_width,
-                height=sig_height,
-                preserveAspectRatio=True
-            )
-        except Exception as e:
-            logger.error(f"Failed to draw signature: {e}")
-
-    # Signature line
-    c.setStrokeColor(black)
-    c.setLineWidth(0.5)
-    c.line(margin, y - sig_height - 1 * mm, margin + sig_width, y - sig_height - 1 * mm)
-
-    # Info next to signature
-    c.setFont("Helvetica", 8)
-    c.setFillColor(medium_gray)
-    info_x = margin + sig_width + 10 * mm
-    info_y = y - 3 * mm
-
-    c.drawString(info_x, info_y, f"Date: {data.get('timestamp', '').split(' ')[0] if data.get('timestamp') else ''}")
-    info_y -= 5 * mm
-    c.drawString(info_x, info_y, f"Email: {data.get('email', '')}")
-    info_y -= 5 * mm
-    dg_ack = "Yes" if data.get('dg_ack') == 'True' else "No"
-    c.drawString(info_x, info_y, f"DG Acknowledged: {dg_ack}")
-    info_y -= 5 * mm
-    c.drawString(info_x, info_y, "Conditions Accepted: Yes")
-
-    y -= sig_height + 10 * mm
-
-    # ==========================================================================
-    # Acceptance Banner
-    # ==========================================================================
-    banner_height = 8 * mm
-    c.setFillColor(brand_blue)
-    c.roundRect(margin, y - banner_height, content_width, banner_height, 2, fill=1, stroke=0)
-
-    c.setFillColor(white)
-    c.setFont("Helvetica-Bold", 7)
-    c.drawCentredString(width / 2, y - 5.5 * mm, "THE PASSENGER BY ACCEPTANCE OF THIS TICKET ACCEPTS THE CONDITIONS OF CARRIAGE")
-
-    y -= banner_height + 8 * mm
-
-    # ==========================================================================
-    # Conditions of Carriage (compact two-column)
-    # ==========================================================================
-    c.setFont("Helvetica-Bold", 8)
-    c.setFillColor(brand_blue)
-    c.drawString(margin, y, "CONDITIONS OF CARRIAGE")
-    y -= 4 * mm
-
-    # Calculate remaining space
-    dg_height = 28 * mm
-    footer_height = 10 * mm
-    conditions_height = y - inner_margin - dg_height - footer_height
-
-    styles = getSampleStyleSheet()
-    cond_style = ParagraphStyle(
-        'Conditions',
-        parent=styles['Normal'],
-        fontSize=5.5,
-        leading=6.5,
-        textColor=medium_gray,
-    )
+def get_store_meta(key):
+    row = get_manifest_db().execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else None
 
-    # Two columns for conditions
-    lines = CONDITIONS_OF_CARRIAGE.strip().split('\n')
-    mid = len(lines) // 2
-    col1_text = '<br/>'.join(lines[:mid])
-    col2_text = '<br/>'.join(lines[mid:])
-
-    col_width = (content_width - 6 * mm) / 2
-
-    col1_para = Paragraph(col1_text, cond_style)
-    col2_para = Paragraph(col2_text, cond_style)
-
-    frame1 = Frame(margin, y - conditions_height, col_width, conditions_height,
-                   leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
-    frame2 = Frame(margin + col_width + 6 * mm, y - conditions_height, col_width, conditions_height,
-                   leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
-
-    frame1.addFromList([col1_para], c)
-    frame2.addFromList([col2_para], c)
-
-    y -= conditions_height + 4 * mm
-
-    # ==========================================================================
-    # Dangerous Goods Notice (compact)
-    # ==========================================================================
-    c.setFont("Helvetica-Bold", 7)
-    c.setFillColor(brand_blue)
-    c.drawString(margin, y, "DANGEROUS GOODS NOT PERMITTED")
-    y -= 3 * mm
-
-    c.setFont("Helvetica", 6)
-    c.setFillColor(medium_gray)
-    dg_text = "Explosives • Compressed Gases • Flammable Liquids/Solids • Corrosives • Oxidizers • Poisons • Radioactive Materials • Lithium Batteries (checked baggage)"
-    c.drawString(margin, y, dg_text)
-    y -= 4 * mm
-    c.drawString(margin, y, "Medicines and toiletries in limited quantities permitted. Full DG information provided separately.")
-
-    # ==========================================================================
-    # Footer
-    # ==========================================================================
-    footer_y = inner_margin + 4 * mm
-    c.setFont("Helvetica", 6)
-    c.setFillColor(medium_gray)
-    c.drawCentredString(width / 2, footer_y, "BAC Helicopters (Pty) Ltd  •  Air Service License N1105D & G1106D  •  This ticket is valid only for the flight shown above")
 
-    c.save()
-    buffer.seek(0)
-    return buffer.getvalue()
+def set_store_meta(key, value):
+    get_manifest_db().execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, value))
 
 
-# =============================================================================
-# Email Functions
-# =============================================================================
+def _flight_filter_sql(date_from=None, date_to=None, registration=None):
+    """WHERE clause and parameters for the dashboard's date-range and registration filters."""
+    clauses, params = [], []
+    if date_from:
+        clauses.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("date <= ?")
+        params.append(date_to)
+    if registration:
+        clauses.append("registration = ? COLLATE NOCASE")
+        params.append(registration)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
 
-def get_sendgrid_api_key():
-    """Get SendGrid API key from environment."""
-    return os.environ.get("SENDGRID_API_KEY", "")
 
+def query_flight_summaries(date_from=None, date_to=None, registration=None, limit=25, offset=0, before=None):
+    """One page of flight summaries, newest flight ID first.
 
-def is_sendgrid_configured():
-    """Check if SendGrid is configured."""
-    return bool(get_sendgrid_api_key())
+    Pass offset for numbered pages or before (a flight ID) for cursor paging.
+    """
+    where, params = _flight_filter_sql(date_from, date_to, registration)
+    if before:
+        where = f"{where} AND flight_id < ?" if where else "WHERE flight_id < ?"
+        params.append(before)
+    rows = get_manifest_db().execute(
+        f"SELECT * FROM flight_summaries {where} ORDER BY flight_id DESC LIMIT ? OFFSET ?",
+        params + [limit, offset]
+    ).fetchall()
+    return [_summary_from_row(row) for row in rows]
+
+
+def get_flight_totals(date_from=None, date_to=None, registration=None):
+    """Aggregate counts and weights over every flight matching the filters."""
+    where, params = _flight_filter_sql(date_from, date_to, registration)
+    row = get_manifest_db().execute(
+        f"""
+        SELECT COUNT(*) AS flight_count,
+               COALESCE(SUM(passenger_count), 0) AS passenger_count,
+               COALESCE(SUM(ticket_count), 0) AS ticket_count,
+               COALESCE(SUM(total_body_weight), 0) AS total_body_weight,
+               COALESCE(SUM(total_bag_weight), 0) AS total_bag_weight,
+               COALESCE(SUM(total_bags), 0) AS total_bags
+        FROM flight_summaries {where}
+        """,
+        params
+    ).fetchone()
+    totals = dict(row)
+    totals['total_weight'] = totals['total_body_weight'] + totals['total_bag_weight']
+    return totals
 
 
-def is_smtp_configured():
-    """Check if SMTP is configured."""
-    return bool(get_smtp_host() and get_smtp_user() and get_smtp_password())
+# =============================================================================
+# PDF Generation
+# =============================================================================
+#
+# Everything on the ticket that does not depend on the passenger (borders,
+# header, labels, weight boxes, conditions of carriage, DG notice, footer) is
+# laid out once in a TicketTemplate and drawn into each document as a single
+# form XObject. create_ticket_pdf then only stamps the passenger fields,
+# ticket number and signature on top.
 
+# Colors - clean professional palette matching letterhead
+BRAND_BLUE = HexColor("#1a5a8a")
+LIGHT_GRAY = HexColor("#f5f5f5")
+MEDIUM_GRAY = HexColor("#666666")
+BORDER_GRAY = HexColor("#cccccc")
+RED_ACCENT = HexColor("#c41e3a")
+SIGNATURE_INK = HexColor("#0d3a5a")  # matches the pen colour of the signature pad
 
-def send_email_sendgrid(to_emails, subject, body, attachments=None):
-    """
-    Send email via SendGrid HTTP API.
-    attachments: list of (filename, bytes, mimetype) tuples
-    """
-    api_key = get_sendgrid_api_key()
-    if not api_key:
-        logger.error("SendGrid API key not configured")
-        return False
+LOGO_PRINT_DPI = 300  # the logo is downsampled to this before embedding
 
-    # Ensure to_emails is a list
-    if isinstance(to_emails, str):
-        to_emails = [to_emails]
+# Embed image streams as binary rather than ASCII85. Without ReportLab's optional
+# C accelerator the encoder is pure Python and dominates render time.
+rl_config.useA85 = 0
 
-    # Build personalizations (recipients)
-    personalizations = [{
-        "to": [{"email": email.strip()} for email in to_emails if email.strip()]
-    }]
+DG_NOTICE_TEXT = "Explosives • Compressed Gases • Flammable Liquids/Solids • Corrosives • Oxidizers • Poisons • Radioactive Materials • Lithium Batteries (checked baggage)"
+FOOTER_TEXT = "BAC Helicopters (Pty) Ltd  •  Air Service License N1105D & G1106D  •  This ticket is valid only for the flight shown above"
+ACCEPTANCE_TEXT = "THE PASSENGER BY ACCEPTANCE OF THIS TICKET ACCEPTS THE CONDITIONS OF CARRIAGE"
 
-    # Build the email payload
-    payload = {
-        "personalizations": personalizations,
-        "from": {"email": get_from_email(), "name": "BAC Helicopters"},
-        "subject": subject,
-        "content": [{"type": "text/plain", "value": body}]
-    }
 
-    # Add attachments if any
-    if attachments:
-        payload["attachments"] = []
-        for filename, data, mimetype in attachments:
-            payload["attachments"].append({
-                "content": base64.b64encode(data).decode('utf-8'),
-                "filename": filename,
-                "type": mimetype,
-                "disposition": "attachment"
-            })
+def prepare_print_image(image_bytes, box_width, box_height, dpi=LOGO_PRINT_DPI):
+    """Downsample an image to the resolution needed to print it in a box, returning an ImageReader."""
+    from PIL import Image
 
-    # Send via SendGrid API
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    img = Image.open(io.BytesIO(image_bytes))
+    max_px = (int(box_width / 72 * dpi) + 1, int(box_height / 72 * dpi) + 1)
+    if img.width > max_px[0] or img.height > max_px[1]:
+        img.thumbnail(max_px, Image.LANCZOS)
 
-    try:
-        logger.info(f"Sending email via SendGrid to {to_emails}")
-        response = requests.post(
-            "https://api.sendgrid.com/v3/mail/send",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", optimize=False)
+    buffer.seek(0)
+    return ImageReader(buffer)
 
-        if response.status_code in [200, 202]:
-            logger.info(f"Email sent successfully via SendGrid to {to_emails}")
-            return True
-        else:
-            logger.error(f"SendGrid error: {response.status_code} - {response.text}")
-            return False
-    except Exception as e:
-        logger.error(f"SendGrid request failed: {type(e).__name__}: {e}")
-        return False
 
+class FormTemplate(ABC):
+    """A page whose static parts are drawn once per PDF as a form XObject and reused on every page.
 
-def send_email(to_emails, subject, body, attachments=None):
+    Subclasses set FORM_NAME and implement _draw_static(c).
     """
-    Send an email with optional attachments.
-    Tries SendGrid first, then SMTP, then saves as .eml file.
 
-    attachments: list of (filename, bytes, mimetype) tuples
-    """
-    # Try SendGrid first (works on Railway)
-    if is_sendgrid_configured():
-        if send_email_sendgrid(to_emails, subject, body, attachments):
-            return True
-        logger.warning("SendGrid failed, trying SMTP fallback...")
+    FORM_NAME = None
+
+    def draw(self, c):
+        """Place the static page on the canvas, defining the form on first use in this document."""
+        if not c.hasForm(self.FORM_NAME):
+            c.beginForm(self.FORM_NAME)
+            self._draw_static(c)
+            c.endForm()
+        c.doForm(self.FORM_NAME)
+
+    @abstractmethod
+    def _draw_static(self, c):
+        """Draw the parts of the page that are the same on every page."""
+
+
+class TicketTemplate(FormTemplate):
+    """Pre-computed A4 ticket layout shared by every ticket rendered in this process."""
+
+    FORM_NAME = "bacTicketTemplate"
+
+    def __init__(self):
+        self.width, self.height = A4
+
+        self.page_margin = 12 * mm
+        self.inner_margin = self.page_margin + 3 * mm
+        self.margin = self.page_margin + 8 * mm
+        self.content_width = self.width - 2 * self.margin
+
+        self.col1_x = self.margin
+        self.col2_x = self.margin + self.content_width / 2 + 5 * mm
+
+        self.logo_width = 50 * mm
+        self.logo_height = 18 * mm
+        self.box_width = (self.content_width - 10 * mm) / 3
+        self.box_height = 18 * mm
+        self.sig_width = 70 * mm
+        self.sig_height = 25 * mm
+        self.banner_height = 8 * mm
+
+        # Vertical positions, walking down the page as the original layout did
+        y = self.height - self.margin
+        self.header_y = y
+        y -= 26 * mm
+        self.flight_rule_y = y
+        y -= 6 * mm
+        self.name_y = y
+        y -= 14 * mm
+        self.date_y = y
+        y -= 14 * mm
+        self.route_y = y
+        y -= 14 * mm
+        self.aircraft_y = y
+        y -= 16 * mm
+        self.weight_rule_y = y
+        y -= 5 * mm
+        self.weight_title_y = y
+        y -= 8 * mm
+        self.weight_box_y = y
+        y -= self.box_height + 4 * mm
+        self.weight_note_y = y
+        y -= 10 * mm
+        self.signature_rule_y = y
+        y -= 5 * mm
+        self.signature_title_y = y
+        y -= 4 * mm
+        self.signature_y = y
+        y -= self.sig_height + 10 * mm
+        self.banner_y = y
+        y -= self.banner_height + 8 * mm
+        self.conditions_title_y = y
+        y -= 4 * mm
+        self.conditions_y = y
+
+        dg_height = 28 * mm
+        footer_height = 10 * mm
+        self.conditions_height = y - self.inner_margin - dg_height - footer_height
+        y -= self.conditions_height + 4 * mm
+        self.dg_y = y
+        self.footer_y = self.inner_margin + 4 * mm
+
+        self.col_width = (self.content_width - 6 * mm) / 2
+        self.conditions = self._layout_conditions()
+
+        # Paragraph.drawOn binds the canvas to the paragraph while drawing
+        self._draw_lock = threading.Lock()
+
+    def _layout_conditions(self):
+        """Wrap the two conditions columns once. Returns [(paragraph, x, y)]."""
+        styles = getSampleStyleSheet()
+        cond_style = ParagraphStyle(
+            'Conditions',
+            parent=styles['Normal'],
+            fontSize=5.5,
+            leading=6.5,
+            textColor=MEDIUM_GRAY,
+        )
 
-    # Build MIME message for SMTP or .eml fallback
-    msg = MIMEMultipart()
-    msg['From'] = get_from_email()
-    msg['To'] = ', '.join(to_emails) if isinstance(to_emails, list) else to_emails
-    msg['Subject'] = subject
+        lines = CONDITIONS_OF_CARRIAGE.strip().split('\n')
+        mid = len(lines) // 2
+        placed = []
+        for i, col_lines in enumerate([lines[:mid], lines[mid:]]):
+            para = Paragraph('<br/>'.join(col_lines), cond_style)
+            _, para_height = para.wrap(self.col_width, self.conditions_height)
+            if para_height > self.conditions_height:
+                # Frame.addFromList drops a flowable that does not fit rather than splitting it
+                continue
+            x = self.margin + i * (self.col_width + 6 * mm)
+            placed.append((para, x, self.conditions_y - para_height))
+        return placed
+
+    def _draw_rule(self, c, y):
+        c.setStrokeColor(BRAND_BLUE)
+        c.setLineWidth(0.75)
+        c.line(self.margin, y, self.margin + self.content_width, y)
+
+    def _draw_labels(self, c, y, left, right=None):
+        c.setFont("Helvetica", 9)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawString(self.col1_x, y, left)
+        if right:
+            c.drawString(self.col2_x, y, right)
+
+    def _draw_static(self, c):
+        width, height = self.width, self.height
+        margin = self.margin
+
+        # Professional border
+        c.setStrokeColor(BRAND_BLUE)
+        c.setLineWidth(1.5)
+        c.rect(self.page_margin, self.page_margin, width - 2 * self.page_margin, height - 2 * self.page_margin, fill=0, stroke=1)
+
+        # Inner subtle border
+        c.setStrokeColor(BORDER_GRAY)
+        c.setLineWidth(0.5)
+        c.rect(self.inner_margin, self.inner_margin, width - 2 * self.inner_margin, height - 2 * self.inner_margin, fill=0, stroke=1)
+
+        # Header - logo and title
+        y = self.header_y
+        logo = get_logo_print_image(self.logo_width, self.logo_height)
+        if logo is not None:
+            try:
+                c.drawImage(
+                    logo,
+                    margin,
+                    y - self.logo_height,
+                    width=self.logo_width,
+                    height=self.logo_height,
+                    preserveAspectRatio=True,
+                    mask='auto'
+                )
+            except Exception as e:
+                logger.error(f"Failed to draw logo: {e}")
+                c.setFillColor(BRAND_BLUE)
+                c.setFont("Helvetica-Bold", 16)
+                c.drawString(margin, y - 12 * mm, "BAC HELICOPTERS")
+
+        c.setFillColor(BRAND_BLUE)
+        c.setFont("Helvetica-Bold", 18)
+        c.drawRightString(width - margin, y - 6 * mm, "PASSENGER TICKET")
+
+        c.setStrokeColor(BRAND_BLUE)
+        c.setLineWidth(1)
+        c.line(width - margin - 70 * mm, y - 9 * mm, width - margin, y - 9 * mm)
+
+        # Flight details labels
+        self._draw_rule(c, self.flight_rule_y)
+        self._draw_labels(c, self.name_y, "Passenger Name")
+        self._draw_labels(c, self.date_y, "Date of Flight", "ETD")
+        self._draw_labels(c, self.route_y, "Route", "PIC")
+        self._draw_labels(c, self.aircraft_y, "A/C Type", "A/C Reg")
+
+        # Weight declaration
+        self._draw_rule(c, self.weight_rule_y)
+        c.setFont("Helvetica-Bold", 10)
+        c.setFillColor(BRAND_BLUE)
+        c.drawString(margin, self.weight_title_y, "WEIGHT DECLARATION")
+
+        y = self.weight_box_y
+        for i, label in enumerate(["WEIGHT OF PAX", "NO OF BAG ITEMS", "WEIGHT OF BAG"]):
+            box_x = margin + i * (self.box_width + 5 * mm)
+
+            c.setFillColor(LIGHT_GRAY)
+            c.roundRect(box_x, y - self.box_height, self.box_width, self.box_height, 3, fill=1, stroke=0)
+
+            c.setStrokeColor(BORDER_GRAY)
+            c.setLineWidth(0.5)
+            c.roundRect(box_x, y - self.box_height, self.box_width, self.box_height, 3, fill=0, stroke=1)
+
+            c.setFont("Helvetica", 7)
+            c.setFillColor(MEDIUM_GRAY)
+            c.drawCentredString(box_x + self.box_width / 2, y - 5 * mm, label)
+
+        c.setFont("Helvetica-Oblique", 7)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawString(margin, self.weight_note_y, "Weights declared by passenger. To be verified at check-in.")
+
+        # Signature
+        self._draw_rule(c, self.signature_rule_y)
+        c.setFont("Helvetica-Bold", 10)
+        c.setFillColor(BRAND_BLUE)
+        c.drawString(margin, self.signature_title_y, "PASSENGER SIGNATURE")
+
+        y = self.signature_y
+        c.setStrokeColor(black)
+        c.setLineWidth(0.5)
+        c.line(margin, y - self.sig_height - 1 * mm, margin + self.sig_width, y - self.sig_height - 1 * mm)
+
+        c.setFont("Helvetica", 8)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawString(margin + self.sig_width + 10 * mm, y - 18 * mm, "Conditions Accepted: Yes")
+
+        # Acceptance banner
+        y = self.banner_y
+        c.setFillColor(BRAND_BLUE)
+        c.roundRect(margin, y - self.banner_height, self.content_width, self.banner_height, 2, fill=1, stroke=0)
+        c.setFillColor(white)
+        c.setFont("Helvetica-Bold", 7)
+        c.drawCentredString(width / 2, y - 5.5 * mm, ACCEPTANCE_TEXT)
+
+        # Conditions of carriage (compact two-column)
+        c.setFont("Helvetica-Bold", 8)
+        c.setFillColor(BRAND_BLUE)
+        c.drawString(margin, self.conditions_title_y, "CONDITIONS OF CARRIAGE")
+
+        with self._draw_lock:
+            for para, x, para_y in self.conditions:
+                para.drawOn(c, x, para_y)
+
+        # Dangerous goods notice (compact)
+        y = self.dg_y
+        c.setFont("Helvetica-Bold", 7)
+        c.setFillColor(BRAND_BLUE)
+        c.drawString(margin, y, "DANGEROUS GOODS NOT PERMITTED")
+        y -= 3 * mm
+
+        c.setFont("Helvetica", 6)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawString(margin, y, DG_NOTICE_TEXT)
+        y -= 4 * mm
+        c.drawString(margin, y, "Medicines and toiletries in limited quantities permitted. Full DG information provided separately.")
+
+        # Footer
+        c.setFont("Helvetica", 6)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawCentredString(width / 2, self.footer_y, FOOTER_TEXT)
+
+    def draw_fields(self, c, data, signature_bytes, signature_strokes=None):
+        """Stamp the per-passenger values onto a page that already carries the template.
+
+        The signature is drawn from signature_strokes as vector paths when
+        given, otherwise from the signature_bytes image.
+        """
+        width = self.width
+        margin = self.margin
+
+        # Ticket number
+        c.setFillColor(RED_ACCENT)
+        c.setFont("Helvetica-Bold", 14)
+        c.drawRightString(width - margin, self.header_y - 16 * mm, f"Ticket #: {data.get('ticket_number', 'N/A')}")
+
+        # Flight details
+        c.setFillColor(black)
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(self.col1_x, self.name_y - 5 * mm, data.get('name', ''))
+
+        c.setFont("Helvetica-Bold", 11)
+        for y, left, right in [
+            (self.date_y, 'flight_date', 'flight_time'),
+            (self.route_y, 'route', 'pilot'),
+            (self.aircraft_y, 'ac_type', 'registration'),
+        ]:
+            c.drawString(self.col1_x, y - 5 * mm, data.get(left, ''))
+            c.drawString(self.col2_x, y - 5 * mm, data.get(right, ''))
+
+        # Weight values
+        c.setFont("Helvetica-Bold", 14)
+        for i, value in enumerate([
+            f"{data.get('body_weight', '')} kg",
+            f"{data.get('num_bags', '0')}",
+            f"{data.get('bag_weight', '0')} kg",
+        ]):
+            box_x = margin + i * (self.box_width + 5 * mm)
+            c.drawCentredString(box_x + self.box_width / 2, self.weight_box_y - 13 * mm, value)
+
+        # Signature
+        y = self.signature_y
+        if signature_strokes:
+            self._draw_signature_strokes(c, signature_strokes, margin, y - self.sig_height)
+        elif signature_bytes:
+            try:
+                sig_reader = ImageReader(io.BytesIO(signature_bytes))
+                c.drawImage(
+                    sig_reader,
+                    margin,
+                    y - self.sig_height,
+                    width=self.sig_width,
+                    height=self.sig_height,
+                    preserveAspectRatio=True
+                )
+            except Exception as e:
+                logger.error(f"Failed to draw signature: {e}")
+
+        # Info next to signature
+        c.setFont("Helvetica", 8)
+        c.setFillColor(MEDIUM_GRAY)
+        info_x = margin + self.sig_width + 10 * mm
+        info_y = y - 3 * mm
+
+        c.drawString(info_x, info_y, f"Date: {data.get('timestamp', '').split(' ')[0] if data.get('timestamp') else ''}")
+        info_y -= 5 * mm
+        c.drawString(info_x, info_y, f"Email: {data.get('email', '')}")
+        info_y -= 5 * mm
+        dg_ack = "Yes" if data.get('dg_ack') == 'True' else "No"
+        c.drawString(info_x, info_y, f"DG Acknowledged: {dg_ack}")
+
+    def _draw_signature_strokes(self, c, signature, x, y):
+        """Draw pad strokes as paths, fitted and centred in the signature box like the image."""
+        scale = min(self.sig_width / signature['w'], self.sig_height / signature['h'])
+        left = x + (self.sig_width - signature['w'] * scale) / 2
+        top = y + self.sig_height - (self.sig_height - signature['h'] * scale) / 2
+
+        path = c.beginPath()
+        for stroke in signature['s']:
+            (start_x, start_y), rest = stroke[0], stroke[1:]
+            path.moveTo(left + start_x * scale, top - start_y * scale)
+            for point_x, point_y in rest:
+                path.lineTo(left + point_x * scale, top - point_y * scale)
+
+        c.saveState()
+        c.setStrokeColor(SIGNATURE_INK)
+        c.setLineWidth(signature['lw'] * scale)
+        c.setLineCap(1)
+        c.setLineJoin(1)
+        c.drawPath(path, stroke=1, fill=0)
+        c.restoreState()
+
+
+_ticket_template = None
+_ticket_template_lock = threading.Lock()
+
+
+def get_ticket_template():
+    """Return the process-wide ticket template, building it on first use."""
+    global _ticket_template
+    if _ticket_template is None:
+        with _ticket_template_lock:
+            if _ticket_template is None:
+                _ticket_template = TicketTemplate()
+    return _ticket_template
+
+
+def create_ticket_pdf(data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes=None):
+    """
+    Generate a clean, professional A4 PDF ticket matching BAC letterhead style.
+    Returns the PDF as bytes.
+    """
+    template = get_ticket_template()
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+
+    template.draw(c)
+    template.draw_fields(c, data, signature_bytes, signature_strokes)
+
+    c.save()
+    buffer.seek(0)
+    return buffer.getvalue()
+
+
+# =============================================================================
+# Ticket Rendering Backends
+# =============================================================================
+#
+# Rendering is CPU-bound ReportLab work. With PDF_RENDER_WORKERS > 0 tickets
+# are rendered in a pool of warm worker processes, so concurrent submissions
+# are not serialised behind the GIL of a single gunicorn worker. With 0 (the
+# default) tickets are rendered inline in the request thread as before.
+
+def get_pdf_render_workers():
+    return int(os.environ.get("PDF_RENDER_WORKERS", "0"))
+
+def get_pdf_render_max_queue():
+    return int(os.environ.get("PDF_RENDER_MAX_QUEUE", "8"))
+
+def get_pdf_render_timeout():
+    return float(os.environ.get("PDF_RENDER_TIMEOUT", "30"))
+
+def get_pdf_render_start_method():
+    return os.environ.get("PDF_RENDER_START_METHOD", "forkserver")
+
+
+class RenderBusyError(Exception):
+    """Raised when the render pool is saturated or a render does not finish in time."""
+
+
+def _warm_render_worker():
+    """Process pool initializer: build the template and logo image before the first ticket."""
+    template = get_ticket_template()
+    get_logo_print_image(template.logo_width, template.logo_height)
+
+
+class InlineRenderBackend:
+    """Render tickets in the calling thread."""
+
+    name = 'inline'
+
+    def render(self, data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes=None):
+        return create_ticket_pdf(data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes)
+
+    def shutdown(self):
+        pass
+
+
+class ProcessPoolRenderBackend:
+    """Render tickets in a pool of worker processes with a bounded queue."""
+
+    name = 'process'
+
+    def __init__(self, workers, max_queue, timeout, start_method):
+        self.workers = workers
+        self.timeout = timeout
+        self.start_method = start_method
+        # One slot per worker plus the allowed backlog; callers beyond that are turned away
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._executor_lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        ctx = multiprocessing.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            ctx.set_forkserver_preload([__name__])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_warm_render_worker)
+
+    def render(self, data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RenderBusyError("Ticket render queue is full")
+
+        executor = self._executor
+        try:
+            future = executor.submit(create_ticket_pdf, data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes)
+        except BaseException:
+            self._slots.release()
+            raise
+        # A render that outlives our wait still occupies a worker, so it keeps its slot until it finishes
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            future.cancel()
+            raise RenderBusyError(f"Ticket render did not finish within {self.timeout:.0f}s")
+        except BrokenProcessPool:
+            logger.error("Render process pool died, restarting it and rendering inline")
+            with self._executor_lock:
+                if self._executor is executor:
+                    self._executor = self._create_executor()
+            return create_ticket_pdf(data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_render_backend = None
+_render_backend_pid = None
+_render_backend_lock = threading.Lock()
+
+
+def get_render_backend():
+    """Return this process's render backend, creating it from the environment on first use."""
+    global _render_backend, _render_backend_pid
+    if _render_backend_pid == os.getpid():
+        return _render_backend
+
+    with _render_backend_lock:
+        if _render_backend_pid != os.getpid():
+            workers = get_pdf_render_workers()
+            if workers > 0:
+                _render_backend = ProcessPoolRenderBackend(
+                    workers,
+                    get_pdf_render_max_queue(),
+                    get_pdf_render_timeout(),
+                    get_pdf_render_start_method(),
+                )
+            else:
+                _render_backend = InlineRenderBackend()
+            _render_backend_pid = os.getpid()
+            logger.info(f"Ticket rendering backend: {_render_backend.name}")
+    return _render_backend
+
+
+def render_ticket_pdf(data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes=None):
+    """Render a ticket PDF through the configured backend. Returns the PDF as bytes."""
+    return get_render_backend().render(data, signature_bytes, photo1_bytes, photo2_bytes, signature_strokes)
+
+
+# =============================================================================
+# Ticket Archives
+# =============================================================================
+
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStreamSink:
+    """Write-only file object for zipfile; the streaming generator drains what was written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive of (arcname, path) entries chunk by chunk.
+
+    Members are stored rather than deflated, since PDFs are already
+    compressed, and only one chunk of one file is held in memory at a time.
+    """
+    sink = _ZipStreamSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as zf:
+        for arcname, path in entries:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                while True:
+                    chunk = src.read(ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory, written when the archive closes
+    yield sink.drain()
+
+
+def list_ticket_files(flight_ids, prefix_with_flight=False):
+    """(arcname, path) pairs for every ticket PDF of the given flights, in name order."""
+    entries = []
+    for flight_id in flight_ids:
+        flight_dir = TICKETS_DIR / flight_id
+        if not flight_dir.is_dir():
+            continue
+        for pdf_file in sorted(flight_dir.glob("*.pdf")):
+            arcname = f"{flight_id}/{pdf_file.name}" if prefix_with_flight else pdf_file.name
+            entries.append((arcname, pdf_file))
+    return entries
+
+
+def _ticket_dir_state(flight_id):
+    """{filename: [size, mtime_ns]} for every ticket PDF in the flight's directory."""
+    flight_dir = TICKETS_DIR / flight_id
+    if not flight_dir.is_dir():
+        return {}
+    state = {}
+    for pdf_file in flight_dir.glob("*.pdf"):
+        st = pdf_file.stat()
+        state[pdf_file.name] = [st.st_size, st.st_mtime_ns]
+    return state
+
+
+def _archive_etag(state):
+    return hashlib.sha1(json.dumps(sorted(state.items())).encode('utf-8')).hexdigest()
+
+
+def get_flight_archive_etag(flight_id):
+    """ETag for the flight's ticket archive as it would be now, without touching the archive."""
+    state = _ticket_dir_state(flight_id)
+    return _archive_etag(state) if state else None
+
+
+def _archive_lock_path(flight_id):
+    return ARCHIVE_DIR / f"{flight_id}.lock"
+
+
+def get_flight_archive(flight_id):
+    """Bring the flight's cached ticket ZIP up to date. Returns (path, etag), or (None, None) without tickets.
+
+    New tickets are appended to the archive in place, after its old end, so
+    the bytes a download has already been sized for never change. It is only
+    rebuilt, into a new file that replaces it, when a ticket already in it was
+    changed or removed. Read the archive under _archive_lock_path, or with
+    read_flight_archive, to avoid catching an append half written.
+    """
+    state = _ticket_dir_state(flight_id)
+    if not state:
+        return None, None
+
+    etag = _archive_etag(state)
+    zip_path = ARCHIVE_DIR / f"{flight_id}.zip"
+    meta_path = ARCHIVE_DIR / f"{flight_id}.json"
+
+    meta = _read_json(meta_path)
+    if meta and meta.get('etag') == etag and zip_path.exists():
+        return zip_path, etag
+
+    with file_lock(_archive_lock_path(flight_id)):
+        meta = _read_json(meta_path)
+        if meta and meta.get('etag') == etag and zip_path.exists():
+            return zip_path, etag
+
+        # Appending needs the archive to still hold everything meta last recorded
+        intact = meta and zip_path.exists() and zip_path.stat().st_size >= meta.get('size', float('inf'))
+        cached = meta['members'] if intact else {}
+        stale = any(state.get(name) != info for name, info in cached.items())
+        flight_dir = TICKETS_DIR / flight_id
+
+        if cached and not stale:
+            new_names = sorted(name for name in state if name not in cached)
+            with open(zip_path, 'r+b') as f:
+                f.truncate(meta['size'])  # drop the tail of an append that did not finish
+                with zipfile.ZipFile(f, 'a', zipfile.ZIP_STORED) as zf:
+                    # Leave the old central directory where it is; readers find the new one at the end
+                    zf.start_dir = meta['size']
+                    for name in new_names:
+                        zf.write(flight_dir / name, name)
+            action = 'Appended'
+        else:
+            new_names = sorted(state)
+            tmp_path = zip_path.with_name(f".{zip_path.name}.tmp")
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as zf:
+                for name in new_names:
+                    zf.write(flight_dir / name, name)
+            os.replace(tmp_path, zip_path)
+            action = 'Built'
+
+        _write_json_atomic(meta_path, {'etag': etag, 'size': zip_path.stat().st_size, 'members': state})
+        logger.info(f"{action} {len(new_names)} tickets in archive for {flight_id}")
+
+    return zip_path, etag
+
+
+def read_flight_archive(flight_id):
+    """The flight's ticket ZIP as bytes, or None without tickets."""
+    archive_path, _ = get_flight_archive(flight_id)
+    if archive_path is None:
+        return None
+    with file_lock(_archive_lock_path(flight_id)):
+        return archive_path.read_bytes()
+
+
+def create_booklet_pdf(rows, signatures=None):
+    """
+    Render passengers as the pages of one PDF, in the ticket layout.
+    The template form, with the logo and conditions text in it, is stored
+    once and referenced by every page. Returns the PDF as bytes.
+
+    signatures: {ticket_number: (signature_bytes, signature_strokes)}
+    """
+    signatures = signatures or {}
+    template = get_ticket_template()
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+
+    for row in rows:
+        signature_bytes, signature_strokes = signatures.get(str(row.get('ticket_number')), (None, None))
+        template.draw(c)
+        template.draw_fields(c, row, signature_bytes, signature_strokes)
+        c.showPage()
+
+    c.save()
+    return buffer.getvalue()
+
+
+def _booklet_etag(flight_id):
+    conn = get_manifest_db()
+    rows = conn.execute(
+        "SELECT COUNT(*) AS n, MAX(id) AS last_id FROM manifest_rows WHERE flight_id = ?", (flight_id,)
+    ).fetchone()
+    if not rows['n']:
+        return None
+    signatures = conn.execute(
+        "SELECT COUNT(*) AS n FROM ticket_signatures WHERE flight_id = ?", (flight_id,)
+    ).fetchone()
+    return hashlib.sha1(f"{flight_id}/{rows['n']}/{rows['last_id']}/{signatures['n']}".encode('utf-8')).hexdigest()
+
+
+def get_flight_booklet(flight_id):
+    """Bring the flight's cached booklet PDF up to date. Returns (path, etag), or (None, None) without passengers."""
+    etag = _booklet_etag(flight_id)
+    if etag is None:
+        return None, None
+
+    pdf_path = ARCHIVE_DIR / f"{flight_id}_booklet.pdf"
+    meta_path = ARCHIVE_DIR / f"{flight_id}_booklet.json"
+
+    meta = _read_json(meta_path)
+    if meta and meta.get('etag') == etag and pdf_path.exists():
+        return pdf_path, etag
+
+    with file_lock(ARCHIVE_DIR / f"{flight_id}.lock"):
+        meta = _read_json(meta_path)
+        if meta and meta.get('etag') == etag and pdf_path.exists():
+            return pdf_path, etag
+
+        rows = read_manifest(flight_id)
+        tmp_path = pdf_path.with_name(f".{pdf_path.name}.tmp")
+        tmp_path.write_bytes(create_booklet_pdf(rows, read_ticket_signatures(flight_id)))
+        os.replace(tmp_path, pdf_path)
+
+        _write_json_atomic(meta_path, {'etag': etag, 'pages': len(rows)})
+        logger.info(f"Built booklet of {len(rows)} tickets for {flight_id}")
+
+    return pdf_path, etag
+
+
+# =============================================================================
+# Manifest PDF
+# =============================================================================
+#
+# The pilot's load sheet: flight details, one table row per passenger, weight
+# totals and DG acknowledgements. Like the ticket, the static page is laid
+# out once per process and placed as a form XObject on every page. Each
+# flight's formatted rows and running totals are cached in memory and
+# extended with only the rows appended since, so a manifest update formats
+# just the new passengers.
+
+MANIFEST_FOOTER_TEXT = "BAC Helicopters (Pty) Ltd  •  Air Service License N1105D & G1106D"
+MANIFEST_LAYOUT_CACHE_SIZE = 64  # flights whose formatted rows are kept in memory
+
+
+class ManifestTemplate(FormTemplate):
+    """Pre-computed A4 load sheet layout shared by every manifest rendered in this process."""
+
+    FORM_NAME = "bacManifestTemplate"
+
+    # (heading, width, alignment) for each table column
+    COLUMNS = [
+        ('#', 9 * mm, 'left'),
+        ('TICKET', 18 * mm, 'left'),
+        ('NAME', 62 * mm, 'left'),
+        ('PAX WT (kg)', 24 * mm, 'right'),
+        ('BAGS', 14 * mm, 'right'),
+        ('BAG WT (kg)', 24 * mm, 'right'),
+        ('DG ACK', 18 * mm, 'right'),
+    ]
+
+    def __init__(self):
+        self.width, self.height = A4
+
+        self.page_margin = 12 * mm
+        self.margin = self.page_margin + 8 * mm
+        self.content_width = self.width - 2 * self.margin
+
+        self.logo_width = 50 * mm
+        self.logo_height = 18 * mm
+        self.row_height = 6.5 * mm
+        self.totals_height = 42 * mm
+
+        y = self.height - self.margin
+        self.header_y = y
+        y -= 26 * mm
+        self.details_rule_y = y
+        y -= 6 * mm
+        self.details_rows_y = [y, y - 11 * mm]
+        y -= 24 * mm
+        self.table_header_y = y
+        self.table_top_y = y - 3 * mm
+        self.footer_y = self.page_margin + 6 * mm
+        self.table_bottom_y = self.footer_y + 8 * mm
+
+        self.rows_per_page = int((self.table_top_y - self.table_bottom_y) // self.row_height)
+        # Rows that still leave room for the totals block below them
+        self.rows_with_totals = int((self.table_top_y - self.table_bottom_y - self.totals_height) // self.row_height)
+
+        self.column_x = []
+        x = self.margin
+        for heading, width, align in self.COLUMNS:
+            self.column_x.append(x + width if align == 'right' else x)
+            x += width
+        self.name_width = self.COLUMNS[2][1] - 2 * mm
+
+        detail_width = self.content_width / 3
+        self.details = [
+            (self.margin + (i % 3) * detail_width, self.details_rows_y[i // 3], label, key)
+            for i, (label, key) in enumerate([
+                ("A/CRAFT REG", 'registration'), ("A/C TYPE", 'ac_type'), ("PIC", 'pilot'),
+                ("DATE", 'date'), ("ETD", 'time'), ("ROUTING", 'route'),
+            ])
+        ]
+
+    def _draw_static(self, c):
+        width, margin = self.width, self.margin
+
+        c.setStrokeColor(BRAND_BLUE)
+        c.setLineWidth(1.5)
+        c.rect(self.page_margin, self.page_margin, width - 2 * self.page_margin, self.height - 2 * self.page_margin, fill=0, stroke=1)
+
+        # Header - logo and title
+        y = self.header_y
+        logo = get_logo_print_image(self.logo_width, self.logo_height)
+        if logo is not None:
+            try:
+                c.drawImage(logo, margin, y - self.logo_height, width=self.logo_width, height=self.logo_height,
+                            preserveAspectRatio=True, mask='auto')
+            except Exception as e:
+                logger.error(f"Failed to draw logo: {e}")
+                c.setFillColor(BRAND_BLUE)
+                c.setFont("Helvetica-Bold", 16)
+                c.drawString(margin, y - 12 * mm, "BAC HELICOPTERS")
+
+        c.setFillColor(BRAND_BLUE)
+        c.setFont("Helvetica-Bold", 15)
+        c.drawRightString(width - margin, y - 6 * mm, "PASSENGER AND CARGO MANIFEST")
+        c.setFont("Helvetica", 8)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawRightString(width - margin, y - 11 * mm, "BAC HELICOPTERS (PTY) LTD")
+
+        # Flight details labels
+        c.setStrokeColor(BRAND_BLUE)
+        c.setLineWidth(0.75)
+        c.line(margin, self.details_rule_y, width - margin, self.details_rule_y)
+        c.setFont("Helvetica", 8)
+        c.setFillColor(MEDIUM_GRAY)
+        for x, y, label, _ in self.details:
+            c.drawString(x, y, label)
+
+        # Table header
+        c.setFillColor(BRAND_BLUE)
+        c.rect(margin, self.table_header_y - 2 * mm, self.content_width, 6 * mm, fill=1, stroke=0)
+        c.setFillColor(white)
+        c.setFont("Helvetica-Bold", 7.5)
+        for (heading, _, align), x in zip(self.COLUMNS, self.column_x):
+            if align == 'right':
+                c.drawRightString(x - 1 * mm, self.table_header_y, heading)
+            else:
+                c.drawString(x + 1 * mm, self.table_header_y, heading)
+
+        c.setFont("Helvetica", 6)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawString(margin, self.footer_y, MANIFEST_FOOTER_TEXT)
+
+    def page_count(self, row_count):
+        full_pages, last_rows = divmod(row_count, self.rows_per_page)
+        if row_count and last_rows == 0:
+            full_pages, last_rows = full_pages - 1, self.rows_per_page
+        return full_pages + 1 + (last_rows > self.rows_with_totals)
+
+    def draw_page_fields(self, c, flight, page, pages, generated):
+        c.setFillColor(black)
+        c.setFont("Helvetica-Bold", 10)
+        for x, y, _, key in self.details:
+            c.drawString(x, y - 5 * mm, str(flight.get(key) or 'N/A'))
+
+        c.setFont("Helvetica", 6)
+        c.setFillColor(MEDIUM_GRAY)
+        c.drawRightString(self.width - self.margin, self.footer_y, f"Generated {generated}  •  Page {page} of {pages}")
+
+    def draw_rows(self, c, rows):
+        """Draw formatted rows from the top of the table. Returns the y below the last row."""
+        y = self.table_top_y
+        for i, row in enumerate(rows):
+            if i % 2:
+                c.setFillColor(LIGHT_GRAY)
+                c.rect(self.margin, y - self.row_height, self.content_width, self.row_height, fill=1, stroke=0)
+            c.setFillColor(black if row['dg_ack'] else RED_ACCENT)
+            c.setFont("Helvetica", 8.5)
+            text_y = y - self.row_height + 2 * mm
+            for (_, _, align), x, value in zip(self.COLUMNS, self.column_x, row['cells']):
+                if align == 'right':
+                    c.drawRightString(x - 1 * mm, text_y, value)
+                else:
+                    c.drawString(x + 1 * mm, text_y, value)
+            y -= self.row_height
+        return y
+
+    def draw_totals(self, c, totals, y):
+        margin = self.margin
+        y -= 3 * mm
+        c.setStrokeColor(BRAND_BLUE)
+        c.setLineWidth(0.75)
+        c.line(margin, y, margin + self.content_width, y)
+
+        y -= 6 * mm
+        c.setFont("Helvetica-Bold", 10)
+        c.setFillColor(BRAND_BLUE)
+        c.drawString(margin, y, "WEIGHT SUMMARY")
+
+        c.setFont("Helvetica", 9)
+        c.setFillColor(black)
+        value_x = margin + 60 * mm
+        for label, value in [
+            ("Passengers", f"{totals['passengers']}"),
+            ("Total pax weight", f"{totals['body_weight']:.1f} kg"),
+            ("Total bag items", f"{totals['bags']}"),
+            ("Total bag weight", f"{totals['bag_weight']:.1f} kg"),
+        ]:
+            y -= 5 * mm
+            c.drawString(margin, y, label)
+            c.drawRightString(value_x, y, value)
+
+        y -= 6 * mm
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(margin, y, "TOTAL WEIGHT")
+        c.drawRightString(value_x, y, f"{totals['body_weight'] + totals['bag_weight']:.1f} kg")
+
+        missing = totals['passengers'] - totals['dg_acknowledged']
+        c.setFont("Helvetica-Bold", 8)
+        if missing:
+            c.setFillColor(RED_ACCENT)
+            c.drawString(value_x + 12 * mm, y, f"{missing} passenger(s) have NOT acknowledged Dangerous Goods")
+        else:
+            c.setFillColor(BRAND_BLUE)
+            c.drawString(value_x + 12 * mm, y, "All passengers acknowledged Dangerous Goods")
+
+
+_manifest_template = None
+_manifest_template_lock = threading.Lock()
+
+
+def get_manifest_template():
+    """Return the process-wide manifest template, building it on first use."""
+    global _manifest_template
+    if _manifest_template is None:
+        with _manifest_template_lock:
+            if _manifest_template is None:
+                _manifest_template = ManifestTemplate()
+    return _manifest_template
+
+
+_manifest_layouts = OrderedDict()
+_manifest_layouts_lock = threading.Lock()
+
+
+def _empty_manifest_layout():
+    return {
+        'last_id': 0,
+        'flight': {},
+        'rows': [],
+        'totals': {'passengers': 0, 'body_weight': 0.0, 'bag_weight': 0.0, 'bags': 0, 'dg_acknowledged': 0},
+    }
+
+
+def _format_manifest_row(index, row, name_width):
+    name = row.get('name') or 'Unknown'
+    while name and stringWidth(name, "Helvetica", 8.5) > name_width:
+        name = name[:-1]
+    dg_ack = row.get('dg_ack') == 'True'
+    return {
+        'dg_ack': dg_ack,
+        'cells': [
+            str(index),
+            row.get('ticket_number') or '',
+            name,
+            row.get('body_weight') or 'N/A',
+            row.get('num_bags') or '0',
+            row.get('bag_weight') or '0',
+            "YES" if dg_ack else "NO",
+        ],
+    }
 
-    msg.attach(MIMEText(body, 'plain'))
+
+def _extend_manifest_layout(conn, flight_id, layout):
+    """Format the rows appended since layout was built. Returns the flight's total row count."""
+    conn.execute("BEGIN")
+    try:
+        new_rows = conn.execute(
+            f"SELECT id, {', '.join(MANIFEST_COLUMNS)} FROM manifest_rows WHERE flight_id = ? AND id > ? ORDER BY id",
+            (flight_id, layout['last_id'])
+        ).fetchall()
+        row_count = conn.execute(
+            "SELECT COUNT(*) AS n FROM manifest_rows WHERE flight_id = ?", (flight_id,)
+        ).fetchone()['n']
+    finally:
+        conn.execute("COMMIT")
+
+    name_width = get_manifest_template().name_width
+    totals = layout['totals']
+    for row in map(dict, new_rows):
+        if not layout['rows']:
+            layout['flight'] = _flight_info_from_row(row)
+        layout['rows'].append(_format_manifest_row(len(layout['rows']) + 1, row, name_width))
+        body_weight, bag_weight, bags = _manifest_row_weights(row)
+        totals['passengers'] += 1
+        totals['body_weight'] += body_weight
+        totals['bag_weight'] += bag_weight
+        totals['bags'] += bags
+        totals['dg_acknowledged'] += row.get('dg_ack') == 'True'
+        layout['last_id'] = row['id']
+    return row_count
+
+
+def get_manifest_layout(flight_id):
+    """Formatted rows, flight details and totals for a flight's manifest.
+
+    Only rows appended since the flight was last laid out in this process
+    are read and formatted. Returns a snapshot safe to render from.
+    """
+    with _manifest_layouts_lock:
+        layout = _manifest_layouts.pop(flight_id, None) or _empty_manifest_layout()
+
+    conn = get_manifest_db()
+    if _extend_manifest_layout(conn, flight_id, layout) != len(layout['rows']):
+        # The table changed underneath the cached rows (e.g. a restored database); start over
+        layout = _empty_manifest_layout()
+        _extend_manifest_layout(conn, flight_id, layout)
+
+    with _manifest_layouts_lock:
+        _manifest_layouts[flight_id] = layout
+        while len(_manifest_layouts) > MANIFEST_LAYOUT_CACHE_SIZE:
+            _manifest_layouts.popitem(last=False)
+    return _snapshot_manifest_layout(layout)
+
+
+def _snapshot_manifest_layout(layout):
+    return {
+        'last_id': layout['last_id'],
+        'flight': dict(layout['flight']),
+        'rows': list(layout['rows']),
+        'totals': dict(layout['totals']),
+    }
+
+
+def manifest_pdf_etag(layout):
+    return hashlib.sha1(f"{layout['last_id']}/{len(layout['rows'])}".encode('utf-8')).hexdigest()
+
+
+def create_manifest_pdf(flight_id, layout=None):
+    """Render a flight's load sheet. Returns the PDF as bytes."""
+    layout = layout or get_manifest_layout(flight_id)
+    template = get_manifest_template()
+    flight = layout['flight'] or _flight_info_from_id(flight_id)
+    rows = layout['rows']
+    pages = template.page_count(len(rows))
+    generated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.setTitle(f"Manifest {flight_id}")
+
+    for page in range(1, pages + 1):
+        template.draw(c)
+        template.draw_page_fields(c, flight, page, pages, generated)
+        page_rows = rows[(page - 1) * template.rows_per_page:page * template.rows_per_page]
+        y = template.draw_rows(c, page_rows)
+        if page == pages:
+            template.draw_totals(c, layout['totals'], y)
+        c.showPage()
+
+    c.save()
+    return buffer.getvalue()
+
+
+# =============================================================================
+# Passenger Photos
+# =============================================================================
+#
+# Uploaded photos are kept as sent under photos/<flight_id>/originals/ and a
+# background job writes the copy everything else uses: decoded, rotated
+# upright, stripped of EXIF and downsampled to the size it would print at.
+
+PHOTO_FORMATS = {'JPEG': '.jpg', 'MPO': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+PHOTO_MAX_SOURCE_PIXELS = 50_000_000  # reject decompression bombs before decoding
+PHOTO_PRINT_WIDTH = 90 * mm
+PHOTO_PRINT_HEIGHT = 90 * mm
+PHOTO_PRINT_DPI = 300
+PHOTO_JPEG_QUALITY = 85
+
+
+def detect_photo_format(fp):
+    """Return the image format of fp if it is an accepted photo, else None. Only the header is read."""
+    from PIL import Image
+
+    try:
+        with Image.open(fp) as img:
+            photo_format = img.format
+            pixels = img.width * img.height
+    except Exception:
+        return None
+    finally:
+        fp.seek(0)
+
+    if photo_format not in PHOTO_FORMATS or pixels > PHOTO_MAX_SOURCE_PIXELS:
+        return None
+    return photo_format
+
+
+def store_passenger_photo(flight_id, ticket_stem, slot, photo, photo_format):
+    """Save an uploaded photo (bytes or a spooled upload) as the original and queue normalisation.
+
+    Returns the queued job.
+    """
+    photo_dir = PHOTOS_DIR / flight_id
+    originals_dir = photo_dir / "originals"
+    originals_dir.mkdir(parents=True, exist_ok=True)
+
+    original_path = originals_dir / f"{ticket_stem}_{slot}{PHOTO_FORMATS[photo_format]}"
+    if isinstance(photo, bytes):
+        original_path.write_bytes(photo)
+    else:
+        photo.save(original_path)
+
+    return enqueue_job('normalise_photo', {
+        'original_path': str(original_path),
+        'output_path': str(photo_dir / f"{ticket_stem}_{slot}.jpg"),
+    })
+
+
+def normalise_photo(original_path, output_path):
+    """Write an upright, EXIF-free JPEG of original_path no larger than its print size."""
+    from PIL import Image, ImageOps
+
+    max_px = (round(PHOTO_PRINT_WIDTH / 72 * PHOTO_PRINT_DPI), round(PHOTO_PRINT_HEIGHT / 72 * PHOTO_PRINT_DPI))
+    with Image.open(original_path) as img:
+        if img.width * img.height > PHOTO_MAX_SOURCE_PIXELS:
+            raise ValueError(f"{img.width}x{img.height} image is too large to process")
+        # Let the JPEG decoder downscale by a power of two while loading
+        img.draft('RGB', max_px)
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        img.thumbnail(max_px, Image.LANCZOS)
+        buffer = io.BytesIO()
+        # No exif= argument, so nothing from the original's metadata is carried over
+        img.save(buffer, format='JPEG', quality=PHOTO_JPEG_QUALITY, optimize=True)
+
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    tmp_path.write_bytes(buffer.getvalue())
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+# =============================================================================
+# HTTP Client
+# =============================================================================
+#
+# SendGrid and Microsoft Graph calls share one pooled requests.Session per
+# process, so repeat calls reuse TCP/TLS connections. http_request adds
+# default timeouts, retries with jittered backoff on connection errors and
+# 429/5xx (honouring Retry-After), and per-upstream latency counters.
+
+HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
+HTTP_IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+HTTP_LATENCY_SAMPLES = 256  # recent calls kept per upstream for percentiles
+
+
+def get_http_connect_timeout():
+    return float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10"))
+
+def get_http_read_timeout():
+    return float(os.environ.get("HTTP_READ_TIMEOUT", "60"))
+
+def get_http_max_retries():
+    return int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+
+def get_http_retry_base_seconds():
+    return float(os.environ.get("HTTP_RETRY_BASE_SECONDS", "0.5"))
+
+def get_http_max_retry_wait():
+    return float(os.environ.get("HTTP_MAX_RETRY_WAIT", "30"))
+
+def get_http_pool_size():
+    """Connections kept open per host."""
+    return int(os.environ.get("HTTP_POOL_SIZE", "10"))
+
+
+class UpstreamMetrics:
+    """Call counts and latency per upstream service."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._upstreams = {}
+
+    def record(self, upstream, elapsed, status=None, retried=False):
+        with self._lock:
+            entry = self._upstreams.setdefault(upstream, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'last_status': None, 'recent_ms': deque(maxlen=HTTP_LATENCY_SAMPLES),
+            })
+            elapsed_ms = elapsed * 1000
+            entry['calls'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['recent_ms'].append(elapsed_ms)
+            entry['last_status'] = status
+            if status is None or status >= 400:
+                entry['errors'] += 1
+            if retried:
+                entry['retries'] += 1
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for upstream, entry in self._upstreams.items():
+                recent = sorted(entry['recent_ms'])
+                result[upstream] = {
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'retries': entry['retries'],
+                    'mean_ms': round(entry['total_ms'] / entry['calls'], 1),
+                    'p50_ms': round(recent[len(recent) // 2], 1),
+                    'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 1),
+                    'max_ms': round(entry['max_ms'], 1),
+                    'last_status': entry['last_status'],
+                }
+            return result
+
+
+http_metrics = UpstreamMetrics()
+
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Return this process's pooled requests.Session."""
+    global _http_session, _http_session_pid
+    if _http_session_pid == os.getpid():
+        return _http_session
+
+    with _http_session_lock:
+        if _http_session_pid != os.getpid():
+            session = requests.Session()
+            pool_size = get_http_pool_size()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+            _http_session_pid = os.getpid()
+    return _http_session
+
+
+def _retry_after_seconds(resp):
+    """Seconds requested by a Retry-After header, or None if absent or unparseable."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _failed_before_sending(error):
+    """True if a requests error happened while connecting, so the server never saw the request."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.Timeout):
+        return False
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+def _retryable_response(resp, idempotent):
+    """Whether a response status is worth retrying. Non-idempotent requests are only
+    retried when the server says it did not process them (429, or 503 with Retry-After)."""
+    if idempotent:
+        return resp.status_code in HTTP_RETRY_STATUSES
+    return resp.status_code == 429 or (resp.status_code == 503 and 'Retry-After' in resp.headers)
+
+
+def http_request(upstream, method, url, retry_unsafe=False, **kwargs):
+    """Make an HTTP request through the shared session, retrying transient failures.
+
+    Idempotent methods are retried on connection errors, timeouts and
+    429/5xx responses, up to HTTP_MAX_RETRIES times. Other methods (POST,
+    PATCH) may already have been acted on after a read timeout or 5xx, so
+    they are only retried when they failed while connecting, or on 429 or
+    503 with Retry-After; pass retry_unsafe=True for requests that are safe
+    to repeat. The wait is the response's Retry-After when given, otherwise
+    exponential backoff with full jitter. The last response is returned
+    whatever its status; the last connection error is raised.
+    """
+    kwargs.setdefault('timeout', (get_http_connect_timeout(), get_http_read_timeout()))
+    session = get_http_session()
+    max_retries = get_http_max_retries()
+    idempotent = retry_unsafe or method.upper() in HTTP_IDEMPOTENT_METHODS
+
+    for attempt in range(max_retries + 1):
+        retrying = attempt < max_retries
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            retrying = retrying and (idempotent or _failed_before_sending(e))
+            http_metrics.record(upstream, time.perf_counter() - start, retried=retrying)
+            if not retrying:
+                raise
+            wait = random.uniform(0, get_http_retry_base_seconds() * 2 ** attempt)
+            logger.warning(f"{upstream} {method} failed ({type(e).__name__}), retrying in {wait:.1f}s")
+        else:
+            retrying = retrying and _retryable_response(resp, idempotent)
+            http_metrics.record(upstream, time.perf_counter() - start, resp.status_code, retried=retrying)
+            if not retrying:
+                return resp
+            wait = _retry_after_seconds(resp)
+            if wait is None:
+                wait = random.uniform(0, get_http_retry_base_seconds() * 2 ** attempt)
+            logger.warning(f"{upstream} {method} returned {resp.status_code}, retrying in {wait:.1f}s")
+            resp.close()
+
+        time.sleep(min(wait, get_http_max_retry_wait()))
+
+
+# =============================================================================
+# Email Functions
+# =============================================================================
+
+def get_sendgrid_api_key():
+    """Get SendGrid API key from environment."""
+    return os.environ.get("SENDGRID_API_KEY", "")
+
+
+def is_sendgrid_configured():
+    """Check if SendGrid is configured."""
+    return bool(get_sendgrid_api_key())
+
+
+def is_smtp_configured():
+    """Check if SMTP is configured."""
+    return bool(get_smtp_host() and get_smtp_user() and get_smtp_password())
+
+
+def send_email_sendgrid(to_emails, subject, body, attachments=None):
+    """
+    Send email via SendGrid HTTP API.
+    attachments: list of (filename, bytes, mimetype) tuples
+    """
+    api_key = get_sendgrid_api_key()
+    if not api_key:
+        logger.error("SendGrid API key not configured")
+        return False
+
+    # Ensure to_emails is a list
+    if isinstance(to_emails, str):
+        to_emails = [to_emails]
+
+    # Build personalizations (recipients)
+    personalizations = [{
+        "to": [{"email": email.strip()} for email in to_emails if email.strip()]
+    }]
+
+    # Build the email payload
+    payload = {
+        "personalizations": personalizations,
+        "from": {"email": get_from_email(), "name": "BAC Helicopters"},
+        "subject": subject,
+        "content": [{"type": "text/plain", "value": body}]
+    }
+
+    # Add attachments if any
+    if attachments:
+        payload["attachments"] = []
+        for filename, data, mimetype in attachments:
+            payload["attachments"].append({
+                "content": base64.b64encode(data).decode('utf-8'),
+                "filename": filename,
+                "type": mimetype,
+                "disposition": "attachment"
+            })
+
+    # Send via SendGrid API
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    try:
+        logger.info(f"Sending email via SendGrid to {to_emails}")
+        response = http_request(
+            'sendgrid', 'POST',
+            "https://api.sendgrid.com/v3/mail/send",
+            headers=headers,
+            json=payload
+        )
+
+        if response.status_code in [200, 202]:
+            logger.info(f"Email sent successfully via SendGrid to {to_emails}")
+            return True
+        else:
+            logger.error(f"SendGrid error: {response.status_code} - {response.text}")
+            return False
+    except Exception as e:
+        logger.error(f"SendGrid request failed: {type(e).__name__}: {e}")
+        return False
+
+
+class _PooledSMTPConnection:
+    def __init__(self, server, mode):
+        self.server = server
+        self.mode = mode
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of logged-in SMTP connections.
+
+    Connections are reused across messages instead of paying for a TCP
+    connect, TLS handshake and login every time. Idle connections are
+    checked with NOOP before reuse, closed after SMTP_IDLE_TIMEOUT, and
+    retired after SMTP_MAX_MESSAGES_PER_CONNECTION messages.
+    """
+
+    def __init__(self, size, max_messages, idle_timeout, noop_interval):
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.noop_interval = noop_interval
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._mode = None  # 'ssl' or 'starttls' once a connection has succeeded
+        self.connects = 0
+        self.reuses = 0
+        self.discards = 0
+
+    def _connect(self):
+        """Open and log in a new connection, trying implicit SSL before STARTTLS."""
+        smtp_host = get_smtp_host()
+        ssl_port = get_smtp_ssl_port()
+
+        # Try SSL first (often works when 587 is blocked by hosting providers)
+        if self._mode != 'starttls' and ssl_port:
+            try:
+                logger.info(f"Attempting SMTP_SSL connection to {smtp_host}:{ssl_port}")
+                server = smtplib.SMTP_SSL(smtp_host, ssl_port, timeout=30)
+                try:
+                    server.login(get_smtp_user(), get_smtp_password())
+                except Exception:
+                    server.close()
+                    raise
+                self._mode = 'ssl'
+                self.connects += 1
+                return _PooledSMTPConnection(server, 'ssl')
+            except Exception as ssl_error:
+                logger.warning(f"SSL connection on port {ssl_port} failed: {ssl_error}")
+                logger.info(f"Falling back to port {get_smtp_port()}...")
+
+        smtp_port = get_smtp_port()
+        logger.info(f"Connecting to SMTP: {smtp_host}:{smtp_port}")
+        server = smtplib.SMTP(smtp_host, smtp_port, timeout=30)
+        try:
+            if get_smtp_use_tls():
+                server.starttls()
+            server.login(get_smtp_user(), get_smtp_password())
+        except Exception:
+            server.close()
+            raise
+        self._mode = 'starttls'
+        self.connects += 1
+        return _PooledSMTPConnection(server, 'starttls')
+
+    def _close(self, conn):
+        try:
+            conn.server.quit()
+        except Exception:
+            conn.server.close()
+
+    def _checkout(self):
+        """Return a healthy idle connection, or None if a new one is needed."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn = self._idle.pop()
+
+            idle_for = time.monotonic() - conn.last_used
+            if idle_for > self.idle_timeout:
+                self._close(conn)
+                continue
+            if idle_for > self.noop_interval:
+                try:
+                    if conn.server.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP rejected")
+                except Exception:
+                    self.discards += 1
+                    conn.server.close()
+                    continue
+            self.reuses += 1
+            return conn
+
+    def _checkin(self, conn):
+        conn.last_used = time.monotonic()
+        if conn.sent >= self.max_messages:
+            self._close(conn)
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    def send_message(self, msg):
+        """Send msg over a pooled connection, reconnecting once if a reused one has gone stale."""
+        with self._slots:
+            conn = self._checkout()
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = self._connect()
+                try:
+                    conn.server.send_message(msg)
+                except smtplib.SMTPRecipientsRefused:
+                    self._checkin(conn)
+                    raise
+                except (smtplib.SMTPServerDisconnected, OSError, smtplib.SMTPResponseException) as e:
+                    if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421:
+                        # Rejected message; smtplib has already reset the session
+                        self._checkin(conn)
+                        raise
+                    self.discards += 1
+                    conn.server.close()
+                    if not reused:
+                        raise
+                    logger.info("Pooled SMTP connection went stale, reconnecting")
+                    conn, reused = None, False
+                    continue
+                conn.sent += 1
+                self._checkin(conn)
+                return conn.mode
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            'size': self.size,
+            'idle': idle,
+            'mode': self._mode,
+            'connects': self.connects,
+            'reuses': self.reuses,
+            'discards': self.discards,
+        }
+
+
+_smtp_pool = None
+_smtp_pool_pid = None
+_smtp_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """Return this process's SMTP connection pool, creating it on first use."""
+    global _smtp_pool, _smtp_pool_pid
+    if _smtp_pool_pid == os.getpid():
+        return _smtp_pool
+
+    with _smtp_pool_lock:
+        if _smtp_pool_pid != os.getpid():
+            _smtp_pool = SMTPConnectionPool(
+                get_smtp_pool_size(),
+                get_smtp_max_messages_per_connection(),
+                get_smtp_idle_timeout(),
+                get_smtp_noop_interval(),
+            )
+            _smtp_pool_pid = os.getpid()
+            atexit.register(_smtp_pool.close_all)
+    return _smtp_pool
+
+
+def build_email_message(to_emails, subject, body, attachments=None):
+    """
+    Build the MIME message for an email.
+
+    attachments: list of (filename, bytes, mimetype) tuples
+    """
+    msg = MIMEMultipart()
+    msg['From'] = get_from_email()
+    msg['To'] = ', '.join(to_emails) if isinstance(to_emails, list) else to_emails
+    msg['Subject'] = subject
+
+    msg.attach(MIMEText(body, 'plain'))
 
     if attachments:
         for filename, data, mimetype in attachments:
@@ -787,291 +2750,2057 @@ def send_email(to_emails, subject, body, attachments=None):
             encoders.encode_base64(part)
             part.add_header('Content-Disposition', f'attachment; filename="{filename}"')
             msg.attach(part)
+    return msg
+
+
+def _message_contents(msg):
+    """Recover (to_emails, subject, body, attachments) from a message built by build_email_message."""
+    to_emails = [address for _, address in getaddresses(msg.get_all('To', [])) if address]
+    body = ''
+    attachments = []
+    for part in msg.walk():
+        if part.is_multipart():
+            continue
+        filename = part.get_filename()
+        if filename:
+            attachments.append((filename, part.get_payload(decode=True), part.get_content_type()))
+        elif part.get_content_type() == 'text/plain' and not body:
+            body = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='replace')
+    return to_emails, str(make_header(decode_header(msg['Subject'] or ''))), body, attachments
+
+
+def deliver_message(msg):
+    """
+    Deliver a MIME message, trying SendGrid first, then SMTP.
+    Returns (error, permanent); error is None when the message was delivered.
+    """
+    error = "No email transport configured"
+
+    # Try SendGrid first (works on Railway)
+    if is_sendgrid_configured():
+        if send_email_sendgrid(*_message_contents(msg)):
+            return None, False
+        logger.warning("SendGrid failed, trying SMTP fallback...")
+        error = "SendGrid delivery failed"
+
+    if is_smtp_configured():
+        try:
+            mode = get_smtp_pool().send_message(msg)
+            logger.info(f"Email sent successfully via {mode.upper()} to {msg['To']}")
+            return None, False
+        except smtplib.SMTPRecipientsRefused as e:
+            # Retrying will not make the server accept these addresses
+            logger.error(f"SMTP refused all recipients: {e.recipients}")
+            return f"Recipients refused: {', '.join(e.recipients)}", True
+        except smtplib.SMTPAuthenticationError as e:
+            logger.error(f"SMTP Authentication failed: {e}")
+            error = f"SMTP authentication failed: {e}"
+        except smtplib.SMTPException as e:
+            logger.error(f"SMTP error: {e}")
+            error = f"SMTP error: {e}"
+        except Exception as e:
+            logger.error(f"Failed to send email: {type(e).__name__}: {e}")
+            error = f"{type(e).__name__}: {e}"
+
+    return error, False
+
+
+def send_email(to_emails, subject, body, attachments=None, on_outcome=None):
+    """
+    Send an email with optional attachments.
+    The message is spooled to the outbox, then sent via SendGrid or SMTP.
+
+    Returns True when delivered, None when delivery failed and the outbox
+    will retry it, and False when it will not be retried: no transport is
+    configured and the message was only saved as an .eml file, or the server
+    refused it outright.
+
+    attachments: list of (filename, bytes, mimetype) tuples
+    on_outcome: (name, payload) of an outbox_callback to run once the outbox
+        delivers or gives up on the message after a failed first attempt
+    """
+    msg = build_email_message(to_emails, subject, body, attachments)
+
+    if not (is_sendgrid_configured() or is_smtp_configured()):
+        # Save as .eml file
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        slug = slugify(subject)[:30]
+        eml_path = OUTBOX_DIR / f"{timestamp}_{slug}.eml"
+        eml_path.write_bytes(msg.as_bytes())
+        logger.info(f"Email saved to {eml_path}")
+        return False
+
+    meta = spool_message(msg, on_outcome)
+    if deliver_spooled_message(meta, msg, notify=False):
+        return True
+    if 'dead_at' in meta:
+        return False
+    # Have the flusher pick up the new retry time rather than sleep through it
+    ensure_outbox_flusher()
+    _outbox_wakeup.set()
+    return None
+
+
+def send_passenger_email(passenger_data, ticket_pdf_bytes):
+    """Send ticket email to passenger."""
+    emails = [e.strip() for e in passenger_data['email'].split(',') if e.strip()]
+
+    subject = f"Your BAC Helicopters Ticket — {passenger_data['flight_date']} {passenger_data['route']} ({passenger_data['registration']})"
+
+    body = f"""Dear {passenger_data['name']},
+
+Thank you for choosing BAC Helicopters.
+
+Please find attached your ticket for the following flight:
+
+Date: {passenger_data['flight_date']}
+Time: {passenger_data['flight_time']}
+Route: {passenger_data['route']}
+Aircraft: {passenger_data['registration']}
+Pilot: {passenger_data['pilot']}
+
+Also attached is the Dangerous Goods information sheet for your reference.
+
+Please arrive at the designated check-in location at least 15 minutes before your scheduled departure time.
+
+Safe travels!
+
+BAC Helicopters
+"""
+
+    attachments = [
+        (f"ticket_{passenger_data['name'].replace(' ', '_')}.pdf", ticket_pdf_bytes, "application/pdf")
+    ]
+
+    # Attach DG PDF if available
+    dg_pdf_bytes = get_dg_pdf_bytes()
+    if dg_pdf_bytes:
+        attachments.append(
+            ("Dangerous_Goods_Information.pdf", dg_pdf_bytes, "application/pdf")
+        )
+
+    return send_email(emails, subject, body, attachments)
+
+
+def send_pilot_email(flight_id, flight_summary, on_outcome=None):
+    """Send the manifest PDF to the pilot. Scheduled through schedule_pilot_email."""
+    pilot_email = get_pilot_email()
+    if not pilot_email:
+        logger.warning("PILOT_EMAIL not configured, skipping pilot notification")
+        return None
+
+    layout = get_manifest_layout(flight_id)
+    totals = layout['totals']
+    flight = layout['flight'] or flight_summary
+    passenger_count = totals['passengers']
+    total_weight = totals['body_weight'] + totals['bag_weight']
+
+    subject = f"[MANIFEST UPDATE] {flight_summary.get('route', flight_id)} - {flight_summary.get('date', 'N/A')} - {passenger_count} PAX"
+
+    body = f"""PASSENGER AND CARGO MANIFEST
+BAC HELICOPTERS (PTY) LTD
+
+A/CRAFT REG:    {flight.get('registration') or 'N/A'}
+DATE / ETD:     {flight.get('date') or 'N/A'} {flight.get('time') or ''}
+ROUTING:        {flight.get('route') or 'N/A'}
+
+PASSENGERS:     {passenger_count}
+TOTAL WEIGHT:   {total_weight:.1f} kg
+
+The attached PDF is the full manifest with each passenger's weights and
+Dangerous Goods acknowledgement. It updates automatically each time a
+passenger completes their registration.
+
+Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+BAC Helicopters (Pty) Ltd - Air Service License N1105D & G1106D
+"""
+
+    attachments = [(f"manifest_{flight_id}.pdf", create_manifest_pdf(flight_id, layout), "application/pdf")]
+
+    # Optional extras for pilots who still want the individual tickets or the CSV
+    if get_pilot_email_attach_tickets():
+        archive = read_flight_archive(flight_id)
+        if archive:
+            attachments.append((f"manifest_{flight_id}_tickets.zip", archive, "application/zip"))
+
+    if get_pilot_email_attach_csv():
+        manifest_csv = export_manifest_csv(flight_id)
+        if manifest_csv:
+            attachments.append((f"manifest_{flight_id}.csv", manifest_csv, "text/csv"))
+
+    logger.info(f"Sending pilot manifest update for {flight_id} to {pilot_email}")
+    return send_email([pilot_email], subject, body, attachments, on_outcome)
+
+
+# =============================================================================
+# Outbox
+# =============================================================================
+#
+# Every email is written to OUTBOX_DIR/spool before it is sent, so a failed
+# send or a crash mid-send does not lose it. A spooled message is <id>.eml
+# plus <id>.json holding its delivery state. The sender owns a new message
+# for OUTBOX_SEND_LEASE seconds; after that the flusher thread retries it
+# with exponential backoff, and moves it to OUTBOX_DIR/dead once it has
+# failed OUTBOX_MAX_ATTEMPTS times or was refused outright.
+
+OUTBOX_SPOOL_DIR = OUTBOX_DIR / "spool"
+OUTBOX_DEAD_DIR = OUTBOX_DIR / "dead"
+OUTBOX_SPOOL_DIR.mkdir(exist_ok=True)
+OUTBOX_DEAD_DIR.mkdir(exist_ok=True)
+
+OUTBOX_FLUSH_LOCK_FILE = OUTBOX_DIR / "outbox_flush.lock"
+OUTBOX_SEND_LEASE = 300  # seconds a sender owns a new message before the flusher may retry it
+OUTBOX_POLL_INTERVAL = 30.0
+OUTBOX_MAX_BACKOFF = 3600
+
+
+def get_outbox_max_attempts():
+    return int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+
+def get_outbox_retry_base_seconds():
+    return float(os.environ.get("OUTBOX_RETRY_BASE_SECONDS", "60"))
+
+
+_outbox_wakeup = threading.Event()
+_outbox_lock = threading.Lock()
+_outbox_flusher_pid = None
+_outbox_counters = {
+    'spooled': 0,
+    'delivered_first_attempt': 0,
+    'delivered_on_retry': 0,
+    'retries_scheduled': 0,
+    'dead_lettered': 0,
+}
+_outbox_last_flush = None
+
+
+def _count_outbox(counter):
+    with _outbox_lock:
+        _outbox_counters[counter] += 1
+
+
+def _outbox_paths(message_id, directory=None):
+    directory = directory or OUTBOX_SPOOL_DIR
+    return directory / f"{message_id}.eml", directory / f"{message_id}.json"
+
+
+def spool_message(msg, on_outcome=None):
+    """Write a MIME message to the spool. Returns its state dict.
+
+    The .eml is synced to disk before the .json is written, so a message
+    with state always has its full content.
+    """
+    now = time.time()
+    message_id = f"{int(now * 1000)}-{uuid.uuid4().hex[:8]}"
+    eml_path, meta_path = _outbox_paths(message_id)
+
+    tmp_path = eml_path.with_name(f".{eml_path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(msg.as_bytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, eml_path)
+
+    meta = _new_outbox_meta(message_id, msg, now)
+    meta['next_attempt_at'] = now + OUTBOX_SEND_LEASE
+    if on_outcome:
+        meta['on_outcome'] = on_outcome
+    _write_json_atomic(meta_path, meta)
+    _count_outbox('spooled')
+    return meta
+
+
+OUTBOX_CALLBACKS = {}
+
+
+def outbox_callback(name):
+    """Register func(delivered, error, **payload) to run when the outbox delivers or dead-letters a message."""
+    def register(func):
+        OUTBOX_CALLBACKS[name] = func
+        return func
+    return register
+
+
+def _run_outbox_callback(meta, delivered):
+    if not meta.get('on_outcome'):
+        return
+    name, payload = meta['on_outcome']
+    try:
+        OUTBOX_CALLBACKS[name](delivered, None if delivered else meta['last_error'], **payload)
+    except Exception:
+        logger.exception(f"Outbox callback {name} failed for email {meta['id']}")
+
+
+def _new_outbox_meta(message_id, msg, created_at):
+    return {
+        'id': message_id,
+        'to': msg['To'],
+        'subject': msg['Subject'],
+        'attempts': 0,
+        'created_at': created_at,
+        'next_attempt_at': created_at,
+        'last_error': None,
+    }
+
+
+def deliver_spooled_message(meta, msg=None, notify=True):
+    """Try to deliver a spooled message, then remove, reschedule or dead-letter it. Returns True if delivered.
+
+    With notify, the message's on_outcome callback runs once it is delivered
+    or dead-lettered; the sender's own first attempt passes notify=False.
+    """
+    eml_path, meta_path = _outbox_paths(meta['id'])
+    if msg is None:
+        msg = message_from_bytes(eml_path.read_bytes())
+
+    error, permanent = deliver_message(msg)
+    meta['attempts'] += 1
+
+    if error is None:
+        meta_path.unlink(missing_ok=True)
+        eml_path.unlink(missing_ok=True)
+        _count_outbox('delivered_first_attempt' if meta['attempts'] == 1 else 'delivered_on_retry')
+        if notify:
+            _run_outbox_callback(meta, True)
+        return True
+
+    meta['last_error'] = error
+    if permanent or meta['attempts'] >= get_outbox_max_attempts():
+        dead_eml, dead_meta = _outbox_paths(meta['id'], OUTBOX_DEAD_DIR)
+        meta['dead_at'] = time.time()
+        os.replace(eml_path, dead_eml)
+        _write_json_atomic(dead_meta, meta)
+        meta_path.unlink(missing_ok=True)
+        _count_outbox('dead_lettered')
+        logger.error(f"Email {meta['id']} to {meta['to']} moved to dead letters after {meta['attempts']} attempts: {error}")
+        if notify:
+            _run_outbox_callback(meta, False)
+    else:
+        delay = min(get_outbox_retry_base_seconds() * 2 ** (meta['attempts'] - 1), OUTBOX_MAX_BACKOFF)
+        meta['next_attempt_at'] = time.time() + delay
+        _write_json_atomic(meta_path, meta)
+        _count_outbox('retries_scheduled')
+        logger.warning(f"Email {meta['id']} to {meta['to']} failed, retry {meta['attempts']} in {delay:.0f}s: {error}")
+    return False
+
+
+def _recover_orphaned_messages(now):
+    """Give state to .eml files left without it by a crash during spooling."""
+    for eml_path in OUTBOX_SPOOL_DIR.glob("*.eml"):
+        meta_path = eml_path.with_suffix('.json')
+        if meta_path.exists() or now - eml_path.stat().st_mtime < OUTBOX_SEND_LEASE:
+            continue
+        msg = message_from_bytes(eml_path.read_bytes())
+        _write_json_atomic(meta_path, _new_outbox_meta(eml_path.stem, msg, eml_path.stat().st_mtime))
+        logger.info(f"Recovered spooled email {eml_path.stem}")
+
+
+def flush_outbox():
+    """Deliver every spooled message that is due, oldest first.
+
+    Returns a stats dict, or None if another process is flushing.
+    """
+    global _outbox_last_flush
+    with file_lock(OUTBOX_FLUSH_LOCK_FILE, blocking=False) as locked:
+        if not locked:
+            return None
+
+        now = time.time()
+        _recover_orphaned_messages(now)
+        stats = {'due': 0, 'delivered': 0, 'failed': 0, 'next_due_in': None}
+        for meta_path in sorted(OUTBOX_SPOOL_DIR.glob("*.json")):
+            meta = _read_json(meta_path)
+            if meta is None:
+                continue
+            if not meta_path.with_suffix('.eml').exists():
+                meta_path.unlink(missing_ok=True)  # dead-lettered, state not yet cleaned up
+                continue
+            if meta['next_attempt_at'] > now:
+                wait = meta['next_attempt_at'] - now
+                stats['next_due_in'] = min(stats['next_due_in'] or wait, wait)
+                continue
+
+            stats['due'] += 1
+            if deliver_spooled_message(meta):
+                stats['delivered'] += 1
+            else:
+                stats['failed'] += 1
+
+        _outbox_last_flush = time.time()
+        return stats
+
+
+def _outbox_flush_loop():
+    while True:
+        try:
+            stats = flush_outbox()
+        except Exception:
+            logger.exception("Outbox flush failed")
+            stats = None
+
+        wait = OUTBOX_POLL_INTERVAL
+        if stats:
+            if stats['due']:
+                logger.info(f"Outbox flush: {stats}")
+            if stats['next_due_in'] is not None:
+                wait = min(wait, max(stats['next_due_in'], 1.0))
+
+        if _outbox_wakeup.wait(wait):
+            _outbox_wakeup.clear()
+
+
+def ensure_outbox_flusher():
+    """Start the outbox flusher thread in this process if it is not already running."""
+    global _outbox_flusher_pid
+    if _outbox_flusher_pid == os.getpid():
+        return
+
+    with _outbox_lock:
+        if _outbox_flusher_pid == os.getpid():
+            return
+        _outbox_flusher_pid = os.getpid()
+        threading.Thread(target=_outbox_flush_loop, name="outbox-flusher", daemon=True).start()
+        logger.info(f"Started outbox flusher (pid {os.getpid()})")
+
+
+def get_outbox_stats():
+    """Spool depth and age, dead letters, and this process's delivery counters."""
+    now = time.time()
+    depth = due = 0
+    spool_bytes = 0
+    oldest = None
+    for meta_path in OUTBOX_SPOOL_DIR.glob("*.json"):
+        meta = _read_json(meta_path)
+        if meta is None:
+            continue
+        depth += 1
+        due += meta['next_attempt_at'] <= now
+        oldest = min(oldest or meta['created_at'], meta['created_at'])
+        try:
+            spool_bytes += meta_path.with_suffix('.eml').stat().st_size
+        except FileNotFoundError:
+            pass
+
+    with _outbox_lock:
+        counters = dict(_outbox_counters)
+    return {
+        'spool_depth': depth,
+        'spool_due': due,
+        'spool_bytes': spool_bytes,
+        'oldest_age_seconds': round(now - oldest, 1) if oldest else None,
+        'dead_letters': sum(1 for _ in OUTBOX_DEAD_DIR.glob("*.json")),
+        'flusher_running': _outbox_flusher_pid == os.getpid(),
+        'last_flush_age_seconds': round(now - _outbox_last_flush, 1) if _outbox_last_flush else None,
+        'process': counters,
+    }
+
+
+# =============================================================================
+# SharePoint Functions
+# =============================================================================
+
+def get_ms_login_base_url():
+    return os.environ.get("MS_LOGIN_BASE_URL", "https://login.microsoftonline.com").rstrip('/')
+
+def get_sp_token_cache_file():
+    """Optional file for sharing the token between gunicorn workers."""
+    return os.environ.get("SP_TOKEN_CACHE_FILE", "")
+
+def get_graph_base_url():
+    return os.environ.get("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0").rstrip('/')
+
+def get_sp_token_refresh_margin():
+    """Seconds before expiry at which the token is refreshed."""
+    return float(os.environ.get("SP_TOKEN_REFRESH_MARGIN", "300"))
+
+
+def _request_sharepoint_token():
+    """Fetch a client-credentials token. Returns (access_token, expires_at) or None."""
+    token_url = f"{get_ms_login_base_url()}/{MS_TENANT_ID}/oauth2/v2.0/token"
+    data = {
+        'client_id': MS_CLIENT_ID,
+        'client_secret': MS_CLIENT_SECRET,
+        'scope': 'https://graph.microsoft.com/.default',
+        'grant_type': 'client_credentials'
+    }
+
+    try:
+        resp = http_request('ms_login', 'POST', token_url, data=data, retry_unsafe=True)
+        resp.raise_for_status()
+        body = resp.json()
+        logger.info("Fetched new SharePoint token")
+        return body['access_token'], time.time() + float(body.get('expires_in', 3599))
+    except Exception as e:
+        logger.error(f"Failed to get SharePoint token: {e}")
+        return None
+
+
+class TokenCache:
+    """Access token shared by all threads, refreshed in the background before it expires.
+
+    A token nobody has used since it was fetched is not refreshed in the
+    background; the next get() fetches a new one instead. With a cache_file,
+    workers also share the token: a worker that finds a fresh token on disk
+    uses it instead of requesting its own, and fetches are serialised with a
+    file lock so only one worker hits the endpoint.
+    """
+
+    def __init__(self, fetch, refresh_margin, cache_file=None):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.cache_file = Path(cache_file) if cache_file else None
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0
+        self._timer = None
+        self._used = False  # whether the current token has been handed out
+        self.fetches = 0
+
+    def _fresh(self, expires_at):
+        return expires_at - self.refresh_margin > time.time()
+
+    def _load_file(self):
+        data = _read_json(self.cache_file) if self.cache_file else None
+        if data and self._fresh(data.get('expires_at', 0)):
+            self._token, self._expires_at = data['access_token'], data['expires_at']
+            return True
+        return False
+
+    def _save_file(self):
+        tmp_path = self.cache_file.with_name(f".{self.cache_file.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'access_token': self._token, 'expires_at': self._expires_at}, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def _refresh(self, force=False):
+        """Fetch a new token unless a fresh one is already cached. Call with self._lock held."""
+        if not force and self._fresh(self._expires_at):
+            return True
+
+        if self.cache_file:
+            previous_expiry = self._expires_at
+            with file_lock(self.cache_file.with_name(f"{self.cache_file.name}.lock")):
+                # Another worker may already have refreshed it
+                if self._load_file() and (not force or self._expires_at > previous_expiry):
+                    self._schedule_refresh()
+                    return True
+                result = self.fetch()
+                if result:
+                    self._token, self._expires_at = result
+                    self._save_file()
+        else:
+            result = self.fetch()
+            if result:
+                self._token, self._expires_at = result
+
+        if not result:
+            return False
+        self.fetches += 1
+        self._schedule_refresh()
+        return True
+
+    def _schedule_refresh(self):
+        self._used = False
+        if self._timer:
+            self._timer.cancel()
+        delay = max(self._expires_at - self.refresh_margin - time.time(), 1)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            self._timer = None
+            if not self._used:
+                return  # idle; get() will fetch when the token is next needed
+            if not self._refresh(force=True):
+                logger.warning("Background token refresh failed, will retry on next use")
+
+    def get(self):
+        """Return a valid access token, fetching one if needed. None if it cannot be obtained."""
+        if self._fresh(self._expires_at):
+            self._used = True
+            return self._token
+        with self._lock:
+            if self._refresh():
+                self._used = True
+                return self._token
+            # Fall back to a token that is inside the refresh margin but not yet expired
+            return self._token if self._expires_at > time.time() else None
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0
+            if self.cache_file:
+                self.cache_file.unlink(missing_ok=True)
+
+
+_sharepoint_tokens = None
+_sharepoint_tokens_pid = None
+_sharepoint_tokens_lock = threading.Lock()
+
+
+def get_sharepoint_token_cache():
+    """Return this process's SharePoint token cache."""
+    global _sharepoint_tokens, _sharepoint_tokens_pid
+    if _sharepoint_tokens_pid == os.getpid():
+        return _sharepoint_tokens
+
+    with _sharepoint_tokens_lock:
+        if _sharepoint_tokens_pid != os.getpid():
+            _sharepoint_tokens = TokenCache(
+                _request_sharepoint_token,
+                get_sp_token_refresh_margin(),
+                get_sp_token_cache_file() or None,
+            )
+            _sharepoint_tokens_pid = os.getpid()
+    return _sharepoint_tokens
+
+
+def get_sharepoint_token():
+    """Get OAuth token for SharePoint."""
+    if not all([MS_TENANT_ID, MS_CLIENT_ID, MS_CLIENT_SECRET]):
+        return None
+    return get_sharepoint_token_cache().get()
+
+
+_known_folders = set()  # folders created or found to exist; dropped when Graph says 404
+_known_folders_lock = threading.Lock()
+
+
+def _folder_known(folder_path):
+    with _known_folders_lock:
+        return folder_path in _known_folders
+
+
+def _remember_folder(folder_path):
+    with _known_folders_lock:
+        _known_folders.add(folder_path)
+
+
+def forget_sharepoint_folders(folder_path=None):
+    """Drop folder_path and everything under it from the known-folder cache, or the whole cache."""
+    with _known_folders_lock:
+        if folder_path is None:
+            _known_folders.clear()
+            return
+        for path in list(_known_folders):
+            if path == folder_path or path.startswith(folder_path + '/'):
+                _known_folders.discard(path)
+
+
+def _drive_item_path(path):
+    return f"/drives/{SP_DRIVE_ID}/root:/{quote(path)}"
+
+
+def _sharepoint_item_url(path):
+    return f"{get_graph_base_url()}{_drive_item_path(path)}"
+
+
+# =============================================================================
+# SharePoint Sync
+# =============================================================================
+#
+# Tickets and manifests are mirrored to SharePoint by a background thread
+# rather than uploaded from the request. sharepoint_sync holds one row per
+# local item with the state last uploaded; each pass uploads the rows whose
+# local state has moved on, so failed uploads are retried and a manifest is
+# uploaded once per pass however many passengers registered in between.
+
+SYNC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sharepoint_sync (
+    local_path TEXT PRIMARY KEY,
+    flight_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    remote_path TEXT NOT NULL,
+    local_state TEXT NOT NULL,
+    synced_state TEXT,
+    size INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    upload_url TEXT,
+    synced_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sharepoint_sync_flight ON sharepoint_sync(flight_id);
+"""
+
+GRAPH_BATCH_MAX_REQUESTS = 20  # Graph's limit per $batch call
+GRAPH_SIMPLE_UPLOAD_MAX = 4 * 1024 * 1024  # larger files must use an upload session
+GRAPH_UPLOAD_CHUNK_MULTIPLE = 320 * 1024  # upload session chunks must be multiples of this
+SHAREPOINT_SYNC_LOCK_FILE = OUTBOX_DIR / "sharepoint_sync.lock"
+SHAREPOINT_SYNC_SETTLE_SECONDS = 2  # let a burst of submissions land before a pass
+SHAREPOINT_SYNC_BUSY_RETRY = 15  # seconds to wait when another worker holds the sync lock
+
+
+def get_sp_sync_interval():
+    return float(os.environ.get("SP_SYNC_INTERVAL", "300"))
+
+def get_sp_batch_max_bytes():
+    """Budget for file content in one $batch call, before base64."""
+    return int(os.environ.get("SP_BATCH_MAX_BYTES", str(2 * 1024 * 1024)))
+
+def get_sp_upload_chunk_size():
+    chunk_size = int(os.environ.get("SP_UPLOAD_CHUNK_SIZE", str(10 * GRAPH_UPLOAD_CHUNK_MULTIPLE)))
+    return max(chunk_size // GRAPH_UPLOAD_CHUNK_MULTIPLE, 1) * GRAPH_UPLOAD_CHUNK_MULTIPLE
+
+def get_sp_sync_archives():
+    """Also mirror each flight's ticket archive."""
+    return os.environ.get("SP_SYNC_ARCHIVES", "false").lower() == "true"
+
+def get_sp_sync_reconcile_on_start():
+    """Reconcile against the remote listings once per deploy, on the first pass after it. Lists every synced folder."""
+    return os.environ.get("SP_SYNC_RECONCILE_ON_START", "true").lower() == "true"
+
+def get_deploy_id():
+    """Identifies the running deploy. Falls back to this file's mtime off Railway."""
+    return os.environ.get("RAILWAY_DEPLOYMENT_ID") or str(int(Path(__file__).stat().st_mtime))
+
+
+_sharepoint_dirty = set()
+_sharepoint_dirty_lock = threading.Lock()
+_sharepoint_sync_wakeup = threading.Event()
+_sharepoint_sync_pid = None
+
+
+def graph_batch(token, batch_requests):
+    """Send up to GRAPH_BATCH_MAX_REQUESTS Graph requests in one $batch call. Returns {id: response}."""
+    resp = http_request(
+        'graph', 'POST', f"{get_graph_base_url()}/$batch",
+        headers={'Authorization': f'Bearer {token}'},
+        json={'requests': batch_requests},
+        # Batches only create folders (409 when they exist) and PUT file content
+        retry_unsafe=True
+    )
+    if resp.status_code == 401:
+        get_sharepoint_token_cache().invalidate()
+    resp.raise_for_status()
+    return {item['id']: item for item in resp.json().get('responses', [])}
+
+
+def ensure_sharepoint_folders(token, folder_paths):
+    """Create any folders in folder_paths that are not known to exist, one $batch call per path depth."""
+    missing = set()
+    for folder_path in folder_paths:
+        segments = [segment for segment in folder_path.split('/') if segment]
+        for depth in range(1, len(segments) + 1):
+            path = '/'.join(segments[:depth])
+            if not _folder_known(path):
+                missing.add(path)
+
+    for depth in sorted({path.count('/') for path in missing}):
+        level = sorted(path for path in missing if path.count('/') == depth)
+        for start in range(0, len(level), GRAPH_BATCH_MAX_REQUESTS):
+            chunk = level[start:start + GRAPH_BATCH_MAX_REQUESTS]
+            batch_requests = []
+            for i, path in enumerate(chunk):
+                parent, _, name = path.rpartition('/')
+                url = f"{_drive_item_path(parent)}:/children" if parent else f"/drives/{SP_DRIVE_ID}/root/children"
+                batch_requests.append({
+                    'id': str(i),
+                    'method': 'POST',
+                    'url': url,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': {'name': name, 'folder': {}, '@microsoft.graph.conflictBehavior': 'fail'},
+                })
+
+            responses = graph_batch(token, batch_requests)
+            for i, path in enumerate(chunk):
+                status = responses.get(str(i), {}).get('status')
+                if status in [200, 201, 409]:  # 409 = already exists
+                    _remember_folder(path)
+                else:
+                    logger.error(f"Failed to create SharePoint folder {path}: {status}")
+                    if status == 404:
+                        forget_sharepoint_folders(path.rpartition('/')[0])
+
+
+def _flight_remote_folder(flight_id):
+    flight_date = get_flight_summary(flight_id).get('date') or flight_id.split('_')[0]
+    return f"{SP_BASE_FOLDER}/{flight_date}"
+
+
+def scan_sharepoint_items(flight_ids=None):
+    """Record the current local state of each flight's files in sharepoint_sync. None scans every flight."""
+    if flight_ids is None:
+        flight_ids = set(get_all_flights())
+        flight_ids.update(d.name for d in TICKETS_DIR.iterdir() if d.is_dir())
+
+    items = []
+    for flight_id in sorted(flight_ids):
+        folder = _flight_remote_folder(flight_id)
+        tickets = _ticket_dir_state(flight_id)
+        for name, (size, mtime_ns) in tickets.items():
+            items.append((f"tickets/{flight_id}/{name}", flight_id, 'ticket', f"{folder}/{name}", f"{size}:{mtime_ns}", size))
+
+        summary = get_flight_summary(flight_id)
+        if summary.get('passenger_count'):
+            items.append((f"manifest/{flight_id}.csv", flight_id, 'manifest', f"{folder}/{flight_id}.csv",
+                          manifest_version(summary), None))
+
+        if tickets and get_sp_sync_archives():
+            items.append((f"archives/{flight_id}.zip", flight_id, 'archive', f"{folder}/{flight_id}_tickets.zip",
+                          _archive_etag(tickets), None))
+
+    with manifest_transaction() as conn:
+        conn.executemany("""
+            INSERT INTO sharepoint_sync (local_path, flight_id, kind, remote_path, local_state, size)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(local_path) DO UPDATE SET
+                remote_path = excluded.remote_path,
+                local_state = excluded.local_state,
+                size = excluded.size,
+                attempts = 0,
+                next_attempt_at = 0
+            WHERE local_state IS NOT excluded.local_state OR remote_path IS NOT excluded.remote_path
+        """, items)
+
+
+def reconcile_sharepoint(token):
+    """Compare uploaded rows against the remote folder listings and requeue anything missing or truncated."""
+    conn = get_manifest_db()
+    rows = conn.execute("SELECT * FROM sharepoint_sync WHERE synced_state IS NOT NULL").fetchall()
+    by_folder = {}
+    for row in rows:
+        by_folder.setdefault(row['remote_path'].rpartition('/')[0], []).append(row)
+
+    folders = sorted(by_folder)
+    stale = []
+    for start in range(0, len(folders), GRAPH_BATCH_MAX_REQUESTS):
+        chunk = folders[start:start + GRAPH_BATCH_MAX_REQUESTS]
+        responses = graph_batch(token, [
+            {'id': str(i), 'method': 'GET', 'url': f"{_drive_item_path(folder)}:/children?$select=name,size&$top=999"}
+            for i, folder in enumerate(chunk)
+        ])
+
+        for i, folder in enumerate(chunk):
+            response = responses.get(str(i), {})
+            if response.get('status') == 404:
+                forget_sharepoint_folders(folder)
+                stale.extend(by_folder[folder])
+                continue
+            if response.get('status') != 200:
+                logger.warning(f"Could not list SharePoint folder {folder}: {response.get('status')}")
+                continue
+
+            body = response.get('body') or {}
+            remote = {item['name']: item.get('size') for item in body.get('value', [])}
+            next_link = body.get('@odata.nextLink')
+            while next_link:
+                page = http_request('graph', 'GET', next_link, headers={'Authorization': f'Bearer {token}'})
+                page.raise_for_status()
+                page_body = page.json()
+                remote.update((item['name'], item.get('size')) for item in page_body.get('value', []))
+                next_link = page_body.get('@odata.nextLink')
+
+            for row in by_folder[folder]:
+                name = row['remote_path'].rpartition('/')[2]
+                if name not in remote or (row['size'] is not None and remote[name] != row['size']):
+                    stale.append(row)
+
+    if stale:
+        with manifest_transaction() as conn:
+            conn.executemany(
+                "UPDATE sharepoint_sync SET synced_state = NULL, next_attempt_at = 0 WHERE local_path = ?",
+                [(row['local_path'],) for row in stale]
+            )
+        logger.info(f"SharePoint reconcile requeued {len(stale)} items missing or changed remotely")
+    return len(stale)
+
+
+def _read_sync_source(row):
+    """Content for a sync row: a Path, bytes, or None if the local item no longer exists."""
+    if row['kind'] == 'manifest':
+        return export_manifest_csv(row['flight_id'])
+    if row['kind'] == 'archive':
+        return read_flight_archive(row['flight_id'])
+    path = BASE_DIR / row['local_path']
+    return path if path.exists() else None
+
+
+def _mark_synced(row):
+    get_manifest_db().execute("""
+        UPDATE sharepoint_sync
+        SET synced_state = ?, attempts = 0, next_attempt_at = 0, last_error = NULL, upload_url = NULL, synced_at = ?
+        WHERE local_path = ?
+    """, (row['local_state'], datetime.now().isoformat(timespec='seconds'), row['local_path']))
+
+
+def _mark_sync_failed(row, error):
+    delay = min(get_job_retry_base_seconds() * 2 ** row['attempts'], JOB_MAX_BACKOFF)
+    get_manifest_db().execute("""
+        UPDATE sharepoint_sync SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+        WHERE local_path = ?
+    """, (time.time() + delay, error, row['local_path']))
+    logger.error(f"SharePoint sync of {row['local_path']} failed: {error}")
+    with open(OUTBOX_DIR / "sharepoint_upload_errors.log", 'a') as f:
+        f.write(f"{datetime.now()}: {row['remote_path']} - {error}\n")
+
+
+def _upload_batch(token, batch):
+    """Upload (row, bytes) pairs with one $batch call of PUTs."""
+    batch_requests = [{
+        'id': str(i),
+        'method': 'PUT',
+        'url': f"{_drive_item_path(row['remote_path'])}:/content",
+        'headers': {'Content-Type': 'application/octet-stream'},
+        'body': base64.b64encode(content).decode('ascii'),
+    } for i, (row, content) in enumerate(batch)]
+
+    try:
+        responses = graph_batch(token, batch_requests)
+    except Exception as e:
+        for row, _ in batch:
+            _mark_sync_failed(row, f"$batch failed: {e}")
+        return 0
+
+    uploaded = 0
+    for i, (row, _) in enumerate(batch):
+        status = responses.get(str(i), {}).get('status')
+        if status in [200, 201]:
+            _mark_synced(row)
+            uploaded += 1
+        else:
+            if status == 404:
+                # The folder was deleted remotely; recreate it on the retry
+                forget_sharepoint_folders(row['remote_path'].rpartition('/')[0])
+            _mark_sync_failed(row, f"HTTP {status}")
+    return uploaded
+
+
+def upload_large_to_sharepoint(token, row, source):
+    """Upload a large file through a Graph upload session, resuming a session saved on the row."""
+    size = source.stat().st_size if isinstance(source, Path) else len(source)
+    upload_url = row['upload_url']
+    offset = 0
+
+    if upload_url:
+        resp = http_request('graph', 'GET', upload_url)
+        ranges = resp.json().get('nextExpectedRanges') if resp.status_code == 200 else None
+        if ranges:
+            offset = int(ranges[0].split('-')[0])
+            logger.info(f"Resuming upload of {row['remote_path']} at byte {offset}")
+        else:
+            upload_url = None
+
+    if not upload_url:
+        resp = http_request(
+            'graph', 'POST', f"{_sharepoint_item_url(row['remote_path'])}:/createUploadSession",
+            headers={'Authorization': f'Bearer {token}'},
+            json={'item': {'@microsoft.graph.conflictBehavior': 'replace'}},
+            retry_unsafe=True  # an abandoned upload session just expires
+        )
+        if resp.status_code != 200:
+            raise RuntimeError(f"createUploadSession returned {resp.status_code}")
+        upload_url = resp.json()['uploadUrl']
+        get_manifest_db().execute(
+            "UPDATE sharepoint_sync SET upload_url = ? WHERE local_path = ?", (upload_url, row['local_path'])
+        )
+
+    chunk_size = get_sp_upload_chunk_size()
+    with (open(source, 'rb') if isinstance(source, Path) else io.BytesIO(source)) as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            end = offset + len(chunk) - 1
+            # The upload URL is pre-authorised; Graph rejects an Authorization header on it
+            resp = http_request('graph', 'PUT', upload_url, data=chunk, headers={
+                'Content-Length': str(len(chunk)),
+                'Content-Range': f"bytes {offset}-{end}/{size}",
+            })
+            if resp.status_code in [200, 201]:
+                return True
+            if resp.status_code != 202:
+                raise RuntimeError(f"Upload session chunk returned {resp.status_code}")
+            ranges = resp.json().get('nextExpectedRanges') or [f"{end + 1}-"]
+            offset = int(ranges[0].split('-')[0])
+    return True
+
+
+def _upload_pending(token):
+    """Upload every row whose local state differs from what was last synced and is due for a try."""
+    rows = get_manifest_db().execute("""
+        SELECT * FROM sharepoint_sync
+        WHERE synced_state IS NOT local_state AND next_attempt_at <= ?
+        ORDER BY local_path
+    """, (time.time(),)).fetchall()
+
+    stats = {'pending': len(rows), 'uploaded': 0, 'failed': 0}
+    if not rows:
+        return stats
+
+    ensure_sharepoint_folders(token, {row['remote_path'].rpartition('/')[0] for row in rows})
+
+    batch, batch_bytes = [], 0
+    max_bytes = get_sp_batch_max_bytes()
+
+    def flush():
+        nonlocal batch, batch_bytes
+        if batch:
+            stats['uploaded'] += _upload_batch(token, batch)
+            batch, batch_bytes = [], 0
+
+    for row in rows:
+        try:
+            source = _read_sync_source(row)
+        except Exception as e:
+            _mark_sync_failed(row, f"{type(e).__name__}: {e}")
+            continue
+        if source is None:
+            get_manifest_db().execute("DELETE FROM sharepoint_sync WHERE local_path = ?", (row['local_path'],))
+            continue
+
+        size = source.stat().st_size if isinstance(source, Path) else len(source)
+        if size > min(GRAPH_SIMPLE_UPLOAD_MAX, max_bytes):
+            try:
+                upload_large_to_sharepoint(token, row, source)
+                _mark_synced(row)
+                stats['uploaded'] += 1
+            except Exception as e:
+                _mark_sync_failed(row, f"{type(e).__name__}: {e}")
+            continue
+
+        if len(batch) == GRAPH_BATCH_MAX_REQUESTS or batch_bytes + size > max_bytes:
+            flush()
+        content = source.read_bytes() if isinstance(source, Path) else source
+        batch.append((row, content))
+        batch_bytes += size
+    flush()
+
+    stats['failed'] = stats['pending'] - stats['uploaded']
+    return stats
+
+
+def run_sharepoint_sync(flight_ids=None, reconcile=False, reconcile_deploy=False):
+    """Run one sync pass. Returns pass counters, or None if SharePoint is unavailable or another worker is syncing.
+
+    flight_ids limits the local scan to those flights (None scans them all);
+    rows already queued for retry are uploaded either way. reconcile_deploy
+    reconciles only if no worker has done so since the current deploy.
+    """
+    if not SP_DRIVE_ID:
+        return None
+
+    with file_lock(SHAREPOINT_SYNC_LOCK_FILE, blocking=False) as locked:
+        if not locked:
+            return None
+
+        token = get_sharepoint_token()
+        if not token:
+            logger.warning("SharePoint sync skipped, no access token")
+            return None
+
+        scan_sharepoint_items(flight_ids)
+        deploy_id = get_deploy_id()
+        if reconcile_deploy and get_store_meta('sharepoint_reconciled_deploy') != deploy_id:
+            reconcile = True
+        requeued = reconcile_sharepoint(token) if reconcile else 0
+        if reconcile:
+            set_store_meta('sharepoint_reconciled_deploy', deploy_id)
+        stats = _upload_pending(token)
+        stats['requeued'] = requeued
+        return stats
+
+
+def get_sharepoint_sync_status():
+    """Counts of synced, pending and failing sharepoint_sync rows."""
+    row = get_manifest_db().execute("""
+        SELECT
+            COUNT(*) AS items,
+            SUM(synced_state IS local_state) AS synced,
+            SUM(synced_state IS NOT local_state AND attempts = 0) AS pending,
+            SUM(synced_state IS NOT local_state AND attempts > 0) AS failing,
+            MAX(synced_at) AS last_synced_at
+        FROM sharepoint_sync
+    """).fetchone()
+    status = {key: row[key] or 0 for key in ('items', 'synced', 'pending', 'failing')}
+    status['last_synced_at'] = row['last_synced_at']
+    return status
+
+
+def _sharepoint_sync_loop():
+    full_scan = True
+    reconcile = get_sp_sync_reconcile_on_start()
+    while True:
+        with _sharepoint_dirty_lock:
+            dirty = set(_sharepoint_dirty)
+            _sharepoint_dirty.clear()
+
+        try:
+            stats = run_sharepoint_sync(None if full_scan else dirty, reconcile_deploy=reconcile)
+        except Exception:
+            logger.exception("SharePoint sync pass failed")
+            stats = None
+
+        if stats is None:
+            with _sharepoint_dirty_lock:
+                _sharepoint_dirty.update(dirty)
+            wait = SHAREPOINT_SYNC_BUSY_RETRY
+        else:
+            full_scan = reconcile = False
+            if stats['pending'] or stats['requeued']:
+                logger.info(f"SharePoint sync: {stats}")
+            wait = get_sp_sync_interval()
+
+        if _sharepoint_sync_wakeup.wait(wait):
+            _sharepoint_sync_wakeup.clear()
+            time.sleep(SHAREPOINT_SYNC_SETTLE_SECONDS)
+
+
+def ensure_sharepoint_sync():
+    """Start the sync thread in this process if SharePoint is configured and it is not already running."""
+    global _sharepoint_sync_pid
+    if not SP_DRIVE_ID or _sharepoint_sync_pid == os.getpid():
+        return
+
+    with _sharepoint_dirty_lock:
+        if _sharepoint_sync_pid == os.getpid():
+            return
+        _sharepoint_sync_pid = os.getpid()
+        threading.Thread(target=_sharepoint_sync_loop, name="sharepoint-sync", daemon=True).start()
+        logger.info(f"Started SharePoint sync (pid {os.getpid()})")
+
+
+def request_sharepoint_sync(flight_id=None):
+    """Mark a flight as changed and wake the sync thread."""
+    if flight_id:
+        with _sharepoint_dirty_lock:
+            _sharepoint_dirty.add(flight_id)
+    ensure_sharepoint_sync()
+    _sharepoint_sync_wakeup.set()
+
+
+@app.cli.command('sharepoint-reconcile')
+def sharepoint_reconcile_command():
+    """Re-upload anything missing or truncated in SharePoint, even if this deploy was already reconciled."""
+    stats = run_sharepoint_sync(reconcile=True)
+    if stats is None:
+        click.echo("SharePoint is not configured, has no token, or another worker is syncing", err=True)
+        raise SystemExit(1)
+    click.echo(f"Requeued {stats['requeued']}, uploaded {stats['uploaded']}, failed {stats['failed']}")
+
+
+# =============================================================================
+# Background Job Queue
+# =============================================================================
+#
+# Post-submit work (emails, SharePoint uploads) runs here instead of inside the
+# request. Each job is a JSON file under OUTBOX_DIR/jobs/<state>/, and moving
+# a job between states is an os.rename, so claims are atomic across threads
+# and gunicorn workers and pending jobs survive a restart. A claimed job
+# carries its owner's pid and a lease that the owner renews while it runs;
+# only a job whose lease has run out is taken back from running/.
+
+JOBS_DIR = OUTBOX_DIR / "jobs"
+JOB_STATES = ('pending', 'running', 'done', 'failed')
+
+for _job_state in JOB_STATES:
+    (JOBS_DIR / _job_state).mkdir(parents=True, exist_ok=True)
+
+JOB_POLL_INTERVAL = 2.0  # seconds between scans when idle
+JOB_MAX_BACKOFF = 3600  # cap retry delay at one hour
+JOB_RETENTION_SECONDS = 3 * 24 * 3600  # finished jobs are pruned after 3 days
+
+
+def get_job_workers():
+    return int(os.environ.get("JOB_WORKERS", "2"))
+
+def get_job_max_attempts():
+    return int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+
+def get_job_retry_base_seconds():
+    return float(os.environ.get("JOB_RETRY_BASE_SECONDS", "30"))
+
+def get_job_lease_seconds():
+    return float(os.environ.get("JOB_LEASE_SECONDS", "300"))
+
+def get_pilot_email_debounce_seconds():
+    return float(os.environ.get("PILOT_EMAIL_DEBOUNCE_SECONDS", "120"))
+
+def get_pilot_email_max_wait_seconds():
+    return float(os.environ.get("PILOT_EMAIL_MAX_WAIT_SECONDS", "900"))
+
+def get_pilot_email_cutoff_minutes():
+    return float(os.environ.get("PILOT_EMAIL_CUTOFF_MINUTES", "60"))
+
+def get_flight_timezone():
+    """Zone that flight dates and ETDs are entered in, whatever the host's TZ is."""
+    return ZoneInfo(os.environ.get("FLIGHT_TIMEZONE", "Africa/Johannesburg"))
+
+
+JOB_HANDLERS = {}
+
+_job_wakeup = threading.Event()
+_job_workers_lock = threading.Lock()
+_job_workers_pid = None
+_running_jobs = {}  # job id -> job, for the jobs this process holds leases on
+_running_jobs_lock = threading.Lock()
+
+
+def job_handler(job_type):
+    """Register a function as the handler for a job type.
+
+    Handlers receive the job payload as keyword arguments and return True
+    when the work is finished. Returning False or raising schedules a retry.
+    """
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def _job_path(state, job_id):
+    return JOBS_DIR / state / f"{job_id}.json"
+
+
+def _write_json_atomic(path, data):
+    """Write JSON to path via a temp file and rename so readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(data), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+# Held to update a pending job in place, to claim a job and to take back expired ones
+JOB_QUEUE_LOCK_FILE = JOBS_DIR / "queue.lock"
+
+
+def _find_pending_job(coalesce_key):
+    for path in (JOBS_DIR / 'pending').glob("*.json"):
+        job = _read_json(path)
+        if job and job.get('coalesce_key') == coalesce_key:
+            return job
+    return None
+
+
+def enqueue_job(job_type, payload, delay=0, coalesce_key=None, max_delay=None):
+    """Persist a job to the pending queue and wake the worker pool. Returns the job dict.
+
+    With a coalesce_key, a pending job with the same key absorbs this one:
+    its payload is replaced and its run time pushed back to now + delay,
+    but never past max_delay seconds after the first enqueue.
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    if coalesce_key is None:
+        return _enqueue_new_job(job_type, payload, delay)
+
+    with file_lock(JOB_QUEUE_LOCK_FILE):
+        job = _find_pending_job(coalesce_key)
+        if job is None:
+            job = _enqueue_new_job(job_type, payload, delay, coalesce_key, max_delay)
+        else:
+            now = time.time()
+            run_at = now + delay
+            if job.get('deadline') is not None:
+                run_at = min(run_at, job['deadline'])
+            job['payload'] = payload
+            job['run_at'] = max(run_at, job['run_at']) if job['attempts'] == 0 else job['run_at']
+            job['coalesced'] = job.get('coalesced', 0) + 1
+            job['updated_at'] = now
+            _write_json_atomic(_job_path('pending', job['id']), job)
+            logger.info(f"Coalesced {job_type} into job {job['id']} ({job['coalesced']} merged)")
+    return job
+
+
+def _enqueue_new_job(job_type, payload, delay=0, coalesce_key=None, max_delay=None):
+    now = time.time()
+    job = {
+        'id': uuid.uuid4().hex,
+        'type': job_type,
+        'payload': payload,
+        'state': 'pending',
+        'attempts': 0,
+        'created_at': now,
+        'run_at': now + delay,
+        'updated_at': now,
+        'last_error': None,
+    }
+    if coalesce_key is not None:
+        job['coalesce_key'] = coalesce_key
+        job['coalesced'] = 0
+        job['deadline'] = now + max(delay, max_delay) if max_delay is not None else None
+    _write_json_atomic(_job_path('pending', job['id']), job)
+    logger.info(f"Queued {job_type} job {job['id']}")
+
+    ensure_job_workers()
+    _job_wakeup.set()
+    return job
+
+
+def get_job(job_id):
+    """Look up a job in any state. Returns None if it does not exist."""
+    for state in JOB_STATES:
+        job = _read_json(_job_path(state, job_id))
+        if job:
+            return job
+    return None
+
+
+def _claim_next_job():
+    """Move the oldest due pending job to running. Returns the job or None.
+
+    The owner and lease are written into the job before it is moved, under
+    the queue lock, so a running job always carries a live lease.
+    """
+    now = time.time()
+    due = []
+    for path in (JOBS_DIR / 'pending').glob("*.json"):
+        job = _read_json(path)
+        if job and job.get('run_at', 0) <= now:
+            due.append(job)
+
+    for job in sorted(due, key=lambda j: j['run_at']):
+        pending_path = _job_path('pending', job['id'])
+        with file_lock(JOB_QUEUE_LOCK_FILE):
+            # Re-read: another worker may have claimed it, or an enqueue updated it
+            job = _read_json(pending_path)
+            if job is None or job.get('run_at', 0) > time.time():
+                continue
+            job['state'] = 'running'
+            job['worker_pid'] = os.getpid()
+            job['lease_expires_at'] = time.time() + get_job_lease_seconds()
+            job['updated_at'] = time.time()
+            _write_json_atomic(pending_path, job)
+            os.rename(pending_path, _job_path('running', job['id']))
+
+        with _running_jobs_lock:
+            _running_jobs[job['id']] = job
+        return job
+
+    return None
+
+
+def _finish_job(job, state):
+    with _running_jobs_lock:
+        _running_jobs.pop(job['id'], None)
+    job['state'] = state
+    job['lease_expires_at'] = None
+    job['updated_at'] = time.time()
+    _write_json_atomic(_job_path(state, job['id']), job)
+    _job_path('running', job['id']).unlink(missing_ok=True)
+
+
+def _renew_job_leases():
+    """Extend the leases of the jobs this process is running."""
+    with file_lock(JOB_QUEUE_LOCK_FILE), _running_jobs_lock:
+        for job in _running_jobs.values():
+            path = _job_path('running', job['id'])
+            if not path.exists():
+                continue  # taken back after its lease ran out
+            job['lease_expires_at'] = time.time() + get_job_lease_seconds()
+            _write_json_atomic(path, job)
+
+
+def _run_job(job):
+    """Execute a claimed job and move it to done, back to pending, or to failed."""
+    handler = JOB_HANDLERS.get(job['type'])
+    job['attempts'] += 1
+
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job type {job['type']}")
+        ok = handler(**job['payload'])
+        error = None if ok else "Handler reported failure"
+    except Exception as e:
+        logger.exception(f"Job {job['id']} ({job['type']}) raised")
+        ok = False
+        error = f"{type(e).__name__}: {e}"
+
+    if ok:
+        job['last_error'] = None
+        _finish_job(job, 'done')
+        logger.info(f"Job {job['id']} ({job['type']}) completed")
+        return
+
+    job['last_error'] = error
+    if handler is not None and job['attempts'] < get_job_max_attempts():
+        delay = min(get_job_retry_base_seconds() * 2 ** (job['attempts'] - 1), JOB_MAX_BACKOFF)
+        job['run_at'] = time.time() + delay
+        _finish_job(job, 'pending')
+        logger.warning(f"Job {job['id']} ({job['type']}) failed, retry {job['attempts']} in {delay:.0f}s: {error}")
+    else:
+        _finish_job(job, 'failed')
+        logger.error(f"Job {job['id']} ({job['type']}) failed permanently after {job['attempts']} attempts: {error}")
+
+
+def _recover_jobs():
+    """Requeue running jobs whose lease has run out and prune old finished jobs."""
+    now = time.time()
+    with file_lock(JOB_QUEUE_LOCK_FILE):
+        for path in (JOBS_DIR / 'running').glob("*.json"):
+            job = _read_json(path)
+            if not job or (job.get('lease_expires_at') or 0) > now:
+                continue
+            job['state'] = 'pending'
+            job['lease_expires_at'] = None
+            _write_json_atomic(path, job)
+            os.rename(path, _job_path('pending', job['id']))
+            logger.info(f"Requeued job {job['id']} ({job['type']}) after its lease expired (pid {job.get('worker_pid')})")
+
+    for state in ('done', 'failed'):
+        for path in (JOBS_DIR / state).glob("*.json"):
+            try:
+                if now - path.stat().st_mtime > JOB_RETENTION_SECONDS:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _job_lease_loop():
+    """Renew this process's leases and take back jobs abandoned by dead workers."""
+    while True:
+        time.sleep(get_job_lease_seconds() / 3)
+        try:
+            _renew_job_leases()
+            _recover_jobs()
+        except Exception:
+            logger.exception("Job lease renewal failed")
+
+
+def _job_worker_loop():
+    while True:
+        try:
+            job = _claim_next_job()
+        except Exception:
+            logger.exception("Job queue scan failed")
+            job = None
+
+        if job is None:
+            _job_wakeup.wait(JOB_POLL_INTERVAL)
+            _job_wakeup.clear()
+            continue
+
+        _run_job(job)
+
+
+def ensure_job_workers():
+    """Start the worker pool in this process if it is not already running."""
+    global _job_workers_pid
+    if _job_workers_pid == os.getpid():
+        return
+
+    with _job_workers_lock:
+        if _job_workers_pid == os.getpid():
+            return
+        _job_workers_pid = os.getpid()
+
+        _recover_jobs()
+        worker_count = max(1, get_job_workers())
+        for i in range(worker_count):
+            threading.Thread(target=_job_worker_loop, name=f"job-worker-{i}", daemon=True).start()
+        threading.Thread(target=_job_lease_loop, name="job-leases", daemon=True).start()
+        logger.info(f"Started {worker_count} background job workers (pid {os.getpid()})")
+
+
+def _email_job_succeeded(delivered):
+    """An email job is finished once sent or spooled, or when there is no transport to retry with."""
+    return delivered is not False or not (is_sendgrid_configured() or is_smtp_configured())
+
+
+@job_handler('passenger_email')
+def run_passenger_email_job(passenger_data, ticket_path):
+    ticket_pdf = Path(ticket_path).read_bytes()
+    return _email_job_succeeded(send_passenger_email(passenger_data, ticket_pdf))
+
+
+def get_flight_cutoff(flight_date, flight_time):
+    """Epoch time of the final pilot manifest send, PILOT_EMAIL_CUTOFF_MINUTES before ETD.
+
+    Returns None when the flight date or time cannot be parsed.
+    """
+    try:
+        etd = datetime.strptime(f"{flight_date} {flight_time}".strip(), "%Y-%m-%d %H:%M")
+    except ValueError:
+        return None
+    return etd.replace(tzinfo=get_flight_timezone()).timestamp() - get_pilot_email_cutoff_minutes() * 60
+
+
+def schedule_pilot_email(flight_id, flight_date, flight_time):
+    """Queue a coalesced manifest update for the pilot.
+
+    Updates within PILOT_EMAIL_DEBOUNCE_SECONDS of each other go out as one
+    email, sent no later than PILOT_EMAIL_MAX_WAIT_SECONDS after the first
+    and never after the cutoff. A separate final send is kept at the cutoff
+    so the pilot always gets the complete manifest before ETD.
+    """
+    now = time.time()
+    delay = get_pilot_email_debounce_seconds()
+    max_delay = get_pilot_email_max_wait_seconds()
+
+    cutoff = get_flight_cutoff(flight_date, flight_time)
+    if cutoff is not None:
+        until_cutoff = max(cutoff - now, 0)
+        delay = min(delay, until_cutoff)
+        max_delay = min(max_delay, until_cutoff)
+        if until_cutoff > 0:
+            enqueue_job('pilot_email', {'flight_id': flight_id, 'final': True},
+                        delay=until_cutoff, coalesce_key=f"pilot_email_final:{flight_id}")
+
+    return enqueue_job('pilot_email', {'flight_id': flight_id},
+                       delay=delay, coalesce_key=f"pilot_email:{flight_id}", max_delay=max_delay)
+
+
+@job_handler('pilot_email')
+def run_pilot_email_job(flight_id, final=False):
+    flight_summary = get_flight_summary(flight_id)
+    version = manifest_version(flight_summary)
+    sent_key = f"pilot_email_sent:{flight_id}"
+    if get_store_meta(sent_key) == version:
+        logger.info(f"Pilot already has the current manifest for {flight_id}, skipping {'final ' if final else ''}send")
+        return True
+
+    # A message left for the outbox to retry records the version when it goes out
+    delivered = send_pilot_email(flight_id, flight_summary, ('pilot_manifest', {'flight_id': flight_id, 'version': version}))
+    if delivered is True:
+        set_store_meta(sent_key, version)
+    return _email_job_succeeded(delivered)
+
+
+@outbox_callback('pilot_manifest')
+def record_pilot_manifest_delivery(delivered, error, flight_id, version):
+    if delivered:
+        set_store_meta(f"pilot_email_sent:{flight_id}", version)
+
+
+@job_handler('normalise_photo')
+def run_normalise_photo_job(original_path, output_path):
+    from PIL import Image
+
+    if not Path(original_path).exists():
+        logger.warning(f"Photo normalisation skipped, {original_path} no longer exists")
+        return True
+    try:
+        normalise_photo(original_path, output_path)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # A corrupt or oversized image will not get better on retry; keep the original only
+        logger.error(f"Could not normalise photo {original_path}: {e}")
+        return True
+    logger.info(f"Normalised photo saved to {output_path}")
+    return True
+
+
+# SharePoint uploads now go through the sync engine; these handlers drain
+# jobs queued before the switch.
+
+@job_handler('sharepoint_upload')
+def run_sharepoint_upload_job(file_name, file_path, flight_date):
+    request_sharepoint_sync(Path(file_path).parent.name)
+    return True
+
+
+@job_handler('sharepoint_manifest_upload')
+def run_sharepoint_manifest_upload_job(flight_id, flight_date):
+    request_sharepoint_sync(flight_id)
+    return True
+
+
+# =============================================================================
+# Flight Invites
+# =============================================================================
+#
+# Flight links are emailed to each recipient as a message of their own, so
+# addresses are never shared, and the sending happens in an invite_batch job
+# rather than in the admin request. flight_invites holds one row per
+# recipient; the job sends the unsent rows through a small thread pool behind
+# a token bucket, and a retry only resends the rows that failed.
+
+INVITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invite_batches (
+    batch_id TEXT PRIMARY KEY,
+    share_url TEXT NOT NULL,
+    qr_format TEXT NOT NULL,
+    flight TEXT NOT NULL,
+    job_id TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flight_invites (
+    batch_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    sent_at TEXT,
+    PRIMARY KEY (batch_id, email)
+);
+"""
+
+INVITE_STATUSES = ('pending', 'sent', 'spooled', 'saved', 'failed')
+# spooled = first send failed and the outbox is retrying it; it becomes sent or
+# failed when the outbox delivers or gives up. saved = no transport, written to the outbox
+MAX_INVITE_RECIPIENTS = 2000
+EMAIL_ADDRESS_RE = re.compile(r"^[^@\s,;<>\"]+@[^@\s,;<>\"]+\.[^@\s,;<>\"]+$")
+NAMED_ADDRESS_RE = re.compile(r'^"?([^"<]*?)"?\s*<([^<>]+)>$')
+
 
-    if is_smtp_configured():
-        smtp_host = get_smtp_host()
-        smtp_port = get_smtp_port()
-        smtp_user = get_smtp_user()
-        smtp_password = get_smtp_password()
-        smtp_use_tls = get_smtp_use_tls()
+def get_invite_concurrency():
+    return int(os.environ.get("INVITE_CONCURRENCY", "4"))
 
-        # Try SSL on port 465 first (often works when 587 is blocked by hosting providers)
-        try:
-            logger.info(f"Attempting SMTP_SSL connection to {smtp_host}:465")
-            with smtplib.SMTP_SSL(smtp_host, 465, timeout=30) as server:
-                logger.info(f"SSL connected, logging in as {smtp_user}...")
-                server.login(smtp_user, smtp_password)
-                logger.info("Login successful, sending message...")
-                server.send_message(msg)
-            logger.info(f"Email sent successfully via SSL to {to_emails}")
-            return True
-        except Exception as ssl_error:
-            logger.warning(f"SSL connection on port 465 failed: {ssl_error}")
-            logger.info("Falling back to TLS on port 587...")
+def get_invite_rate_per_second():
+    """Invite messages per second per worker process; 0 disables the limit."""
+    return float(os.environ.get("INVITE_RATE_PER_SECOND", "5"))
 
-        # Fall back to TLS on port 587
-        try:
-            logger.info(f"Connecting to SMTP: {smtp_host}:{smtp_port}")
-            with smtplib.SMTP(smtp_host, smtp_port, timeout=30) as server:
-                logger.info("SMTP connected, starting TLS...")
-                if smtp_use_tls:
-                    server.starttls()
-                logger.info(f"Logging in as {smtp_user}...")
-                server.login(smtp_user, smtp_password)
-                logger.info("Login successful, sending message...")
-                server.send_message(msg)
-            logger.info(f"Email sent successfully to {to_emails}")
-            return True
-        except smtplib.SMTPAuthenticationError as e:
-            logger.error(f"SMTP Authentication failed: {e}")
-        except smtplib.SMTPException as e:
-            logger.error(f"SMTP error: {e}")
-        except Exception as e:
-            logger.error(f"Failed to send email: {type(e).__name__}: {e}")
-            # Fall through to save as .eml
-
-    # Save as .eml file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    slug = slugify(subject)[:30]
-    eml_path = OUTBOX_DIR / f"{timestamp}_{slug}.eml"
-    eml_path.write_bytes(msg.as_bytes())
-    logger.info(f"Email saved to {eml_path}")
-    return False
 
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
 
-def send_passenger_email(passenger_data, ticket_pdf_bytes):
-    """Send ticket email to passenger."""
-    emails = [e.strip() for e in passenger_data['email'].split(',') if e.strip()]
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
 
-    subject = f"Your BAC Helicopters Ticket — {passenger_data['flight_date']} {passenger_data['route']} ({passenger_data['registration']})"
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
 
-    body = f"""Dear {passenger_data['name']},
 
-Thank you for choosing BAC Helicopters.
+_invite_limiter = None
+_invite_limiter_pid = None
+_invite_limiter_lock = threading.Lock()
 
-Please find attached your ticket for the following flight:
 
-Date: {passenger_data['flight_date']}
-Time: {passenger_data['flight_time']}
-Route: {passenger_data['route']}
-Aircraft: {passenger_data['registration']}
-Pilot: {passenger_data['pilot']}
+def get_invite_rate_limiter():
+    """Return this process's invite rate limiter, shared by every batch it sends."""
+    global _invite_limiter, _invite_limiter_pid
+    with _invite_limiter_lock:
+        if _invite_limiter is None or _invite_limiter_pid != os.getpid():
+            _invite_limiter = TokenBucket(get_invite_rate_per_second())
+            _invite_limiter_pid = os.getpid()
+        return _invite_limiter
 
-Also attached is the Dangerous Goods information sheet for your reference.
 
-Please arrive at the designated check-in location at least 15 minutes before your scheduled departure time.
+def _parse_recipient_field(field):
+    """Split 'Name <email>' into (email, name); anything else is (field, '')."""
+    match = NAMED_ADDRESS_RE.match(field)
+    if match:
+        return match.group(2).strip(), match.group(1).strip()
+    return field, ''
 
-Safe travels!
 
-BAC Helicopters
-"""
+def parse_invite_recipients(text):
+    """Parse pasted or CSV recipients. Returns ([(email, name)], [invalid entries]).
 
-    attachments = [
-        (f"ticket_{passenger_data['name'].replace(' ', '_')}.pdf", ticket_pdf_bytes, "application/pdf")
-    ]
+    Accepts addresses separated by commas, semicolons or new lines, written
+    as "email" or "Name <email>", and CSV rows with a name next to the
+    address. A header row naming an email column selects the columns.
+    """
+    recipients, invalid, seen = [], [], set()
+    email_col = name_col = None
+
+    def add(email, name):
+        if not EMAIL_ADDRESS_RE.match(email):
+            invalid.append(email)
+        elif email.lower() not in seen:
+            seen.add(email.lower())
+            recipients.append((email, name))
+
+    for row_number, row in enumerate(csv.reader(io.StringIO(text.replace(';', ',')))):
+        fields = [field.strip() for field in row]
+        if not any(fields):
+            continue
+
+        if row_number == 0:
+            header = [field.lower() for field in fields]
+            email_col = next((i for i, h in enumerate(header) if h in ('email', 'e-mail', 'email address')), None)
+            if email_col is not None:
+                name_col = next((i for i, h in enumerate(header) if h in ('name', 'full name', 'passenger')), None)
+                continue
+
+        if email_col is not None:
+            email = fields[email_col] if email_col < len(fields) else ''
+            name = fields[name_col] if name_col is not None and name_col < len(fields) else ''
+            if email:
+                add(email, name)
+            continue
+
+        parsed = [_parse_recipient_field(field) for field in fields if field]
+        addresses = [(email, name) for email, name in parsed if '@' in email]
+        others = [email for email, name in parsed if '@' not in email]
+        if not addresses:
+            invalid.append(', '.join(others))
+        elif len(addresses) == 1 and others:
+            add(addresses[0][0], addresses[0][1] or others[0])
+        else:
+            for email, name in addresses:
+                add(email, name)
 
-    # Attach DG PDF if available
-    dg_pdf_path = DOCS_DIR / "dg.pdf"
-    if dg_pdf_path.exists():
-        attachments.append(
-            ("Dangerous_Goods_Information.pdf", dg_pdf_path.read_bytes(), "application/pdf")
+    return recipients, invalid
+
+
+def create_invite_batch(share_url, flight, recipients, qr_format):
+    """Record an invite batch and queue the job that sends it. Returns the batch id."""
+    batch_id = uuid.uuid4().hex[:12]
+    with manifest_transaction() as conn:
+        conn.execute(
+            "INSERT INTO invite_batches (batch_id, share_url, qr_format, flight, created_at) VALUES (?, ?, ?, ?, ?)",
+            (batch_id, share_url, qr_format, json.dumps(flight), datetime.now().isoformat(timespec='seconds'))
+        )
+        conn.executemany(
+            "INSERT INTO flight_invites (batch_id, email, name) VALUES (?, ?, ?)",
+            [(batch_id, email, name) for email, name in recipients]
         )
 
-    send_email(emails, subject, body, attachments)
+    job = enqueue_job('invite_batch', {'batch_id': batch_id})
+    get_manifest_db().execute("UPDATE invite_batches SET job_id = ? WHERE batch_id = ?", (job['id'], batch_id))
+    logger.info(f"Invite batch {batch_id} queued for {len(recipients)} recipients")
+    return batch_id
 
 
-def send_pilot_email(flight_id, flight_summary):
-    """Send manifest summary to pilot with all tickets - sends update each time a passenger registers."""
-    pilot_email = get_pilot_email()
-    if not pilot_email:
-        logger.warning("PILOT_EMAIL not configured, skipping pilot notification")
-        return
+def get_invite_batch(batch_id):
+    """Batch details with per-recipient delivery status, or None if unknown."""
+    conn = get_manifest_db()
+    batch = conn.execute("SELECT * FROM invite_batches WHERE batch_id = ?", (batch_id,)).fetchone()
+    if batch is None:
+        return None
 
-    manifest = read_manifest(flight_id)
-    passenger_count = len(manifest)
+    rows = conn.execute(
+        "SELECT email, name, status, attempts, last_error, sent_at FROM flight_invites WHERE batch_id = ? ORDER BY rowid",
+        (batch_id,)
+    ).fetchall()
+    counts = dict.fromkeys(INVITE_STATUSES, 0)
+    for row in rows:
+        counts[row['status']] += 1
 
-    # Calculate total weights
-    total_pax_weight = sum(float(row.get('body_weight', 0) or 0) for row in manifest)
-    total_bag_weight = sum(float(row.get('bag_weight', 0) or 0) for row in manifest)
-    total_bags = sum(int(row.get('num_bags', 0) or 0) for row in manifest)
-    total_weight = total_pax_weight + total_bag_weight
+    job = get_job(batch['job_id']) if batch['job_id'] else None
+    return {
+        'batch_id': batch_id,
+        'url': batch['share_url'],
+        'flight': json.loads(batch['flight']),
+        'created_at': batch['created_at'],
+        'job_state': job['state'] if job else None,
+        'total': len(rows),
+        'counts': counts,
+        # Failed rows are only resent by a job run still to come; the outbox settles spooled ones
+        'finished': (counts['pending'] == 0 and counts['spooled'] == 0
+                     and (counts['failed'] == 0 or (job or {}).get('state') not in ('pending', 'running'))),
+        'recipients': [dict(row) for row in rows],
+    }
 
-    subject = f"[MANIFEST UPDATE] {flight_summary.get('route', flight_id)} - {flight_summary.get('date', 'N/A')} - {passenger_count} PAX"
 
-    body = f"""═══════════════════════════════════════════════════════════════
-                    PASSENGER AND CARGO MANIFEST
-                         BAC HELICOPTERS (PTY) LTD
-═══════════════════════════════════════════════════════════════
-
-FLIGHT DETAILS
-──────────────────────────────────────────────────────────────
-A/CRAFT REG:    {flight_summary.get('registration', 'N/A')}
-A/C TYPE:       {flight_summary.get('ac_type', 'N/A')}
-PIC:            {flight_summary.get('pilot', 'N/A')}
-DATE:           {flight_summary.get('date', 'N/A')}
-ETD:            {flight_summary.get('time', 'N/A')}
-ROUTING:        {flight_summary.get('route', 'N/A')}
-
-═══════════════════════════════════════════════════════════════
-                      WEIGHT SUMMARY
-═══════════════════════════════════════════════════════════════
-PASSENGERS:           {passenger_count}
-TOTAL PAX WEIGHT:     {total_pax_weight:.1f} kg
-TOTAL BAG ITEMS:      {total_bags}
-TOTAL BAG WEIGHT:     {total_bag_weight:.1f} kg
-────────────────────────────────────
-TOTAL WEIGHT:         {total_weight:.1f} kg
-═══════════════════════════════════════════════════════════════
-
-PASSENGER LIST
-──────────────────────────────────────────────────────────────
+def build_invite_message(flight, share_url, name=''):
+    """Subject and body of a flight link invitation."""
+    subject = f"BAC Helicopters Flight Link — {flight['date']} {flight['route']}"
+    greeting = f"Dear {name}," if name else "Hello,"
+    body = f"""{greeting}
+
+You have been sent a flight booking link for BAC Helicopters.
+
+Flight Details:
+Date: {flight['date']}
+ETD: {flight['time']}
+Route: {flight['route']}
+A/C Type: {flight['ac_type']}
+A/C Reg: {flight['reg']}
+PIC: {flight['pilot']}
+
+Click the link below or scan the attached QR code to complete your ticket:
+{share_url}
+
+Thank you,
+BAC Helicopters
 """
+    return subject, body
+
 
-    # Build passenger table
-    body += f"{'#':<3} {'NAME':<25} {'PAX WT':<10} {'BAGS':<6} {'BAG WT':<10} {'DG ACK':<8}\n"
-    body += "─" * 66 + "\n"
+@job_handler('invite_batch')
+def run_invite_batch_job(batch_id):
+    conn = get_manifest_db()
+    batch = conn.execute("SELECT * FROM invite_batches WHERE batch_id = ?", (batch_id,)).fetchone()
+    if batch is None:
+        logger.warning(f"Invite batch {batch_id} no longer exists")
+        return True
 
-    for i, row in enumerate(manifest, 1):
-        name = row.get('name', 'Unknown')[:24]
-        pax_wt = f"{row.get('body_weight', 'N/A')} kg"
-        bags = row.get('num_bags', '0')
-        bag_wt = f"{row.get('bag_weight', '0')} kg"
-        dg_ack = "YES" if row.get('dg_ack') == 'True' else "NO"
-        body += f"{i:<3} {name:<25} {pax_wt:<10} {bags:<6} {bag_wt:<10} {dg_ack:<8}\n"
+    rows = conn.execute(
+        "SELECT email, name FROM flight_invites WHERE batch_id = ? AND status IN ('pending', 'failed')",
+        (batch_id,)
+    ).fetchall()
+    if not rows:
+        return True
 
-    body += "─" * 66 + "\n"
-    body += f"{'TOTALS:':<29} {total_pax_weight:<10.1f} {total_bags:<6} {total_bag_weight:<10.1f}\n"
+    flight = json.loads(batch['flight'])
+    qr_format = batch['qr_format']
+    attachments = [(f'flight_qr.{qr_format}', render_qr_code(batch['share_url'], qr_format), QR_FORMATS[qr_format])]
+    transport = is_sendgrid_configured() or is_smtp_configured()
+    limiter = get_invite_rate_limiter()
 
-    body += f"""
-═══════════════════════════════════════════════════════════════
+    def deliver(row):
+        limiter.acquire()
+        subject, body = build_invite_message(flight, batch['share_url'], row['name'])
+        try:
+            delivered = send_email([row['email']], subject, body, attachments,
+                                   ('invite', {'batch_id': batch_id, 'email': row['email']}))
+            error = None if delivered else "Not delivered"
+        except Exception as e:
+            delivered = False
+            error = f"{type(e).__name__}: {e}"
 
-NOTE: This manifest updates automatically each time a passenger
-completes their registration. The attached ZIP contains all
-passenger tickets received so far.
+        if delivered:
+            status = 'sent'
+        elif delivered is None:
+            status = 'spooled'
+        else:
+            status = 'failed' if transport else 'saved'
+        get_manifest_db().execute(
+            "UPDATE flight_invites SET status = ?, attempts = attempts + 1, last_error = ?, sent_at = ? "
+            "WHERE batch_id = ? AND email = ?",
+            (status, error if status == 'failed' else None,
+             datetime.now().isoformat(timespec='seconds') if status in ('sent', 'saved') else None,
+             batch_id, row['email'])
+        )
+        return status
 
-All passengers have acknowledged Dangerous Goods restrictions
-and accepted the Conditions of Carriage.
+    workers = max(1, min(get_invite_concurrency(), len(rows)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"invite-{batch_id}") as pool:
+        statuses = list(pool.map(deliver, rows))
 
-──────────────────────────────────────────────────────────────
-Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-BAC Helicopters (Pty) Ltd - Air Service License N1105D & G1106D
-"""
+    failed = statuses.count('failed')
+    logger.info(f"Invite batch {batch_id}: {len(statuses) - failed}/{len(statuses)} delivered")
+    return failed == 0
 
-    # Collect all tickets for this flight
-    attachments = []
-    flight_dir = TICKETS_DIR / flight_id
-    if flight_dir.exists():
-        # Create a ZIP of all tickets
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for pdf_file in flight_dir.glob("*.pdf"):
-                zf.writestr(pdf_file.name, pdf_file.read_bytes())
-        zip_buffer.seek(0)
-        attachments.append((f"manifest_{flight_id}_tickets.zip", zip_buffer.getvalue(), "application/zip"))
-
-    # Also attach the CSV manifest
-    manifest_path = MANIFEST_DIR / f"{flight_id}.csv"
-    if manifest_path.exists():
-        attachments.append((f"manifest_{flight_id}.csv", manifest_path.read_bytes(), "text/csv"))
 
-    logger.info(f"Sending pilot manifest update for {flight_id} to {pilot_email}")
-    send_email([pilot_email], subject, body, attachments)
+@outbox_callback('invite')
+def record_invite_delivery(delivered, error, batch_id, email):
+    """Settle a spooled invite once the outbox has delivered it or given up."""
+    get_manifest_db().execute(
+        "UPDATE flight_invites SET status = ?, last_error = ?, sent_at = ? WHERE batch_id = ? AND email = ?",
+        ('sent' if delivered else 'failed', error,
+         datetime.now().isoformat(timespec='seconds') if delivered else None, batch_id, email)
+    )
 
 
 # =============================================================================
-# SharePoint Functions
+# Passenger Import
 # =============================================================================
+#
+# Charter and corporate flights arrive as a spreadsheet of passengers. An
+# import validates every row first, reserves all ticket numbers in one block,
+# renders the tickets in a pool of worker processes, and writes every
+# manifest row and summary update in a single transaction, so a bad row or a
+# failed render leaves nothing half imported. Each flight then gets one pilot
+# email rather than one per passenger.
 
-def get_sharepoint_token():
-    """Get OAuth token for SharePoint."""
-    if not all([MS_TENANT_ID, MS_CLIENT_ID, MS_CLIENT_SECRET]):
-        return None
+IMPORT_REQUIRED_COLUMNS = ['name', 'body_weight', 'flight_date', 'route', 'registration']
+IMPORT_FLIGHT_COLUMNS = ['flight_date', 'flight_time', 'route', 'ac_type', 'registration', 'pilot']
+MAX_IMPORT_ROWS = 1000
 
-    token_url = f"https://login.microsoftonline.com/{MS_TENANT_ID}/oauth2/v2.0/token"
-    data = {
-        'client_id': MS_CLIENT_ID,
-        'client_secret': MS_CLIENT_SECRET,
-        'scope': 'https://graph.microsoft.com/.default',
-        'grant_type': 'client_credentials'
-    }
 
-    try:
-        resp = requests.post(token_url, data=data)
-        resp.raise_for_status()
-        return resp.json().get('access_token')
-    except Exception as e:
-        logger.error(f"Failed to get SharePoint token: {e}")
-        return None
+def get_import_render_workers():
+    """Worker processes for rendering imported tickets; 0 or 1 renders inline."""
+    return int(os.environ.get("IMPORT_RENDER_WORKERS", str(min(os.cpu_count() or 1, 4))))
 
 
-def ensure_sharepoint_folder(token, folder_path):
-    """Ensure a folder exists in SharePoint."""
-    url = f"https://graph.microsoft.com/v1.0/drives/{SP_DRIVE_ID}/root:/{folder_path}"
-    headers = {'Authorization': f'Bearer {token}'}
+def parse_passenger_import(text, defaults=None):
+    """Parse a CSV in the MANIFEST_COLUMNS layout. Returns (rows, errors).
 
-    resp = requests.get(url, headers=headers)
-    if resp.status_code == 200:
-        return True
+    Blank flight columns are filled from defaults, so a sheet listing only
+    passengers can be imported against one flight. ticket_number and
+    timestamp are assigned by the import and ignored if present.
+    """
+    defaults = {k: v for k, v in (defaults or {}).items() if k in IMPORT_FLIGHT_COLUMNS and v}
+    reader = csv.DictReader(io.StringIO(text))
+    header = [column.strip().lower() for column in reader.fieldnames or []]
+    missing = [column for column in IMPORT_REQUIRED_COLUMNS if column not in header and column not in defaults]
+    if missing:
+        return [], [f"Missing columns: {', '.join(missing)}"]
+    reader.fieldnames = header
+
+    rows, errors = [], []
+    for line_number, record in enumerate(reader, start=2):
+        row = {column: (record.get(column) or '').strip() for column in MANIFEST_COLUMNS}
+        if not any(row.values()):
+            continue
+        for column, value in defaults.items():
+            row[column] = row[column] or value
+        row['num_bags'] = row['num_bags'] or '0'
+        row['bag_weight'] = row['bag_weight'] or '0'
+
+        blank = [column for column in IMPORT_REQUIRED_COLUMNS if not row[column]]
+        if blank:
+            errors.append(f"Line {line_number}: missing {', '.join(blank)}")
+            continue
+        try:
+            float(row['body_weight'])
+            float(row['bag_weight'])
+            int(row['num_bags'])
+        except ValueError:
+            errors.append(f"Line {line_number}: body_weight, bag_weight and num_bags must be numbers")
+            continue
+        # flight_date becomes part of the flight ID and so of the ticket directory path
+        try:
+            datetime.strptime(row['flight_date'], "%Y-%m-%d")
+        except ValueError:
+            errors.append(f"Line {line_number}: flight_date must be YYYY-MM-DD, got {row['flight_date']!r}")
+            continue
+        if row['flight_time']:
+            try:
+                datetime.strptime(row['flight_time'], "%H:%M")
+            except ValueError:
+                errors.append(f"Line {line_number}: flight_time must be HH:MM, got {row['flight_time']!r}")
+                continue
+        rows.append(row)
 
-    # Create folder
-    parent_path = '/'.join(folder_path.split('/')[:-1])
-    folder_name = folder_path.split('/')[-1]
+    if len(rows) > MAX_IMPORT_ROWS:
+        errors.append(f"At most {MAX_IMPORT_ROWS} passengers can be imported at once")
+    return rows, errors
 
-    create_url = f"https://graph.microsoft.com/v1.0/drives/{SP_DRIVE_ID}/root:/{parent_path}:/children"
-    data = {
-        'name': folder_name,
-        'folder': {},
-        '@microsoft.graph.conflictBehavior': 'fail'
-    }
 
-    try:
-        resp = requests.post(create_url, headers=headers, json=data)
-        return resp.status_code in [200, 201, 409]  # 409 = already exists
-    except Exception as e:
-        logger.error(f"Failed to create SharePoint folder: {e}")
-        return False
+def _render_imported_ticket(data):
+    return create_ticket_pdf(data, None, None, None)
 
 
-def upload_to_sharepoint(file_path, file_bytes, flight_date):
-    """Upload a file to SharePoint."""
-    token = get_sharepoint_token()
-    if not token:
-        return False
+def _render_imported_tickets(rows, workers):
+    """Render ticket PDFs for rows, in order, across a temporary process pool."""
+    if workers <= 1 or len(rows) < 2:
+        return [_render_imported_ticket(row) for row in rows]
 
-    folder_path = f"{SP_BASE_FOLDER}/{flight_date}"
-    ensure_sharepoint_folder(token, SP_BASE_FOLDER)
-    ensure_sharepoint_folder(token, folder_path)
+    start_method = get_pdf_render_start_method()
+    ctx = multiprocessing.get_context(start_method)
+    if start_method == 'forkserver':
+        ctx.set_forkserver_preload([__name__])
+    workers = min(workers, len(rows))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_warm_render_worker) as pool:
+        return list(pool.map(_render_imported_ticket, rows, chunksize=max(1, len(rows) // (workers * 4))))
 
-    upload_url = f"https://graph.microsoft.com/v1.0/drives/{SP_DRIVE_ID}/root:/{folder_path}/{file_path}:/content"
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/octet-stream'
-    }
 
+def import_passengers(rows, email_passengers=True, workers=None):
+    """Issue tickets for parsed import rows and record them. Returns a report dict.
+
+    Ticket numbers are reserved as one block; if rendering or the database
+    write fails, no rows are recorded, the written PDFs are removed and the
+    block is noted in the ticket ledger as unused.
+    """
+    started = time.perf_counter()
+    workers = get_import_render_workers() if workers is None else workers
+    numbers = reserve_ticket_numbers(len(rows))
+
+    now = datetime.now()
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+    timestamp_file = now.strftime("%Y%m%d_%H%M%S")
+    flights = {}
+    for ticket_number, row in zip(numbers, rows):
+        row.update(ticket_number=str(ticket_number), timestamp=timestamp)
+        flight_id = generate_flight_id(row['flight_date'], row['route'], row['registration'])
+        flights.setdefault(flight_id, []).append(row)
+
+    # Opening the store can rebuild the index from disk, so do it before any file exists
+    get_manifest_db()
+    written = []
     try:
-        resp = requests.put(upload_url, headers=headers, data=file_bytes)
-        if resp.status_code in [200, 201]:
-            logger.info(f"Uploaded {file_path} to SharePoint")
-            return True
-        else:
-            logger.error(f"SharePoint upload failed: {resp.status_code} {resp.text}")
-            # Log to error file
-            error_log = OUTBOX_DIR / "sharepoint_upload_errors.log"
-            with open(error_log, 'a') as f:
-                f.write(f"{datetime.now()}: {file_path} - {resp.status_code} {resp.text}\n")
-            return False
-    except Exception as e:
-        logger.error(f"SharePoint upload exception: {e}")
-        error_log = OUTBOX_DIR / "sharepoint_upload_errors.log"
-        with open(error_log, 'a') as f:
-            f.write(f"{datetime.now()}: {file_path} - {e}\n")
-        return False
+        render_started = time.perf_counter()
+        pdfs = _render_imported_tickets(rows, workers)
+        render_seconds = time.perf_counter() - render_started
+
+        ticket_paths = {}
+        for row, pdf_bytes in zip(rows, pdfs):
+            flight_id = generate_flight_id(row['flight_date'], row['route'], row['registration'])
+            ticket_path = get_flight_dir(flight_id) / f"ticket_{timestamp_file}_{row['ticket_number']}_{slugify(row['name'])}.pdf"
+            ticket_path.write_bytes(pdf_bytes)
+            written.append(ticket_path)
+            ticket_paths[row['ticket_number']] = ticket_path
+
+        with manifest_transaction() as conn:
+            for flight_id, flight_rows in flights.items():
+                _insert_manifest_rows(conn, flight_id, flight_rows)
+                record_manifest_rows(conn, flight_id, flight_rows, tickets=len(flight_rows))
+    except BaseException:
+        for path in written:
+            path.unlink(missing_ok=True)
+        _append_ticket_ledger('unused', numbers.start, numbers.stop)
+        raise
+
+    emailed = 0
+    for flight_id, flight_rows in flights.items():
+        if email_passengers:
+            for row in flight_rows:
+                if row['email']:
+                    enqueue_job('passenger_email', {
+                        'passenger_data': row,
+                        'ticket_path': str(ticket_paths[row['ticket_number']]),
+                    })
+                    emailed += 1
+        schedule_pilot_email(flight_id, flight_rows[0]['flight_date'], flight_rows[0]['flight_time'])
+        if SP_DRIVE_ID:
+            request_sharepoint_sync(flight_id)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'imported': len(rows),
+        'flights': {flight_id: len(flight_rows) for flight_id, flight_rows in flights.items()},
+        'ticket_numbers': [numbers.start, numbers.stop - 1],
+        'passenger_emails_queued': emailed,
+        'render_workers': workers if workers > 1 else 1,
+        'render_seconds': round(render_seconds, 3),
+        'elapsed_seconds': round(elapsed, 3),
+        'tickets_per_second': round(len(rows) / elapsed, 1) if elapsed else None,
+    }
+    logger.info(f"Imported {len(rows)} passengers into {len(flights)} flights "
+                f"({report['tickets_per_second']} tickets/sec)")
+    return report
+
+
+@app.cli.command('import-passengers')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--no-passenger-emails', is_flag=True, help="Do not email tickets to passengers.")
+@click.option('--workers', type=int, default=None, help="Render worker processes (default IMPORT_RENDER_WORKERS).")
+@click.option('--flight-date', default='', help="Flight date for rows that leave it blank.")
+@click.option('--flight-time', default='', help="ETD for rows that leave it blank.")
+@click.option('--route', default='', help="Route for rows that leave it blank.")
+@click.option('--ac-type', default='', help="Aircraft type for rows that leave it blank.")
+@click.option('--registration', default='', help="Aircraft registration for rows that leave it blank.")
+@click.option('--pilot', default='', help="Pilot for rows that leave it blank.")
+def import_passengers_command(csv_file, no_passenger_emails, workers, **defaults):
+    """Issue tickets for every passenger in CSV_FILE (MANIFEST_COLUMNS layout)."""
+    rows, errors = parse_passenger_import(csv_file.read(), defaults)
+    if errors:
+        for error in errors:
+            click.echo(error, err=True)
+        raise SystemExit(1)
+    if not rows:
+        click.echo("No passengers to import", err=True)
+        raise SystemExit(1)
+
+    report = import_passengers(rows, email_passengers=not no_passenger_emails, workers=workers)
+    for flight_id, count in report['flights'].items():
+        click.echo(f"{flight_id}: {count} passengers")
+    click.echo(f"Imported {report['imported']} tickets "
+               f"({report['ticket_numbers'][0]}-{report['ticket_numbers'][1]}) in {report['elapsed_seconds']}s, "
+               f"{report['tickets_per_second']} tickets/sec")
 
 
 # =============================================================================
 # Flask Routes
 # =============================================================================
 
+@app.before_request
+def start_background_workers():
+    """Make sure this worker process is draining the job queue, outbox and SharePoint sync."""
+    ensure_ticket_ledger_reconciled()
+    ensure_job_workers()
+    ensure_outbox_flusher()
+    ensure_sharepoint_sync()
+
+
 @app.route('/healthz')
 def healthz():
     """Health check endpoint."""
@@ -1083,12 +4812,33 @@ def debug_logo():
     """Debug endpoint to view the logo."""
     logo_bytes = get_logo_bytes()
     if not logo_bytes:
-        logo_path = BASE_DIR / "logo.png"
-        return f"No logo found at {logo_path}", 404
+        return f"No logo found at {LOGO_PATH}", 404
 
     return Response(logo_bytes, mimetype='image/png')
 
 
+@app.route('/debug/assets')
+def debug_assets():
+    """Debug endpoint for static asset cache counters."""
+    return jsonify(asset_cache.stats())
+
+
+@app.route('/debug/http')
+def debug_http():
+    """Debug endpoint for per-upstream HTTP call counts and latency."""
+    return jsonify(http_metrics.stats())
+
+
+@app.route('/debug/sharepoint')
+def debug_sharepoint():
+    """Debug endpoint for SharePoint sync progress."""
+    return jsonify({
+        'configured': bool(SP_DRIVE_ID),
+        'sync': get_sharepoint_sync_status(),
+        'known_folders': len(_known_folders),
+    })
+
+
 @app.route('/debug/smtp')
 def debug_smtp():
     """Debug endpoint to check email configuration."""
@@ -1106,11 +4856,19 @@ def debug_smtp():
         'smtp_password_length': len(smtp_password) if smtp_password else 0,
         'from_email': get_from_email() or '(not set)',
         'smtp_use_tls': get_smtp_use_tls(),
+        'smtp_ssl_port': get_smtp_ssl_port(),
+        'smtp_pool': get_smtp_pool().stats(),
         'pilot_email': get_pilot_email() or '(not set)',
     }
     return jsonify(info)
 
 
+@app.route('/debug/outbox')
+def debug_outbox():
+    """Debug endpoint showing outbox spool depth, age and delivery counters."""
+    return jsonify(get_outbox_stats())
+
+
 @app.route('/debug/test_email')
 def test_email():
     """Send a test email to verify email is working."""
@@ -1201,11 +4959,10 @@ Sent at: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 @app.route('/docs/dg')
 def serve_dg_pdf():
     """Serve the Dangerous Goods PDF."""
-    dg_path = DOCS_DIR / "dg.pdf"
-    if not dg_path.exists():
+    if not DG_PDF_PATH.exists():
         return "Dangerous Goods PDF not found. Please upload dg.pdf to the docs folder.", 404
 
-    return send_file(dg_path, mimetype='application/pdf')
+    return send_file(DG_PDF_PATH, mimetype='application/pdf')
 
 
 @app.route('/')
@@ -1219,7 +4976,8 @@ def passenger_form():
         ac_type=request.args.get('ac_type', ''),
         registration=request.args.get('reg', ''),
         pilot=request.args.get('pilot', ''),
-        conditions=CONDITIONS_OF_CARRIAGE
+        conditions=CONDITIONS_OF_CARRIAGE,
+        signature_format=get_signature_format()
     )
 
 
@@ -1227,7 +4985,18 @@ def passenger_form():
 def submit_ticket():
     """Handle passenger ticket submission."""
     try:
-        data = request.get_json()
+        multipart = request.mimetype == 'multipart/form-data'
+        if multipart:
+            # Images arrive as binary file parts already spooled to disk
+            data = request.form.to_dict()
+            for flag in ('dg_acknowledged', 'conditions_accepted'):
+                data[flag] = data.get(flag, '').lower() in ('true', 'on', '1')
+            signature_file = request.files.get('signature')
+            signature_strokes_data = data.get('signature_strokes')
+            photo_files = {slot: request.files[slot] for slot in PHOTO_SLOTS
+                           if request.files.get(slot) and request.files[slot].filename}
+        else:
+            data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
@@ -1244,26 +5013,60 @@ def submit_ticket():
         if not data.get('conditions_accepted'):
             return jsonify({'error': 'You must accept the Conditions of Carriage'}), 400
 
-        if not data.get('signature_data'):
-            return jsonify({'error': 'Signature is required'}), 400
-
-        # Validate base64 sizes
-        signature_data = data.get('signature_data', '')
-        photo1_data = data.get('photo1_data', '')
-        photo2_data = data.get('photo2_data', '')
-
-        for name, img_data in [('signature', signature_data), ('photo1', photo1_data), ('photo2', photo2_data)]:
-            if img_data and len(img_data) > MAX_SINGLE_IMAGE_BASE64:
-                return jsonify({'error': f'{name} image is too large. Please use a smaller image.'}), 400
+        if not multipart:
+            signature_strokes_data = data.get('signature_strokes')
 
-        total_base64 = len(signature_data) + len(photo1_data) + len(photo2_data)
-        if total_base64 > MAX_TOTAL_BASE64:
-            return jsonify({'error': 'Total image data is too large. Please use smaller images.'}), 400
-
-        # Decode images
-        signature_bytes = decode_base64_image(signature_data)
-        photo1_bytes = decode_base64_image(photo1_data) if photo1_data else None
-        photo2_bytes = decode_base64_image(photo2_data) if photo2_data else None
+        # Vector signatures arrive as stroke JSON and replace the signature image
+        signature_strokes = None
+        if signature_strokes_data:
+            try:
+                signature_strokes = parse_signature_strokes(signature_strokes_data)
+            except ValueError as e:
+                return jsonify({'error': f'Invalid signature: {e}'}), 400
+
+        if multipart:
+            has_signature_file = bool(signature_file and signature_file.filename)
+            if not signature_strokes and not has_signature_file:
+                return jsonify({'error': 'Signature is required'}), 400
+
+            # Validate binary sizes
+            if has_signature_file and upload_size(signature_file) > MAX_SIGNATURE_BYTES:
+                return jsonify({'error': 'signature image is too large. Please use a smaller image.'}), 400
+            for slot, photo_file in photo_files.items():
+                if upload_size(photo_file) > MAX_PHOTO_BYTES:
+                    return jsonify({'error': f'{slot} image is too large. Please use a smaller image.'}), 400
+
+            signature_bytes = None if signature_strokes else signature_file.read()
+            photos = photo_files
+        else:
+            if not signature_strokes and not data.get('signature_data'):
+                return jsonify({'error': 'Signature is required'}), 400
+
+            # Validate base64 sizes
+            signature_data = data.get('signature_data', '')
+            photo1_data = data.get('photo1_data', '')
+            photo2_data = data.get('photo2_data', '')
+
+            for name, img_data in [('signature', signature_data), ('photo1', photo1_data), ('photo2', photo2_data)]:
+                if img_data and len(img_data) > MAX_SINGLE_IMAGE_BASE64:
+                    return jsonify({'error': f'{name} image is too large. Please use a smaller image.'}), 400
+
+            total_base64 = len(signature_data) + len(photo1_data) + len(photo2_data)
+            if total_base64 > MAX_TOTAL_BASE64:
+                return jsonify({'error': 'Total image data is too large. Please use smaller images.'}), 400
+
+            # Decode images
+            signature_bytes = None if signature_strokes else decode_base64_image(signature_data)
+            photo1_bytes = decode_base64_image(photo1_data) if photo1_data else None
+            photo2_bytes = decode_base64_image(photo2_data) if photo2_data else None
+            photos = {slot: photo for slot, photo in zip(PHOTO_SLOTS, (photo1_bytes, photo2_bytes)) if photo}
+
+        # Check photo formats from their headers; decoding and resizing happen off the request thread
+        photo_formats = {}
+        for slot, photo in photos.items():
+            photo_formats[slot] = detect_photo_format(io.BytesIO(photo) if isinstance(photo, bytes) else photo.stream)
+            if not photo_formats[slot]:
+                return jsonify({'error': f'{slot} is not a supported image. Please use a JPEG, PNG or WebP photo.'}), 400
 
         # Generate timestamp
         now = datetime.now()
@@ -1291,52 +5094,110 @@ def submit_ticket():
         ticket_number = get_next_ticket_number()
         passenger_data['ticket_number'] = str(ticket_number)
 
-        # Generate flight ID
-        flight_id = generate_flight_id(
-            passenger_data['flight_date'],
-            passenger_data['route'],
-            passenger_data['registration']
-        )
-
-        # Create ticket PDF
-        ticket_pdf = create_ticket_pdf(passenger_data, signature_bytes, photo1_bytes, photo2_bytes)
-
-        # Save ticket PDF
-        flight_dir = get_flight_dir(flight_id)
-        name_slug = slugify(passenger_data['name'])
-        ticket_filename = f"ticket_{timestamp_file}_{name_slug}.pdf"
-        ticket_path = flight_dir / ticket_filename
-        ticket_path.write_bytes(ticket_pdf)
-        logger.info(f"Ticket saved to {ticket_path}")
-
-        # Append to manifest
-        append_to_manifest(flight_id, passenger_data)
-
-        # Send passenger email
-        send_passenger_email(passenger_data, ticket_pdf)
+        ticket_path = None
+        try:
+            # Generate flight ID
+            flight_id = generate_flight_id(
+                passenger_data['flight_date'],
+                passenger_data['route'],
+                passenger_data['registration']
+            )
 
-        # Send pilot email
-        flight_summary = get_flight_summary(flight_id)
-        send_pilot_email(flight_id, flight_summary)
+            # Create ticket PDF (the ticket layout does not draw photos)
+            ticket_pdf = render_ticket_pdf(passenger_data, signature_bytes, None, None, signature_strokes)
+
+            # Save ticket PDF
+            name_slug = slugify(passenger_data['name'])
+            ticket_filename = f"ticket_{timestamp_file}_{name_slug}.pdf"
+            # Counted in the manifest transaction below, so a failed append leaves the summary alone
+            ticket_path, ticket_is_new = write_ticket_pdf(flight_id, ticket_filename, ticket_pdf)
+            logger.info(f"Ticket saved to {ticket_path}")
+
+            photo_jobs = [
+                store_passenger_photo(flight_id, ticket_path.stem, slot, photo, photo_formats[slot])
+                for slot, photo in photos.items()
+            ]
+
+            # Append to manifest
+            append_to_manifest(flight_id, passenger_data, signature_bytes, signature_strokes,
+                               tickets=int(ticket_is_new))
+        except BaseException:
+            # The number never reached the manifest; account for it and drop the orphaned PDF
+            if ticket_path and ticket_is_new:
+                ticket_path.unlink(missing_ok=True)
+            void_ticket_number(ticket_number)
+            raise
+
+        # Hand email and SharePoint work to the background queue
+        jobs = [
+            enqueue_job('passenger_email', {
+                'passenger_data': passenger_data,
+                'ticket_path': str(ticket_path),
+            }),
+            schedule_pilot_email(flight_id, passenger_data['flight_date'], passenger_data['flight_time']),
+        ] + photo_jobs
 
-        # Upload to SharePoint (optional)
         if SP_DRIVE_ID:
-            upload_to_sharepoint(ticket_filename, ticket_pdf, passenger_data['flight_date'])
-            manifest_path = MANIFEST_DIR / f"{flight_id}.csv"
-            if manifest_path.exists():
-                upload_to_sharepoint(f"{flight_id}.csv", manifest_path.read_bytes(), passenger_data['flight_date'])
+            request_sharepoint_sync(flight_id)
 
         return jsonify({
             'success': True,
             'message': 'Ticket submitted successfully! Check your email for confirmation.',
-            'ticket_id': ticket_filename
+            'ticket_id': ticket_filename,
+            'jobs': [job['id'] for job in jobs]
         })
 
+    except RenderBusyError as e:
+        logger.warning(f"Ticket render rejected: {e}")
+        return jsonify({'error': 'The ticketing system is busy. Please try again in a moment.'}), 503
+
     except Exception as e:
         logger.exception("Error processing ticket submission")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the state of a background job."""
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return jsonify({'error': 'Invalid job id'}), 400
+
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify({
+        'id': job['id'],
+        'type': job['type'],
+        'state': job['state'],
+        'attempts': job['attempts'],
+        'created_at': datetime.fromtimestamp(job['created_at']).isoformat(timespec='seconds'),
+        'updated_at': datetime.fromtimestamp(job['updated_at']).isoformat(timespec='seconds'),
+        'next_attempt_at': datetime.fromtimestamp(job['run_at']).isoformat(timespec='seconds') if job['state'] == 'pending' else None,
+        'last_error': job['last_error'],
+    })
+
+
+def get_flight_filters(args):
+    """Read the dashboard's date-range and registration filters from request args."""
+    return {
+        'date_from': args.get('date_from', '').strip(),
+        'date_to': args.get('date_to', '').strip(),
+        'registration': args.get('reg', '').strip(),
+    }
+
+
+def encode_flight_cursor(flight_id):
+    return base64.urlsafe_b64encode(flight_id.encode('utf-8')).decode('ascii')
+
+
+def decode_flight_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8') or None
+    except (ValueError, UnicodeError):
+        return None
+
+
 @app.route('/admin')
 def admin_dashboard():
     """Render the admin dashboard."""
@@ -1344,85 +5205,194 @@ def admin_dashboard():
     if key != ADMIN_KEY:
         return render_template('admin.html', authorized=False, flights=[])
 
-    flights = []
-    for flight_id in get_all_flights():
-        flights.append(get_flight_summary(flight_id))
+    filters = get_flight_filters(request.args)
+    totals = get_flight_totals(**filters)
+    total_pages = max(1, -(-totals['flight_count'] // ADMIN_FLIGHTS_PER_PAGE))
+    page = min(max(request.args.get('page', 1, type=int) or 1, 1), total_pages)
 
-    return render_template('admin.html', authorized=True, flights=flights, admin_key=ADMIN_KEY)
+    flights = query_flight_summaries(
+        **filters,
+        limit=ADMIN_FLIGHTS_PER_PAGE,
+        offset=(page - 1) * ADMIN_FLIGHTS_PER_PAGE
+    )
 
+    return render_template(
+        'admin.html',
+        authorized=True,
+        flights=flights,
+        totals=totals,
+        filters=filters,
+        page=page,
+        total_pages=total_pages,
+        admin_key=ADMIN_KEY
+    )
 
-@app.route('/admin/create_link', methods=['POST'])
-def create_link():
-    """Create a shareable link and QR code for a flight."""
-    key = request.form.get('key', '')
+
+@app.route('/admin/api/flights')
+def admin_api_flights():
+    """JSON list of flight summaries with cursor paging and aggregates for the filtered set."""
+    key = request.args.get('key', '')
     if key != ADMIN_KEY:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    # Get flight details
-    flight_date = request.form.get('date', '').strip()
-    flight_time = request.form.get('time', '').strip()
-    route = request.form.get('route', '').strip()
-    ac_type = request.form.get('ac_type', '').strip()
-    registration = request.form.get('reg', '').strip()
-    pilot = request.form.get('pilot', '').strip()
-    recipient_emails = request.form.get('emails', '').strip()
-
-    # Validate
-    if not all([flight_date, flight_time, route, registration, pilot]):
-        return jsonify({'error': 'All flight details are required'}), 400
+    filters = get_flight_filters(request.args)
+    limit = min(max(request.args.get('limit', ADMIN_FLIGHTS_PER_PAGE, type=int) or 1, 1), ADMIN_API_MAX_LIMIT)
 
-    # Build URL
-    base_url = get_base_url()
-    params = {
-        'date': flight_date,
-        'time': flight_time,
-        'route': route,
-        'ac_type': ac_type,
-        'reg': registration,
-        'pilot': pilot
-    }
-    share_url = f"{base_url}/?{urlencode(params)}"
+    before = None
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        before = decode_flight_cursor(cursor)
+        if before is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
 
-    # Generate QR code
-    qr_base64 = generate_qr_code(share_url)
+    # Fetch one extra row to know whether another page follows
+    flights = query_flight_summaries(**filters, limit=limit + 1, before=before)
+    next_cursor = None
+    if len(flights) > limit:
+        flights = flights[:limit]
+        next_cursor = encode_flight_cursor(flights[-1]['flight_id'])
 
-    # Send emails if provided
-    if recipient_emails:
-        emails = [e.strip() for e in re.split(r'[,;]', recipient_emails) if e.strip()]
-        if emails:
-            logger.info(f"Sending flight link to {len(emails)} recipients...")
-            subject = f"BAC Helicopters Flight Link — {flight_date} {route}"
-            body = f"""Hello,
+    return jsonify({
+        'flights': flights,
+        'next_cursor': next_cursor,
+        'totals': get_flight_totals(**filters),
+    })
 
-You have been sent a flight booking link for BAC Helicopters.
 
-Flight Details:
-Date: {flight_date}
-ETD: {flight_time}
-Route: {route}
-A/C Type: {ac_type}
-A/C Reg: {registration}
-PIC: {pilot}
+def _flight_link_from_form(form):
+    """Flight details and share URL from an admin form. Returns (flight, url), or (None, None) if incomplete."""
+    flight = {field: form.get(field, '').strip() for field in ('date', 'time', 'route', 'ac_type', 'reg', 'pilot')}
+    if not all(flight[field] for field in ('date', 'time', 'route', 'reg', 'pilot')):
+        return None, None
+    return flight, f"{get_base_url()}/?{urlencode(flight)}"
 
-Click the link below or scan the attached QR code to complete your ticket:
-{share_url}
 
-Thank you,
-BAC Helicopters
-"""
-            qr_bytes = base64.b64decode(qr_base64)
-            attachments = [('flight_qr.png', qr_bytes, 'image/png')]
-            email_sent = send_email(emails, subject, body, attachments)
-            logger.info(f"Email send result: {email_sent}")
+def _qr_format_from_form(form):
+    qr_format = form.get('qr_format', '').lower()
+    return qr_format if qr_format in QR_FORMATS else get_qr_format()
+
+
+def _queue_invites_from_form(form, files, share_url, flight, qr_format):
+    """Queue invites for the recipients pasted in 'emails' or uploaded as 'recipients_file'.
+
+    Returns a response dict for the admin page, or None when there are no recipients.
+    Raises ValueError when the list is too long.
+    """
+    recipients, invalid = parse_invite_recipients(form.get('emails', ''))
+    upload = files.get('recipients_file')
+    if upload and upload.filename:
+        seen = {email.lower() for email, name in recipients}
+        file_recipients, file_invalid = parse_invite_recipients(upload.read().decode('utf-8-sig', errors='replace'))
+        recipients += [(email, name) for email, name in file_recipients if email.lower() not in seen]
+        invalid += file_invalid
+
+    if not recipients:
+        return {'batch_id': None, 'queued': 0, 'invalid': invalid} if invalid else None
+    if len(recipients) > MAX_INVITE_RECIPIENTS:
+        raise ValueError(f"At most {MAX_INVITE_RECIPIENTS} recipients can be invited at once")
+
+    batch_id = create_invite_batch(share_url, flight, recipients, qr_format)
+    return {
+        'batch_id': batch_id,
+        'queued': len(recipients),
+        'invalid': invalid,
+        'status_url': f"/admin/bulk_invite/{batch_id}",
+    }
+
+
+@app.route('/admin/create_link', methods=['POST'])
+def create_link():
+    """Create a shareable link and QR code for a flight, and invite any recipients given."""
+    key = request.form.get('key', '')
+    if key != ADMIN_KEY:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    flight, share_url = _flight_link_from_form(request.form)
+    if flight is None:
+        return jsonify({'error': 'All flight details are required'}), 400
+
+    # Generate QR code (cached per URL)
+    qr_format = _qr_format_from_form(request.form)
+    qr_bytes = render_qr_code(share_url, qr_format)
+
+    # Invites are sent one per recipient by a background job
+    try:
+        invites = _queue_invites_from_form(request.form, request.files, share_url, flight, qr_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     logger.info(f"Flight link created: {share_url}")
     return jsonify({
         'success': True,
         'url': share_url,
-        'qr': qr_base64
+        'qr': base64.b64encode(qr_bytes).decode('utf-8'),
+        'qr_mime': QR_FORMATS[qr_format],
+        'invites': invites
     })
 
 
+@app.route('/admin/bulk_invite', methods=['POST'])
+def bulk_invite():
+    """Queue flight link invitations for a pasted or uploaded list of recipients."""
+    key = request.form.get('key', '')
+    if key != ADMIN_KEY:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    flight, share_url = _flight_link_from_form(request.form)
+    if flight is None:
+        return jsonify({'error': 'All flight details are required'}), 400
+
+    try:
+        invites = _queue_invites_from_form(request.form, request.files, share_url, flight,
+                                           _qr_format_from_form(request.form))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not invites or not invites['batch_id']:
+        return jsonify({'error': 'No valid recipients', 'invalid': (invites or {}).get('invalid', [])}), 400
+
+    return jsonify({'success': True, 'url': share_url, **invites}), 202
+
+
+@app.route('/admin/bulk_invite/<batch_id>')
+def bulk_invite_status(batch_id):
+    """Per-recipient delivery status of an invite batch."""
+    key = request.args.get('key', '')
+    if key != ADMIN_KEY:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    batch = get_invite_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Unknown invite batch'}), 404
+    return jsonify(batch)
+
+
+@app.route('/admin/import_passengers', methods=['POST'])
+def import_passengers_route():
+    """Issue tickets for an uploaded CSV of passengers in the manifest layout."""
+    key = request.form.get('key', '')
+    if key != ADMIN_KEY:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    upload = request.files.get('passengers_file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'No CSV file uploaded'}), 400
+
+    defaults = {column: request.form.get(column, '').strip() for column in IMPORT_FLIGHT_COLUMNS}
+    rows, errors = parse_passenger_import(upload.read().decode('utf-8-sig', errors='replace'), defaults)
+    if errors:
+        return jsonify({'error': 'The CSV has errors; nothing was imported', 'errors': errors}), 400
+    if not rows:
+        return jsonify({'error': 'No passengers to import'}), 400
+
+    email_passengers = request.form.get('email_passengers', 'true').lower() in ('true', 'on', '1')
+    try:
+        report = import_passengers(rows, email_passengers=email_passengers)
+    except Exception as e:
+        logger.exception("Passenger import failed")
+        return jsonify({'error': f'Import failed: {e}'}), 500
+    return jsonify({'success': True, **report})
+
+
 @app.route('/admin/download_manifest')
 def download_manifest():
     """Download the manifest CSV for a flight."""
@@ -1434,21 +5404,20 @@ def download_manifest():
     if not flight_id:
         return "Missing flight_id", 400
 
-    manifest_path = MANIFEST_DIR / f"{flight_id}.csv"
-    if not manifest_path.exists():
+    manifest_csv = export_manifest_csv(flight_id)
+    if not manifest_csv:
         return "Manifest not found", 404
 
-    return send_file(
-        manifest_path,
+    return Response(
+        manifest_csv,
         mimetype='text/csv',
-        as_attachment=True,
-        download_name=f"{flight_id}_manifest.csv"
+        headers={'Content-Disposition': f'attachment; filename="{flight_id}_manifest.csv"'}
     )
 
 
-@app.route('/admin/download_tickets')
-def download_tickets():
-    """Download all tickets for a flight as a ZIP."""
+@app.route('/admin/download_manifest_pdf')
+def download_manifest_pdf():
+    """Download the printable manifest (load sheet) PDF for a flight."""
     key = request.args.get('key', '')
     if key != ADMIN_KEY:
         return "Unauthorized", 401
@@ -1457,23 +5426,101 @@ def download_tickets():
     if not flight_id:
         return "Missing flight_id", 400
 
-    flight_dir = TICKETS_DIR / flight_id
-    if not flight_dir.exists():
-        return "No tickets found", 404
+    layout = get_manifest_layout(flight_id)
+    if not layout['rows']:
+        return "Manifest not found", 404
+
+    etag = manifest_pdf_etag(layout)
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+    response = Response(
+        create_manifest_pdf(flight_id, layout),
+        mimetype='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename="{flight_id}_manifest.pdf"'}
+    )
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/admin/download_booklet')
+def download_booklet():
+    """Download every ticket of a flight as the pages of one printable PDF."""
+    key = request.args.get('key', '')
+    if key != ADMIN_KEY:
+        return "Unauthorized", 401
 
-    # Create ZIP in memory
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for pdf_file in flight_dir.glob("*.pdf"):
-            zf.writestr(pdf_file.name, pdf_file.read_bytes())
+    flight_id = request.args.get('flight_id', '')
+    if not flight_id:
+        return "Missing flight_id", 400
 
-    zip_buffer.seek(0)
+    etag = _booklet_etag(flight_id)
+    if etag is None:
+        return "No passengers found", 404
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
 
+    booklet_path, etag = get_flight_booklet(flight_id)
     return send_file(
-        zip_buffer,
-        mimetype='application/zip',
+        booklet_path,
+        mimetype='application/pdf',
         as_attachment=True,
-        download_name=f"{flight_id}_tickets.zip"
+        download_name=f"{flight_id}_booklet.pdf",
+        etag=etag,
+        max_age=0
+    )
+
+
+@app.route('/admin/download_tickets')
+def download_tickets():
+    """Download tickets as a streamed ZIP.
+
+    Pass one flight_id for a single flight, several flight_id values, or
+    date_from/date_to/reg filters to export every matching flight.
+    """
+    key = request.args.get('key', '')
+    if key != ADMIN_KEY:
+        return "Unauthorized", 401
+
+    flight_ids = [f for f in request.args.getlist('flight_id') if f]
+    filters = get_flight_filters(request.args)
+
+    if len(flight_ids) == 1:
+        flight_id = flight_ids[0]
+        etag = get_flight_archive_etag(flight_id)
+        if etag is None:
+            return "No tickets found", 404
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+        archive_path, etag = get_flight_archive(flight_id)
+        # send_file sizes and opens the archive here; hold the lock so an append is not half written
+        with file_lock(_archive_lock_path(flight_id)):
+            return send_file(
+                archive_path,
+                mimetype='application/zip',
+                as_attachment=True,
+                download_name=f"{flight_id}_tickets.zip",
+                etag=etag,
+                max_age=0
+            )
+
+    if flight_ids or any(filters.values()):
+        if not flight_ids:
+            flight_ids = [f['flight_id'] for f in query_flight_summaries(**filters, limit=-1)]
+        entries = list_ticket_files(flight_ids, prefix_with_flight=True)
+        label = '_'.join(v for v in [filters['date_from'], filters['date_to'], slugify(filters['registration'])] if v)
+        download_name = f"tickets_{label or 'export'}.zip"
+    else:
+        return "Missing flight_id", 400
+
+    if not entries:
+        return "No tickets found", 404
+
+    return Response(
+        stream_zip(entries),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
     )
 
 